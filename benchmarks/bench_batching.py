@@ -0,0 +1,117 @@
+"""
+Single-mail vs batched LLM extraction on the same corpus.
+
+    python -m benchmarks.bench_batching [--mails 400] [--batch-sizes 2,4,8]
+        [--ollama-url http://localhost:11434] [--ollama-ttft 0.2]
+        [--ollama-token-delay 0.01] [--ollama-prompt-token-delay 0.001]
+        [--ollama-invalid-rate 0.05] [--out results.json]
+
+Without --ollama-url the fake Ollama server (utils/fakes.py) answers with the
+regex extractor, so accuracy only reflects the splitting and fallback logic;
+point it at a real server to compare the model's accuracy in both modes.
+For each mode: mails/minute, LLM requests and tokens, and the share of
+fields matching the corpus ground truth (per field and overall).
+"""
+import re
+import json
+import time
+import argparse
+
+from benchmarks.corpus import generate_corpus
+from utils.fakes import FakeOllamaServer
+from utils.ai_extractor import ExtractionPool
+from utils.batch_extractor import BatchExtractor
+
+# LLM answer key -> corpus "truth" key
+TRUTH_KEYS = {
+    "company": "company", "category": "category", "branches": "branches", "10th%": "10th",
+    "12th%": "12th", "cgpa": "cgpa", "ctc": "ctc", "stipend": "stipend",
+    "last_date": "last_date", "registration_links": "registration_links",
+}
+
+
+def _norm(value):
+    if isinstance(value, list):
+        return sorted(_norm(v) for v in value)
+    return re.sub(r"[\s%]+", " ", str(value or "")).strip().lower()
+
+
+def accuracy(results, emails):
+    """Share of fields equal to the ground truth (after normalizing case, spaces and %)."""
+    per_field = {key: 0 for key in TRUTH_KEYS}
+    for extracted, email in zip(results, emails):
+        for key, truth_key in TRUTH_KEYS.items():
+            if extracted and _norm(extracted.get(key)) == _norm(email["truth"][truth_key]):
+                per_field[key] += 1
+    n = len(emails) or 1
+    return {
+        "overall": sum(per_field.values()) / (n * len(TRUTH_KEYS)),
+        "failed_mails": sum(1 for extracted in results if extracted is None),
+        "fields": {key: hits / n for key, hits in per_field.items()},
+    }
+
+
+def run_mode(name, url, emails, batch_size=None):
+    pool = ExtractionPool(base_urls=[url], cache=None)
+    extract, workers = pool.extract, None
+    if batch_size:
+        batcher = BatchExtractor(pool, max_batch=batch_size)
+        extract, workers = batcher.extract, batcher.concurrency
+    start = time.perf_counter()
+    results = [extracted for _, extracted in pool.extract_stream(emails, extract=extract, workers=workers)]
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    report = {
+        "seconds": elapsed,
+        "mails_per_min": len(emails) / elapsed * 60,
+        "llm_requests": len(pool.timings),
+        "llm_tokens": sum(t["tokens"] for t in pool.timings),
+        "accuracy": accuracy(results, emails),
+    }
+    print(f"{name:<12} {elapsed:7.2f}s  {report['mails_per_min']:8.0f} mails/min  "
+          f"{report['llm_requests']:5d} requests  accuracy {report['accuracy']['overall']:.1%}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mails", type=int, default=400, help="corpus size (offers and reminders are extracted)")
+    parser.add_argument("--batch-sizes", default="2,4,8")
+    parser.add_argument("--ollama-url", help="real Ollama server (default: the fake one)")
+    parser.add_argument("--ollama-ttft", type=float, default=0.2, help="fake: fixed seconds per request")
+    parser.add_argument("--ollama-token-delay", type=float, default=0.01, help="fake: seconds per output token")
+    parser.add_argument("--ollama-prompt-token-delay", type=float, default=0.001,
+                        help="fake: seconds per prompt token (prompt evaluation)")
+    parser.add_argument("--ollama-invalid-rate", type=float, default=0.05,
+                        help="fake: share of invalid answers / mails left out of batch answers")
+    parser.add_argument("--out", help="write the JSON result to this file")
+    args = parser.parse_args()
+
+    emails = [e for e in generate_corpus(args.mails) if e["truth"]]
+    print(f"Corpus: {len(emails)} offer/reminder mails")
+    sizes = [int(n) for n in args.batch_sizes.split(",") if n.strip()]
+
+    fake = None
+    url = args.ollama_url
+    if not url:
+        fake = FakeOllamaServer(ttft=args.ollama_ttft, token_delay=args.ollama_token_delay,
+                                prompt_token_delay=args.ollama_prompt_token_delay,
+                                invalid_rate=args.ollama_invalid_rate).start()
+        url = fake.url
+    try:
+        result = {"params": vars(args), "single": run_mode("single", url, emails)}
+        for size in sizes:
+            result[f"batched_{size}"] = run_mode(f"batched x{size}", url, emails, batch_size=size)
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
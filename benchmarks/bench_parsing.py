@@ -0,0 +1,40 @@
+"""
+Throughput benchmark for the regex extractor.
+
+    python -m benchmarks.bench_parsing [--mails 3000] [--processes N]
+
+Reports mails/second for Extractor.extract_many in a single process and over
+a process pool.
+"""
+import os
+import time
+import argparse
+
+from benchmarks.corpus import generate_corpus
+from utils.parsing_utils import Extractor
+
+
+def _run(name, fn, emails):
+    start = time.perf_counter()
+    fn(emails)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:7.2f}s  {len(emails) / elapsed:9.0f} mails/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mails", type=int, default=3000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    emails = generate_corpus(args.mails)
+    extractor = Extractor()
+    print(f"Corpus: {len(emails)} mails, {args.processes} worker processes")
+
+    _run("Extractor (1 process)", lambda es: extractor.extract_many(es, processes=1), emails)
+    _run(f"Extractor ({args.processes} processes)",
+         lambda es: extractor.extract_many(es, processes=args.processes, min_pool_size=0), emails)
+
+
+if __name__ == "__main__":
+    main()
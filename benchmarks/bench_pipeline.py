@@ -0,0 +1,226 @@
+"""
+End-to-end benchmark against local stand-ins for Gmail, Sheets and Ollama (utils/fakes.py).
+
+    python -m benchmarks.bench_pipeline [--mails 3000] [--new 200] [--pipeline stream|async]
+        [--extraction llm|tiered|batched] [--gmail-latency 0.02] [--sheets-latency 0.05]
+        [--ollama-ttft 0.05] [--ollama-token-delay 0.002] [--ollama-invalid-rate 0.1]
+        [--quota] [--out results.json]
+
+Sections:
+  - functions:   fetch_emails, is_first_round_placement_mail, extract_placement_offer,
+                 ai_extract_offer and append_to_sheet on their own
+  - backfill:    a first run of main.py's sync over --mails synthetic mails
+  - incremental: a second run after --new mails have arrived
+Each section reports throughput, latency percentiles (ms) and peak memory.
+The result is one JSON document (stdout, or --out) so runs can be compared over time.
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import resource
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+
+from benchmarks.corpus import generate_corpus
+from utils.fakes import FakeGmailService, FakeSheetsService, FakeOllamaServer, install_fake_services
+from utils.email_utils import fetch_emails
+from utils.filters import is_first_round_placement_mail
+from utils.parsing_utils import extract_placement_offer
+from utils.ai_extractor import ai_extract_offer
+from utils.sheets_utils import append_to_sheet, build_campus_placement_row
+from config.config import SHEET_NAME_PLACEMENTS, SHEET_ID
+import main as app
+
+
+def percentiles(seconds):
+    """Latency summary in milliseconds."""
+    if not seconds:
+        return {}
+    values = sorted(seconds)
+
+    def pct(p):
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000
+
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": values[-1] * 1000,
+    }
+
+
+def measure(fn):
+    """Run fn() with stdout silenced; returns (result, seconds, peak traced memory in MB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(io.StringIO()):
+            result = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def timed_each(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_functions(corpus, gmail, sheets, ollama, args):
+    results = {}
+    n = min(len(corpus), 500)
+
+    emails, elapsed, peak = measure(lambda: fetch_emails(limit=n, start_date="2025/05/17"))
+    results["fetch_emails"] = {"mails": len(emails), "seconds": elapsed,
+                               "mails_per_s": len(emails) / elapsed, "peak_mb": peak}
+
+    latencies, elapsed, peak = measure(lambda: timed_each(is_first_round_placement_mail, corpus))
+    results["is_first_round_placement_mail"] = {
+        "mails_per_s": len(corpus) / elapsed, "peak_mb": peak, "latency": percentiles(latencies)}
+
+    latencies, elapsed, peak = measure(lambda: timed_each(
+        lambda e: extract_placement_offer(e["body"], e["from"], e["subject"]), corpus))
+    results["extract_placement_offer"] = {
+        "mails_per_s": len(corpus) / elapsed, "peak_mb": peak, "latency": percentiles(latencies)}
+
+    offers = [e for e in corpus if e["kind"] == "offer"][:50]
+    latencies, elapsed, peak = measure(lambda: timed_each(
+        lambda e: ai_extract_offer(e, base_url=ollama.url), offers))
+    results["ai_extract_offer"] = {
+        "mails_per_s": len(offers) / elapsed, "peak_mb": peak, "latency": percentiles(latencies)}
+
+    rows = [build_campus_placement_row({**(e["truth"] or {}), "mail_date": e["received_date"],
+                                        "mail_time": e["received_time"]})
+            for e in corpus if e["truth"]][:200]
+    calls_before = sheets.calls
+    _, elapsed, peak = measure(lambda: append_to_sheet(rows, "Bench", SHEET_ID))
+    results["append_to_sheet"] = {"rows": len(rows), "seconds": elapsed,
+                                  "rows_per_s": len(rows) / elapsed,
+                                  "api_calls": sheets.calls - calls_before, "peak_mb": peak}
+    return results
+
+
+def bench_run(args, gmail, sheets, ollama_url, data_dir):
+    """One main.py run (first run or incremental, depending on the state in data_dir)."""
+    run_args = app.parse_args(["--pipeline", args.pipeline, "--extraction", args.extraction])
+    gmail_calls, sheets_calls = gmail.calls, sheets.calls
+
+    def run():
+        session = app.Session(run_args, data_dir=data_dir, ollama_urls=[ollama_url])
+        try:
+            progress = app.sync(session)
+        finally:
+            session.close()
+        return session, progress
+
+    (session, progress), elapsed, peak = measure(run)
+    report = {
+        "seconds": elapsed,
+        "mails_seen": progress["seen"],
+        "rows_extracted": progress["extracted"],
+        "mails_per_s": progress["seen"] / elapsed if elapsed else 0.0,
+        "rows_written": session.writer.rows_written,
+        "gmail_calls": gmail.calls - gmail_calls,
+        "sheets_calls": sheets.calls - sheets_calls,
+        "peak_mb": peak,
+        "llm_total": percentiles([t["total"] for t in session.pool.timings]),
+        "llm_first_token": percentiles([t["ttft"] for t in session.pool.timings if t["ttft"] is not None]),
+        "llm_repair_rate": session.pool.repaired / session.pool.extractions if session.pool.extractions else 0.0,
+        "llm_repair_tokens": session.pool.repair_tokens,
+    }
+    pipeline = progress.get("pipeline")
+    if pipeline is not None:
+        report["stages"] = {
+            stage.name: {
+                "items_in": stage.items_in,
+                "items_out": stage.items_out,
+                "busy_s": stage.busy,
+                "items_per_busy_s": stage.items_in / stage.busy if stage.busy else None,
+                "latency": percentiles(stage.latencies),
+            }
+            for stage in pipeline.stages
+        }
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mails", type=int, default=3000)
+    parser.add_argument("--new", type=int, default=200)
+    parser.add_argument("--pipeline", choices=["stream", "async"], default="stream")
+    parser.add_argument("--extraction", choices=["llm", "tiered", "batched"], default="llm")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="seconds per Gmail round trip")
+    parser.add_argument("--sheets-latency", type=float, default=0.05, help="seconds per Sheets call")
+    parser.add_argument("--ollama-ttft", type=float, default=0.05, help="seconds to first token")
+    parser.add_argument("--ollama-token-delay", type=float, default=0.002, help="seconds per token")
+    parser.add_argument("--ollama-invalid-rate", type=float, default=0.0,
+                        help="share of LLM answers with an invalid field (exercises the repair prompt)")
+    parser.add_argument("--quota", action="store_true",
+                        help="pace Gmail/Sheets calls with the real per-user quotas")
+    parser.add_argument("--skip-functions", action="store_true")
+    parser.add_argument("--out", help="write the JSON result to this file")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.mails + args.new)
+    backfill, arriving = corpus[:args.mails], corpus[args.mails:]
+    gmail = FakeGmailService(backfill, latency=args.gmail_latency)
+    sheets = FakeSheetsService({SHEET_NAME_PLACEMENTS: [list(app.COLUMN_LABELS)]},
+                               latency=args.sheets_latency)
+    install_fake_services(gmail, sheets, quota=args.quota)
+    data_dir = tempfile.mkdtemp(prefix="patlens-bench-")
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "params": vars(args),
+        },
+    }
+    with FakeOllamaServer(ttft=args.ollama_ttft, token_delay=args.ollama_token_delay,
+                          invalid_rate=args.ollama_invalid_rate) as ollama:
+        if not args.skip_functions:
+            result["functions"] = bench_functions(backfill, gmail, sheets, ollama, args)
+
+        result["backfill"] = bench_run(args, gmail, sheets, ollama.url, data_dir)
+
+        now_ms = int(time.time() * 1000)
+        gmail.add_many({**e, "internal_ts": now_ms + i, "date_header": None} for i, e in enumerate(arriving))
+        result["incremental"] = bench_run(args, gmail, sheets, ollama.url, data_dir)
+
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["meta"]["max_rss_mb"] = maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"Results written to {args.out}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
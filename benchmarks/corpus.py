@@ -0,0 +1,174 @@
+"""
+Synthetic placement-cell mail corpus for benchmarks.
+
+generate_corpus(n) returns email dicts shaped like email_utils.iter_emails()
+output, plus three extra keys:
+  - "kind":   "offer", "shortlist", "result", "interview" or "reminder"
+  - "format": "plain", "html" or "multipart" (how the body was rendered)
+  - "html":   for html/multipart mails, the HTML part (used by utils/fakes.py
+              to serve the mail as text/html or multipart/alternative)
+  - "truth":  for offers/reminders, the field values the extractors should find
+"""
+import html
+import random
+from datetime import datetime, timedelta, timezone
+
+from config.config import COLLEGE_PLACEMENT_EMAIL
+
+COMPANIES = [
+    "Bharti Airtel Ltd", "Infosys", "Tata Consultancy Services", "Wipro Technologies",
+    "Accenture", "Deloitte USI", "Amazon", "Microsoft India", "Zscaler", "Juspay",
+    "Cognizant", "Capgemini", "HCLTech", "L&T Technology Services", "Samsung R&D",
+    "Oracle", "Goldman Sachs", "PhonePe", "Razorpay", "Siemens Healthineers",
+]
+CATEGORIES = ["Super Dream Internship / Placement", "Dream Offer", "Regular Placement",
+              "Super Dream", "Dream Internship", "Internship"]
+BRANCHES = ["B. Tech. CSE IT & related", "B.Tech CSE, ECE, EEE", "All B.Tech branches",
+            "B.Tech CSE (AI & ML), CSE (Cyber Security)", "M.Tech / MCA"]
+MONTHS = ["Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+FILLER = (
+    "Students are advised to read the job description carefully before applying. "
+    "Students who register and do not attend will be debarred from further opportunities. "
+    "For any queries contact the Career Development Centre during working hours. "
+)
+FOOTER = (
+    "\n--\nYou received this message because you are subscribed to the Google Groups "
+    "\"VIT Lions 2026\" group.\nTo unsubscribe from this group and stop receiving emails from it, "
+    "send an email to vitlions2026+unsubscribe@vitbhopal.ac.in.\n"
+)
+DISCLAIMER = (
+    "\nDISCLAIMER: This email and any files transmitted with it are confidential and intended "
+    "solely for the use of the individual or entity to whom they are addressed.\n"
+)
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def _offer_fields(rng):
+    company = rng.choice(COMPANIES)
+    pct = rng.choice([60, 65, 70, 75, 80, 85, 90])
+    cgpa = rng.choice(["6.0", "6.5", "7.0", "7.5", "8.0", "9.0"])
+    ctc = f"{rng.randint(4, 40)}.{rng.randint(0, 99):02d} LPA"
+    stipend = f"{rng.randint(10, 80)},000"
+    last_date = f"{rng.randint(1, 28)}th {rng.choice(MONTHS)} 2025 (11:00 am)"
+    slug = company.split()[0].lower()
+    return {
+        "company": company,
+        "category": rng.choice(CATEGORIES),
+        "branches": rng.choice(BRANCHES),
+        "10th": str(pct),
+        "12th": str(pct),
+        "cgpa": cgpa,
+        "ctc": ctc,
+        "stipend": stipend,
+        "last_date": last_date,
+        "registration_links": [f"https://forms.gle/{slug}{rng.randint(1000, 9999)}"],
+    }
+
+
+def _offer_text(truth, rng):
+    lines = [
+        "Dear Students,",
+        "Greetings from Career Development Centre!",
+        "",
+        f"Name of the Company: {truth['company']}",
+        f"Category: {truth['category']}",
+        "Date of Visit: Will be announced later",
+        f"Eligible Branches: {truth['branches']}",
+        f"Eligibility Criteria: % in X and XII – {truth['10th']}% or {truth['cgpa']} CGPA; "
+        f"in Pursuing Degree – {truth['cgpa']} CGPA; No Standing Arrears",
+        f"CTC: {truth['ctc']}",
+        f"Stipend: {truth['stipend']}",
+        f"Last date for Registration: {truth['last_date']}",
+        "Application Source: Google Form",
+        f"Registration Link: {truth['registration_links'][0]}",
+        "",
+        FILLER * rng.randint(1, 6),
+        "Regards,",
+        "CDC Team",
+    ]
+    return "\n".join(lines)
+
+
+def _to_html(text):
+    paras = "".join(f"<p>{html.escape(line)}</p>" for line in text.split("\n") if line.strip())
+    return f"<html><body><div dir=\"ltr\">{paras}</div></body></html>"
+
+
+def _quoted(text):
+    return "\n".join("> " + line for line in text.split("\n"))
+
+
+def _make_body(text, fmt, rng):
+    """Render a body the way email_utils would decode it for a plain, html or multipart mail."""
+    if fmt == "plain":
+        body = text
+    elif fmt == "html":
+        # html2text output keeps paragraphs separated by blank lines
+        body = "\n\n".join(line for line in text.split("\n") if line.strip())
+    else:
+        # multipart/alternative as older versions decoded it (and as still found in
+        # mail stores): text/plain and the rendered text/html concatenated
+        body = text + "\n\n" + "\n\n".join(line for line in text.split("\n") if line.strip())
+    if rng.random() < 0.3:
+        body += "\n\nOn Mon, 1 Sep 2025 at 10:00, CDC <cdc@vitbhopal.ac.in> wrote:\n" + _quoted(text)
+    body += FOOTER
+    if rng.random() < 0.5:
+        body += DISCLAIMER
+    return body
+
+
+def generate_corpus(n, seed=0, start=datetime(2025, 5, 17, tzinfo=timezone.utc)):
+    """Generate n synthetic placement-cell emails, oldest first."""
+    rng = random.Random(seed)
+    emails = []
+    offers = []
+    ts = start
+    for i in range(n):
+        ts += timedelta(minutes=rng.randint(5, 600))
+        kind = rng.choices(
+            ["offer", "shortlist", "result", "interview", "reminder"],
+            weights=[35, 25, 15, 15, 10],
+        )[0]
+        if kind == "reminder" and not offers:
+            kind = "offer"
+        fmt = rng.choice(["plain", "html", "multipart"])
+        truth = None
+
+        if kind == "offer":
+            truth = _offer_fields(rng)
+            offers.append(truth)
+            subject = f"{truth['company']} - {truth['category']} - Registration"
+            text = _offer_text(truth, rng)
+        elif kind == "reminder":
+            truth = dict(rng.choice(offers))
+            truth["last_date"] = f"{rng.randint(1, 28)}th {rng.choice(MONTHS)} 2025 (11:59 pm)"
+            subject = f"Re: {truth['company']} - {truth['category']} - Registration"
+            text = "Reminder: the registration deadline has been extended.\n\n" + _offer_text(truth, rng)
+        else:
+            company = rng.choice(COMPANIES)
+            subject = {
+                "shortlist": f"{company} - Shortlisted students for the next round",
+                "result": f"{company} - Final Selection List - Congratulations",
+                "interview": f"{company} - Technical Interview schedule",
+            }[kind]
+            names = "\n".join(f"{j + 1}. 21BCE{rng.randint(10000, 99999)}" for j in range(rng.randint(5, 60)))
+            text = f"Dear Students,\n\nPlease find the details below for {company}.\n\n{names}\n\n{FILLER}"
+
+        local = ts.astimezone(IST)
+        body = _make_body(text, fmt, rng)
+        emails.append({
+            "id": f"{i:016x}",
+            "subject": subject,
+            "from": COLLEGE_PLACEMENT_EMAIL,
+            "body": body,
+            "received_date": local.strftime("%d-%m-%Y"),
+            "received_time": local.strftime("%H:%M"),
+            "date_header": ts.strftime("%a, %d %b %Y %H:%M:%S +0000"),
+            "internal_ts": int(ts.timestamp() * 1000),
+            "kind": kind,
+            "format": fmt,
+            "html": _to_html(body) if fmt != "plain" else None,
+            "truth": truth,
+        })
+    return emails
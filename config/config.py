@@ -27,4 +27,210 @@ COLLEGE_PLACEMENT_EMAIL = "vitlions2026@vitbhopal.ac.in"
 # Gmail date format: YYYY/MM/DD
 BACKFILL_START_DATE = "2025/05/17"   # 17th May 2025
 BACKFILL_LIMIT = 3000                # Max mails to fetch in first big run
-# Set to None to disable backfill
\ No newline at end of file
+# Set to None to disable backfill
+
+# Sharded backfill: the range from BACKFILL_START_DATE to now is split into windows of
+# BACKFILL_WINDOW_DAYS days, fetched BACKFILL_WORKERS at a time (newest first) and
+# checkpointed per window, so an interrupted backfill resumes the unfinished windows.
+# BACKFILL_LIMIT does not apply; set BACKFILL_WINDOW_DAYS = None for one linear listing.
+BACKFILL_WINDOW_DAYS = 14
+BACKFILL_WORKERS = 4
+
+###############################
+# Gmail Fetch Configuration   #
+###############################
+
+# Max messages().get calls grouped into one batch HTTP request (Gmail caps this at 100)
+GMAIL_BATCH_SIZE = 100
+# How many times failed (429/5xx) batch sub-requests are retried before giving up
+GMAIL_BATCH_MAX_RETRIES = 3
+
+###############################
+# Ollama / LLM Configuration  #
+###############################
+
+# Ollama servers to spread extraction across (first one is the default endpoint)
+OLLAMA_URLS = ["http://localhost:11434"]
+OLLAMA_MODEL = "mistral"
+# Concurrent generations per endpoint (match the server's OLLAMA_NUM_PARALLEL)
+OLLAMA_MAX_IN_FLIGHT = 1
+# Seconds to wait for one generation before retrying on another endpoint
+OLLAMA_TIMEOUT = 300
+# Max endpoints tried per email
+OLLAMA_MAX_ATTEMPTS = 3
+
+# Pass the extraction JSON schema as Ollama's `format` (needs Ollama >= 0.5)
+OLLAMA_JSON_SCHEMA = True
+# Follow-up prompts asking only for the fields that failed validation (0 = blank them)
+EXTRACTION_REPAIR_ATTEMPTS = 1
+
+# On-disk cache of parsed LLM extractions (SQLite file, LRU-evicted)
+EXTRACTION_CACHE_PATH = "extraction_cache.sqlite3"
+EXTRACTION_CACHE_MAX_ENTRIES = 20000
+
+# Local copy of fetched Gmail messages, used for write-through caching and --offline replays
+MAIL_STORE_PATH = "mail_store.sqlite3"
+
+###############################
+# Mail Filter Configuration   #
+###############################
+
+# A mail is a first-round placement announcement if it mentions any include
+# keyword and none of the exclude keywords (subject or body, case-insensitive)
+PLACEMENT_INCLUDE_KEYWORDS = [
+    "placement", "internship", "drive", "dream offer", "super dream", "opportunity", "registration",
+    "category", "offer", "eligible branch", "campus program",
+]
+PLACEMENT_EXCLUDE_KEYWORDS = [
+    "shortlist", "short-listed", "shortlisted",
+    "selected students", "selected", "selection list",
+    "further round", "next round",
+    "interview", "technical interview", "group discussion",
+    "test scheduled", "online test",
+    "pre-placement talk", "pre placement talk",
+    "congratulations",
+    "selection process",
+    "technical round", "assessment", "round",
+]
+
+###############################
+# Extraction Mode             #
+###############################
+
+# "llm": every filtered mail goes to the LLM
+# "tiered": regex extractor first, LLM only for missing/low-confidence fields
+# "batched": LLM for every mail, several mails per prompt (see Batched LLM Extraction)
+EXTRACTION_MODE = "llm"
+# Regex field confidence (0-1) below which the LLM is asked for that field
+TIER_CONFIDENCE_THRESHOLD = 0.7
+# Fields that must be found with confidence; other fields may stay blank
+TIER_REQUIRED_FIELDS = ["company", "category", "branches", "last_date"]
+
+# How long Ollama keeps the model loaded after a request (Ollama duration string)
+OLLAMA_KEEP_ALIVE = "30m"
+# Max tokens generated per extraction; the JSON reply is far shorter than this
+OLLAMA_NUM_PREDICT = 512
+
+###############################
+# Prompt Condensation         #
+###############################
+
+# Convert HTML parts with the fast regex converter in utils/condense.py instead of html2text
+FAST_HTML_TO_TEXT = True
+# Strip quoted replies / footers / disclaimers and trim bodies before sending them to the LLM
+CONDENSE_BODIES = True
+# Approximate prompt budget for the mail body (label lines are kept first when trimming)
+CONDENSE_TOKEN_BUDGET = 1200
+CONDENSE_CHARS_PER_TOKEN = 4
+
+###############################
+# Run State                   #
+###############################
+
+# SQLite run-state store (replaces run_state.json, which is migrated on first run)
+RUN_STATE_DB_PATH = "run_state.sqlite3"
+# Message outcomes are committed every STATE_COMMIT_BATCH records or STATE_COMMIT_INTERVAL seconds
+STATE_COMMIT_BATCH = 20
+STATE_COMMIT_INTERVAL = 5.0
+# Mails whose extraction failed are extracted again at the start of later runs, up to this many attempts in all
+EXTRACTION_MAX_ATTEMPTS = 3
+
+###############################
+# Sheet Writer                #
+###############################
+
+# Rows are appended in chunks of SHEET_FLUSH_ROWS, or after SHEET_FLUSH_SECONDS
+SHEET_FLUSH_ROWS = 25
+SHEET_FLUSH_SECONDS = 60
+# Retries (exponential backoff + jitter) for 429 / 5xx / network errors
+SHEET_MAX_RETRIES = 6
+# Update rows already in the sheet (same company + category + mail date) instead of appending duplicates
+SHEET_UPSERT = True
+# --offline runs write their rows here instead of to the sheet
+OFFLINE_ROWS_PATH = "offline_rows.csv"
+
+###############################
+# Daemon Mode                 #
+###############################
+
+# Poll interval (seconds) right after new placement mail was processed ...
+DAEMON_POLL_ACTIVE_SECONDS = 30
+# ... during the placement cell's working hours (IST) ...
+DAEMON_POLL_WORKING_SECONDS = 120
+# ... and at night / on holidays
+DAEMON_POLL_IDLE_SECONDS = 900
+# "Recent activity" = a placement mail was processed within this many seconds
+DAEMON_ACTIVITY_WINDOW_SECONDS = 1800
+DAEMON_WORKING_HOURS = (9, 19)             # [start, end) hour, IST
+DAEMON_WORKING_DAYS = [0, 1, 2, 3, 4, 5]   # Monday = 0
+# Re-send the Ollama warm-up when the model has been idle this long (keep below OLLAMA_KEEP_ALIVE)
+DAEMON_REWARM_SECONDS = 1200
+
+###############################
+# Pipeline                    #
+###############################
+
+# "stream": generator-based streaming loop; "async": asyncio staged pipeline (utils/pipeline.py)
+PIPELINE_MODE = "stream"
+# Max items waiting between two pipeline stages (backpressure)
+PIPELINE_QUEUE_SIZE = 8
+# Gmail batch downloads (of GMAIL_BATCH_SIZE messages) running at once
+PIPELINE_FETCH_CONCURRENCY = 2
+# Mails extracted at once; None = total slots of the Ollama endpoints
+PIPELINE_EXTRACT_CONCURRENCY = None
+
+###############################
+# Metrics & Logging           #
+###############################
+
+# Default log level; DEBUG also logs every extracted mail and sheet row
+LOG_LEVEL = "INFO"
+# JSON run report with per-stage counters and timers (None to disable)
+RUN_REPORT_PATH = "run_report.json"
+# Prometheus textfile (e.g. for node_exporter's textfile collector); None to disable
+PROMETHEUS_TEXTFILE_PATH = None
+# Number of functions printed by --profile
+PROFILE_TOP = 25
+
+###############################
+# API Rate Limiting           #
+###############################
+
+# Gmail per-user quota (units per second) and the cost of each method in units
+GMAIL_QUOTA_UNITS_PER_SECOND = 250
+GMAIL_QUOTA_UNITS = {"messages.list": 5, "messages.get": 5, "history.list": 2, "profile": 1}
+# Most Gmail requests in flight at once across all threads (a batch counts as one);
+# halved on every throttled response, raised by one after a window of successes (AIMD)
+GMAIL_MAX_CONCURRENCY = 8
+# Sheets per-user quota and concurrency
+SHEETS_REQUESTS_PER_MINUTE = 60
+SHEETS_MAX_CONCURRENCY = 2
+# Throttled (429 / rateLimitExceeded / 5xx) Gmail requests are re-queued up to this many times
+RATE_LIMIT_MAX_THROTTLES = 20
+
+###############################
+# Batched LLM Extraction      #
+###############################
+
+# --extraction batched: several condensed mails per prompt
+LLM_BATCH_MAX_MAILS = 4
+# Estimated prompt tokens of the mails in one batch (longer mails go alone)
+LLM_BATCH_TOKEN_BUDGET = 2400
+# Seconds a partial batch waits for more mails before it is sent anyway
+LLM_BATCH_LINGER_SECONDS = 0.2
+
+###############################
+# Near-Duplicate Detection    #
+###############################
+
+# Reminders, deadline extensions and "Re:" forwards of a drive already extracted are
+# matched against a persisted MinHash LSH index: exact resends are skipped, and for
+# near-duplicates only the fields on changed lines are extracted (the row keeps the
+# original Mail Date, so the sheet upsert updates the existing row)
+NEAR_DUP_ENABLED = True
+NEAR_DUP_INDEX_PATH = "near_dup_index.sqlite3"
+# Jaccard similarity of the normalized body lines above which two mails are one drive
+NEAR_DUP_MIN_SIMILARITY = 0.75
+# LSH layout: NEAR_DUP_BANDS bands of NEAR_DUP_BAND_ROWS MinHash values each
+NEAR_DUP_BANDS = 8
+NEAR_DUP_BAND_ROWS = 4
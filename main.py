@@ -1,10 +1,34 @@
 import os
-import json
+import time
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timezone, timedelta
 
-from utils.email_utils import fetch_emails
-from utils.ai_extractor import ai_extract_offer
-from utils.filters import is_first_round_placement_mail
-from utils.sheets_utils import build_campus_placement_row, append_to_sheet
+# Imported first: its import time is the reference for the startup timing report
+from utils.google_clients import mark_startup, startup_report
+from utils.email_utils import (
+    iter_emails, fetch_new_emails, get_history_id, build_query, iter_message_ids,
+    list_new_message_ids, get_emails,
+)
+from utils.ai_extractor import ExtractionPool
+from utils.condense import condense_summary
+from utils.extraction_cache import ExtractionCache
+from utils.tiered_extractor import TieredExtractor
+from utils.batch_extractor import BatchExtractor
+from utils.mail_store import MailStore
+from utils.pipeline import Pipeline, Stage
+from utils.backfill import plan_windows, ShardedBackfill
+from utils.near_dup import NearDuplicateIndex, DedupExtractor, Duplicate
+from utils.metrics import metrics, incr, timer
+from utils.rate_limit import gmail_limiter, sheets_limiter
+from utils.state_store import (
+    RunStateStore, REJECTED, ACCEPTED, EXTRACTED, EXTRACTION_FAILED, DUPLICATE, FETCH_FAILED,
+)
+from utils.filters import is_first_round_placement_mail, may_be_first_round_placement_mail
+from utils.sheets_utils import build_campus_placement_row, SheetWriter, CsvRowWriter
 from config.config import (
     COLLEGE_PLACEMENT_EMAIL,
     SHEET_NAME_PLACEMENTS,
@@ -12,152 +36,711 @@ from config.config import (
     # Make sure these exist in config.py
     BACKFILL_START_DATE,   # e.g. "2025/05/17"
     BACKFILL_LIMIT,        # e.g. 3000
+    BACKFILL_WINDOW_DAYS,
+    EXTRACTION_MODE,
+    OLLAMA_URLS,
+    RUN_STATE_DB_PATH,
+    EXTRACTION_MAX_ATTEMPTS,
+    MAIL_STORE_PATH,
+    OFFLINE_ROWS_PATH,
+    EXTRACTION_CACHE_PATH,
+    GMAIL_BATCH_SIZE,
+    PIPELINE_MODE,
+    PIPELINE_FETCH_CONCURRENCY,
+    PIPELINE_EXTRACT_CONCURRENCY,
+    DAEMON_POLL_ACTIVE_SECONDS,
+    DAEMON_POLL_WORKING_SECONDS,
+    DAEMON_POLL_IDLE_SECONDS,
+    DAEMON_ACTIVITY_WINDOW_SECONDS,
+    DAEMON_WORKING_HOURS,
+    DAEMON_WORKING_DAYS,
+    DAEMON_REWARM_SECONDS,
+    LOG_LEVEL,
+    RUN_REPORT_PATH,
+    PROMETHEUS_TEXTFILE_PATH,
+    PROFILE_TOP,
+    NEAR_DUP_ENABLED,
+    NEAR_DUP_INDEX_PATH,
 )
 
+mark_startup("imports")
+
+# Legacy JSON state, migrated into the SQLite run-state store on first use
 STATE_FILE = "run_state.json"
 
+IST = timezone(timedelta(hours=5, minutes=30))
 
-def load_state():
-    """
-    Load processed Gmail message IDs and last seen timestamp (internal_ts) from disk.
-    Used to avoid re-processing old mails and to support incremental runs.
-    """
-    if not os.path.exists(STATE_FILE):
-        return {"processed_ids": set(), "last_ts": 0}
+logger = logging.getLogger(__name__)
+
+COLUMN_LABELS = [
+    "Sr.No",
+    "Company Name",
+    "Category",
+    "Eligible Branches",
+    "10th%",
+    "12th%",
+    "CGPA",
+    "CTC",
+    "Stipend",
+    "Last Date for Registration",
+    "Application Source",
+    "Application Status",
+    "Registration Links",
+    "Mail Date",
+    "Mail Time",
+]
 
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        processed_ids = set(data.get("processed_ids", []))
-        last_ts = data.get("last_ts", 0)
-        return {"processed_ids": processed_ids, "last_ts": last_ts}
-    except Exception as e:
-        print("Error loading state, starting fresh:", e)
-        return {"processed_ids": set(), "last_ts": 0}
 
+def print_row(rec):
+    """Log a sheet row with its column labels (debug level)."""
+    if logger.isEnabledFor(logging.DEBUG):
+        lines = [f"{k}: {v}" for k, v in zip(COLUMN_LABELS, rec)]
+        logger.debug("\n".join(["=" * 60, *lines, "=" * 60]))
 
-def save_state(processed_ids, last_ts):
+
+def open_state(path=RUN_STATE_DB_PATH, legacy_path=STATE_FILE):
     """
-    Persist processed_ids and last_ts to disk so future runs only handle new mails.
+    Open the run-state store, importing a legacy run_state.json once if present.
+    Used to avoid re-processing old mails and to support incremental runs.
     """
+    state = RunStateStore(path)
+    if legacy_path is None:
+        return state
     try:
-        data = {
-            "processed_ids": list(processed_ids),
-            "last_ts": int(last_ts) if last_ts else 0,
-        }
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
+        migrated = state.migrate_json(legacy_path)
+        if migrated:
+            print(f"📦 Migrated {migrated} processed ids from {legacy_path}.")
     except Exception as e:
-        print("Error saving state:", e)
+        print(f"Error migrating {legacy_path}, keeping it as is:", e)
+    return state
 
 
-def main():
-    state = load_state()
-    processed_ids = state["processed_ids"]
-    last_ts = state["last_ts"]  # last Gmail internal_ts (UTC ms) we saw
+def make_selector(processed_ids, last_ts, progress, ledger=None):
+    """
+    Return a function email -> bool that accepts new first-round placement mails.
 
-    # Decide mode: first run (backfill) vs incremental
-    if last_ts == 0 and not processed_ids:
-        # 🔹 First ever run: backfill from a given date and up to BACKFILL_LIMIT mails
-        print("🚀 First run: Backfilling from", BACKFILL_START_DATE)
-        emails = fetch_emails(
-            limit=BACKFILL_LIMIT,
-            sender_filter=COLLEGE_PLACEMENT_EMAIL,
-            start_date=BACKFILL_START_DATE,
-        )
-    else:
-        # 🔹 Subsequent runs: only care about new mails since last run
-        print("🔁 Incremental run: processing only new emails.")
-        # Fetch a recent window (e.g. last 500 messages); we will filter by internal_ts + processed_ids
-        emails = fetch_emails(
-            limit=500,
-            sender_filter=COLLEGE_PLACEMENT_EMAIL,
-            # no start_date here; internal_ts + processed_ids handle recency
-        )
-
-    print(f"Fetched {len(emails)} emails.")
-    for e in emails[:10]:
-        print(f"From: {e.get('from')} | Subject: {e.get('subject')}")
-
-    placement_rows = []
-    max_ts_seen = last_ts
-
-    # Apply filtering and extraction
-    for email in emails:
+    Tracks the max internal_ts seen (and the number of emails seen) in the
+    `progress` dict as emails flow through, so nothing needs to be buffered.
+    If a RunStateStore `ledger` is given, each filter decision is recorded in it.
+    """
+    def select(email):
         msg_id = email.get("id")
         internal_ts = email.get("internal_ts") or 0  # Gmail internalDate in ms
+        progress["seen"] += 1
 
         # Track maximum timestamp we've seen this run
-        if internal_ts and internal_ts > max_ts_seen:
-            max_ts_seen = internal_ts
+        if internal_ts and internal_ts > progress["max_ts"]:
+            progress["max_ts"] = internal_ts
 
         # Skip if we've already processed this message in a previous run
         if msg_id and msg_id in processed_ids:
-            continue
+            incr("filter.already_processed")
+            return False
 
         # For incremental runs, skip mails older than or equal to last_ts
         if last_ts and internal_ts and internal_ts <= last_ts:
-            continue
+            incr("filter.older_than_last_run")
+            return False
 
         # Filter out shortlists, further rounds, result mails, etc.
-        if not is_first_round_placement_mail(email):
-            continue
+        accepted = is_first_round_placement_mail(email)
+        incr("filter.accepted" if accepted else "filter.rejected")
+        if ledger is not None and msg_id:
+            ledger.record(msg_id, ACCEPTED if accepted else REJECTED, internal_ts or None)
+        return accepted
+    return select
+
+
+def select_candidates(emails, processed_ids, last_ts, progress, ledger=None):
+    """Lazily filter a stream of emails down to new first-round placement mails (see make_selector)."""
+    select = make_selector(processed_ids, last_ts, progress, ledger)
+    return (email for email in emails if select(email))
+
+
+def make_triage(ledger):
+    """
+    Metadata-phase filter for email_utils: rejects mails whose subject/snippet
+    already rule them out and records them in the ledger, so their bodies are
+    never downloaded and they are never looked at again.
+    """
+    def triage(meta_email):
+        if may_be_first_round_placement_mail(meta_email):
+            return True
+        ledger.record(meta_email["id"], REJECTED, meta_email.get("internal_ts"))
+        return False
+    return triage
+
+
+class Session:
+    """
+    Long-lived resources of a run: run-state ledger, mail store, extraction
+    cache, near-duplicate index, Ollama pool and sheet writer (Gmail/Sheets
+    clients are cached by utils/google_clients.py). A one-shot run uses it for
+    one sync; the daemon keeps it open across polls so nothing is rebuilt or
+    reloaded between them.
+
+    - data_dir: directory for the SQLite files (default: current directory,
+      with the legacy run_state.json migrated once)
+    - ollama_urls: Ollama endpoints (default OLLAMA_URLS)
+    """
+
+    def __init__(self, args, data_dir=None, ollama_urls=None):
+        def path(name):
+            return os.path.join(data_dir, name) if data_dir else name
+
+        self.args = args
+        self.report_path = args.report or (path(RUN_REPORT_PATH) if RUN_REPORT_PATH else None)
+        self.prometheus_path = args.prometheus or PROMETHEUS_TEXTFILE_PATH
+        self.cache = None
+        if args.purge_cache or not args.no_cache:
+            self.cache = ExtractionCache(path(EXTRACTION_CACHE_PATH))
+            if args.purge_cache:
+                self.cache.purge()
+                print("🧹 Extraction cache purged.")
+            if args.no_cache:
+                self.cache.close()
+                self.cache = None
+
+        if args.offline:
+            # A replay leaves the real ledger (and its sync point) alone
+            self.state = RunStateStore(":memory:")
+        else:
+            self.state = open_state(path(RUN_STATE_DB_PATH), legacy_path=None if data_dir else STATE_FILE)
+        self.store = MailStore(path(MAIL_STORE_PATH))
+        self.dedup = None
+        if NEAR_DUP_ENABLED and not args.no_dedup:
+            self.dedup = NearDuplicateIndex(path(NEAR_DUP_INDEX_PATH))
+
+        # Start loading the model now so it is warm by the time the first mail is filtered
+        self.pool = ExtractionPool(base_urls=ollama_urls or OLLAMA_URLS, cache=self.cache)
+        self.pool.warm_up()
+        self.tiered = TieredExtractor(self.pool) if args.extraction == "tiered" else None
+        self.batcher = BatchExtractor(self.pool) if args.extraction == "batched" else None
+
+        if args.offline:
+            # Offline runs make no Sheets calls: rows go to a local CSV file
+            self.writer = CsvRowWriter(path(OFFLINE_ROWS_PATH), header=COLUMN_LABELS)
+        else:
+            # Rows go to the sheet in chunks while extraction continues; each flushed
+            # chunk is marked as written in the ledger
+            self.writer = SheetWriter(
+                sheet_name=SHEET_NAME_PLACEMENTS,
+                sheet_id=SHEET_ID,
+                on_flush=self.state.mark_written,
+            )
+            # Rows left unwritten by an interrupted run go first
+            for msg_id, row, internal_ts in self.state.pending_rows():
+                print_row(row)
+                self.writer.add(row, key=msg_id, ts=internal_ts)
+
+    def extractor(self):
+        """(per-mail extract function, mails to extract at once) for the --extraction mode."""
+        extract, slots = self.pool.extract, sum(ep.max_in_flight for ep in self.pool.endpoints)
+        if self.tiered is not None:
+            extract = self.tiered.extract
+        elif self.batcher is not None:
+            extract, slots = self.batcher.extract, self.batcher.concurrency
+        if self.dedup is not None:
+            # Resent drives are matched before anything is extracted
+            extract = DedupExtractor(self.dedup, extract, self.pool).extract
+        return extract, slots
+
+    def write_reports(self):
+        """Write the JSON run report and, if configured, the Prometheus textfile."""
+        try:
+            if self.report_path:
+                metrics.write_json(self.report_path, extra={
+                    "mode": {"extraction": self.args.extraction, "pipeline": self.args.pipeline,
+                             "daemon": self.args.daemon, "offline": self.args.offline},
+                    "startup": startup_report(),
+                    "sheet": self.writer.summary(),
+                    "llm": self.pool.timing_summary(),
+                    "condense": condense_summary(),
+                    "cache": self.cache.stats() if self.cache is not None else None,
+                    "tiered": self.tiered.summary() if self.tiered is not None else None,
+                    "batched": self.batcher.summary() if self.batcher is not None else None,
+                    "dedup": self.dedup.summary() if self.dedup is not None else None,
+                    "rate_limit": [gmail_limiter.summary(), sheets_limiter.summary()],
+                })
+            if self.prometheus_path:
+                metrics.write_prometheus(self.prometheus_path)
+        except OSError as e:
+            print(f"Could not write run report: {e}")
+
+    def close(self):
+        """Write the remaining rows, print the run reports and close everything."""
+        try:
+            if self.writer.rows_added == 0:
+                print("⚠️ No valid company placement offer mails found.")
+            elif not self.writer.close():
+                print("⚠️ Some rows could not be written; they will be retried next run.")
+            print("Sheet writes:", self.writer.summary())
+        finally:
+            print("LLM timing:", self.pool.timing_summary())
+            condensed = condense_summary()
+            if condensed["mails"]:
+                print(f"Condensed bodies: {condensed['mails']} mails, {condensed['chars_in']} -> "
+                      f"{condensed['chars_out']} chars ({condensed['reduction_pct']}% smaller)")
+            self.write_reports()
+            if self.report_path:
+                print(f"📊 Run report written to {self.report_path}")
+            self.pool.close()
+            self.store.close()
+            if self.tiered is not None:
+                print("Tiered extraction:", self.tiered.summary())
+            if self.batcher is not None:
+                print("Batched extraction:", self.batcher.summary())
+            if self.dedup is not None:
+                print("Near-duplicates:", self.dedup.summary())
+                self.dedup.close()
+            if self.cache is not None:
+                print("Extraction cache:", self.cache.stats())
+                self.cache.close()
+            self.state.close()
+            print("Startup:", startup_report())
+
+
+def handle_extraction(session, email, extracted, progress):
+    """Build the sheet row for one extraction and record the outcome. Returns the row or None."""
+    msg_id = email.get("id")
+    logger.debug("Subject: %s", email['subject'])
+    logger.debug("Extracted: %s", extracted)
+
+    if isinstance(extracted, Duplicate):
+        # Nothing new: the drive's row came from the mail it duplicates
+        incr("extract.duplicates")
+        if msg_id:
+            session.state.record(msg_id, DUPLICATE, email.get("internal_ts"))
+        return None
+
+    if not extracted:
+        incr("extract.failed")
+        if msg_id:
+            session.state.record(msg_id, EXTRACTION_FAILED, email.get("internal_ts"))
+        return None
+
+    # Attach mail received date & time (filled in email_utils); near-duplicates
+    # already carry those of the drive's first mail, which identify its sheet row
+    extracted.setdefault("mail_date", email.get("received_date", ""))
+    extracted.setdefault("mail_time", email.get("received_time", ""))
+
+    row = build_campus_placement_row(extracted)
+
+    # Record the row right away so a crash does not lose the extraction
+    if msg_id:
+        session.state.record(msg_id, EXTRACTED, email.get("internal_ts"), row)
+    print_row(row)
+    progress["extracted"] += 1
+    incr("extract.rows")
+    return row
+
+
+def process(session, emails, selection_ids, selection_ts, progress, stop=None):
+    """
+    Filter, extract and queue sheet rows for a stream of emails.
+    Returns False if `stop` was set before the stream was exhausted.
+    """
+    candidates = select_candidates(emails, selection_ids, selection_ts, progress, ledger=session.state)
+
+    # Streaming LLM extraction, spread across the configured Ollama endpoints
+    extract, workers = session.extractor()
+    try:
+        for email, extracted in session.pool.extract_stream(candidates, extract=extract, workers=workers):
+            row = handle_extraction(session, email, extracted, progress)
+            if row is not None:
+                session.writer.add(row, key=email.get("id"), ts=email.get("internal_ts"))
+            if stop is not None and stop.is_set():
+                return False
+        return True
+    finally:
+        # Commit outcomes recorded so far, even on Ctrl-C or a crash
+        session.state.flush()
+
+
+def _until_stopped(iterable, stop, status):
+    """Pass items through until `stop` is set; status["stopped"] tells whether it was."""
+    for item in iterable:
+        if stop is not None and stop.is_set():
+            status["stopped"] = True
+            return
+        yield item
+
 
-        # LLM extraction
-        extracted = ai_extract_offer(email)
-        print(f"Subject: {email['subject']}")
-        print("Extracted:", extracted)  # Debug
+def process_async(session, source, selection_ids, selection_ts, progress, stop=None,
+                  id_chunks=False, sender_filter=None, failed=None):
+    """
+    Same as process(), as an asyncio staged pipeline (utils/pipeline.py):
+    [fetch bodies ->] filter -> extract -> build row -> sheet writer.
+
+    - source: emails, or lists of Gmail message ids if `id_chunks` (the fetch
+      stage then downloads them, with the metadata triage, PIPELINE_FETCH_CONCURRENCY
+      batches at a time)
+    - The extract stage runs as many mails at once as the Ollama pool has
+      slots; when it falls behind, the bounded queues stop the fetch stage.
+    - failed: optional dict collecting the ids the fetch stage could not download
+    Returns False if `stop` was set before the source was exhausted.
+    """
+    state = session.state
+    select = make_selector(selection_ids, selection_ts, progress, ledger=state)
+    extract, extract_slots = session.extractor()
+    extract_slots = PIPELINE_EXTRACT_CONCURRENCY or extract_slots
+    triage = make_triage(state)
+
+    def to_row(item):
+        email, extracted = item
+        row = handle_extraction(session, email, extracted, progress)
+        return (email.get("id"), row, email.get("internal_ts")) if row is not None else None
+
+    def write(item):
+        msg_id, row, internal_ts = item
+        session.writer.add(row, key=msg_id, ts=internal_ts)
+        return None
+
+    stages = []
+    if id_chunks:
+        stages.append(Stage(
+            "fetch",
+            lambda ids: get_emails(ids, session.store, skip=state, prefilter=triage,
+                                   sender_filter=sender_filter, failed=failed),
+            concurrency=PIPELINE_FETCH_CONCURRENCY, flatten=True,
+        ))
+    stages += [
+        Stage("filter", lambda email: email if select(email) else None, blocking=False),
+        Stage("extract", lambda email: (email, extract(email)), concurrency=extract_slots),
+        Stage("row", to_row, blocking=False),
+        Stage("sheet", write),
+    ]
+
+    status = {"stopped": False}
+    pipeline = progress["pipeline"] = Pipeline(stages)
+    try:
+        pipeline.run(_until_stopped(source, stop, status))
+    finally:
+        state.flush()
+        print("Pipeline:", pipeline.summary())
+    return not status["stopped"]
 
-        if extracted:
-            # Attach mail received date & time (filled in email_utils)
-            extracted["mail_date"] = email.get("received_date", "")
-            extracted["mail_time"] = email.get("received_time", "")
 
-            row = build_campus_placement_row(extracted)
-            placement_rows.append(row)
+def retry_failed_extractions(session, stop=None):
+    """
+    Extract again the mails whose extraction failed in earlier runs (fewer than
+    EXTRACTION_MAX_ATTEMPTS times so far). Each failure counts as one attempt,
+    so a mail the extractor cannot handle is given up on eventually.
+    """
+    msg_ids = session.state.failed_extractions(EXTRACTION_MAX_ATTEMPTS)
+    if not msg_ids:
+        return
+    print(f"🔁 Retrying {len(msg_ids)} emails whose extraction failed before.")
+    try:
+        # Bodies come from the mail store; only mails missing there are downloaded
+        emails = get_emails(msg_ids, session.store)
+    except Exception as e:
+        print(f"❌ Failed to fetch the emails to retry: {e}")
+        return
+    progress = {"seen": 0, "max_ts": 0, "extracted": 0}
+    process(session, emails, set(), 0, progress, stop)
+    print(f"Retried extractions: {progress['extracted']}/{len(msg_ids)} rows extracted.")
 
-            # Mark this message as processed
-            if msg_id:
-                processed_ids.add(msg_id)
 
-    if not placement_rows:
-        print("⚠️ No valid company placement offer mails found.")
+def sync(session, stop=None):
+    """
+    One pass over new mail: offline replay, first-run backfill or incremental
+    sync, chosen from the run state, after retrying earlier failed extractions.
+    The sync point (last_ts / history_id) is only advanced if the pass
+    completed. Returns the progress dict.
+    """
+    args, state, store = session.args, session.state, session.store
+    last_ts = state.get_meta("last_ts", 0)  # last Gmail internal_ts (UTC ms) we saw
+    history_id = state.get_meta("history_id")  # Gmail historyId at the end of the last run
+    use_pipeline = args.pipeline == "async"
+    # The async pipeline downloads bodies in its own stage, so Gmail sources are id chunks
+    id_chunks = False
+    sender_filter = None
+    backfill = None
+    failed = {}  # message ids Gmail would not give us: {msg_id: FETCH_FAILED | UNAVAILABLE}
+
+    if not args.offline:
+        retry_failed_extractions(session, stop)
+
+    # Decide mode: offline replay, first run (backfill) or incremental
+    if args.offline:
+        # 🔹 Replay every stored mail since BACKFILL_START_DATE, e.g. after a prompt change
+        print(f"📦 Offline run: replaying {len(store)} stored emails.")
+        since_ts = int(datetime.strptime(BACKFILL_START_DATE, "%Y/%m/%d").timestamp() * 1000)
+        emails = store.iter_emails(sender=COLLEGE_PLACEMENT_EMAIL, since_ts=since_ts)
+        # Re-extract regardless of what earlier runs already processed
+        selection_ids, selection_ts = set(), 0
+        if session.dedup is not None:
+            # Drives are regrouped from the replayed extractions
+            session.dedup.purge()
+    elif BACKFILL_WINDOW_DAYS and (state.backfill_in_progress() or (last_ts == 0 and state.is_empty())):
+        # 🔹 First run, sharded: date windows fetched in parallel, each checkpointed when done
+        if state.backfill_in_progress():
+            print("🚀 Resuming the backfill from", BACKFILL_START_DATE)
+        else:
+            print("🚀 First run: Backfilling from", BACKFILL_START_DATE)
+            # Remember where the mailbox is now so the run after the backfill can sync from here
+            state.set_meta("backfill_history_id", get_history_id())
+            state.plan_backfill(plan_windows(BACKFILL_START_DATE))
+        history_id = state.get_meta("backfill_history_id")
+        emails = backfill = ShardedBackfill(state, store=store, prefilter=make_triage(state), stop=stop,
+                                             failed=failed)
+        selection_ids, selection_ts = state, last_ts
+    elif last_ts == 0 and state.is_empty():
+        # 🔹 First ever run: backfill from a given date and up to BACKFILL_LIMIT mails
+        print("🚀 First run: Backfilling from", BACKFILL_START_DATE)
+        # Remember where the mailbox is now so the next run can sync from here
+        history_id = get_history_id()
+        if use_pipeline:
+            query = build_query(COLLEGE_PLACEMENT_EMAIL, start_date=BACKFILL_START_DATE)
+            emails, id_chunks = iter_message_ids(query, limit=BACKFILL_LIMIT, stop=stop), True
+        else:
+            # Generator: emails are filtered and extracted while later pages are still downloading
+            emails = iter_emails(
+                limit=BACKFILL_LIMIT,
+                sender_filter=COLLEGE_PLACEMENT_EMAIL,
+                start_date=BACKFILL_START_DATE,
+                store=store,
+                skip=state,
+                prefilter=make_triage(state),
+                failed=failed,
+            )
+        # The store answers `msg_id in state` with an indexed lookup
+        selection_ids, selection_ts = state, last_ts
     else:
-        for rec in placement_rows:
-            print("=" * 60)
-            for k, v in zip(
-                [
-                    "Sr.No",
-                    "Company Name",
-                    "Category",
-                    "Eligible Branches",
-                    "10th%",
-                    "12th%",
-                    "CGPA",
-                    "CTC",
-                    "Stipend",
-                    "Last Date for Registration",
-                    "Application Source",
-                    "Application Status",
-                    "Registration Links",
-                    "Mail Date",
-                    "Mail Time",
-                ],
-                rec,
-            ):
-                print(f"{k}: {v}")
-            print("=" * 60)
-
-        # Push all found placement rows to Google Sheet
-        append_to_sheet(
-            placement_rows,
-            sheet_name=SHEET_NAME_PLACEMENTS,
-            sheet_id=SHEET_ID,
-        )
-
-    # Save updated state for next 6-hour run
-    save_state(processed_ids, max_ts_seen)
+        # 🔹 Subsequent runs: only care about new mails since last run
+        print("🔁 Incremental run: processing only new emails.")
+        # Only messages added since the saved historyId (or after last_ts if it expired)
+        if use_pipeline:
+            try:
+                message_ids, history_id = list_new_message_ids(
+                    history_id, last_ts, COLLEGE_PLACEMENT_EMAIL
+                )
+            except Exception as e:
+                print(f"❌ Failed to list new emails: {e}")
+                message_ids = []
+            emails = [message_ids[i:i + GMAIL_BATCH_SIZE]
+                      for i in range(0, len(message_ids), GMAIL_BATCH_SIZE)]
+            # History covers the whole mailbox, so the fetch stage applies the sender filter
+            id_chunks, sender_filter = True, COLLEGE_PLACEMENT_EMAIL
+        else:
+            emails, history_id = fetch_new_emails(
+                history_id=history_id,
+                last_ts=last_ts,
+                sender_filter=COLLEGE_PLACEMENT_EMAIL,
+                store=store,
+                skip=state,
+                prefilter=make_triage(state),
+                failed=failed,
+            )
+        # The store answers `msg_id in state` with an indexed lookup
+        selection_ids, selection_ts = state, last_ts
+
+    progress = {"seen": 0, "max_ts": last_ts, "extracted": 0}
+    with timer("run.sync"):
+        try:
+            if use_pipeline:
+                completed = process_async(session, emails, selection_ids, selection_ts, progress, stop,
+                                          id_chunks=id_chunks, sender_filter=sender_filter,
+                                          failed=failed)
+            else:
+                completed = process(session, emails, selection_ids, selection_ts, progress, stop)
+        except Exception as e:
+            # E.g. Gmail failing partway through the listing: the rows extracted so far
+            # are kept, but the sync point stays put so the rest is fetched next run
+            print(f"❌ Sync failed partway: {e}")
+            completed = False
+    print(f"Fetched {progress['seen']} emails.")
+
+    # Failed downloads go in the ledger; the sync point waits until they are fetched
+    for msg_id, outcome in list(failed.items()):
+        state.record(msg_id, outcome)
+    retry_ids = [msg_id for msg_id, outcome in failed.items() if outcome == FETCH_FAILED]
+    if retry_ids:
+        print(f"⚠️ {len(retry_ids)} emails could not be downloaded; they will be fetched next run.")
+        completed = False
+
+    # Rows of this pass go out now instead of waiting for the next chunk
+    session.writer.flush()
+
+    if backfill is not None:
+        # Every mail has been handled now, so the remaining fetched windows can be checkpointed
+        backfill.settle()
+        print("Backfill windows:\n" + backfill.report())
+        if state.backfill_in_progress():
+            completed = False
+        else:
+            # Newest mail over all windows, including those of earlier (interrupted) runs
+            progress["max_ts"] = max([progress["max_ts"] or 0]
+                                     + [w[4] or 0 for w in state.backfill_windows()])
+
+    if args.offline:
+        print(f"📦 Offline run: rows written to {session.writer.path}; the sync point was not touched.")
+    elif completed:
+        # Save updated state for the next run / poll
+        max_ts_seen = progress["max_ts"]
+        state.set_meta("last_ts", int(max_ts_seen) if max_ts_seen else 0)
+        state.set_meta("history_id", history_id)
+    else:
+        print("⏹️ The pass did not complete; the sync point was not advanced.")
+    return progress
+
+
+def next_poll_interval(now=None, last_activity=None):
+    """
+    Seconds until the daemon's next Gmail poll.
+
+    - DAEMON_POLL_ACTIVE_SECONDS if a placement mail was processed within the
+      last DAEMON_ACTIVITY_WINDOW_SECONDS (drives and their reminders come in bursts)
+    - DAEMON_POLL_WORKING_SECONDS during working hours/days (IST)
+    - DAEMON_POLL_IDLE_SECONDS otherwise (nights, Sundays)
+    now: aware datetime (default: current time); last_activity: epoch seconds or None
+    """
+    now = (now or datetime.now(IST)).astimezone(IST)
+    if last_activity is not None and now.timestamp() - last_activity < DAEMON_ACTIVITY_WINDOW_SECONDS:
+        return DAEMON_POLL_ACTIVE_SECONDS
+    start_hour, end_hour = DAEMON_WORKING_HOURS
+    if now.weekday() in DAEMON_WORKING_DAYS and start_hour <= now.hour < end_hour:
+        return DAEMON_POLL_WORKING_SECONDS
+    return DAEMON_POLL_IDLE_SECONDS
+
+
+def run_daemon(session, stop, poll_interval=None):
+    """Poll for new mail until `stop` is set, keeping the session (clients, pools, model) warm."""
+    print("👀 Daemon mode: watching for new placement mail (SIGTERM / Ctrl-C to stop).")
+    last_activity = None
+    last_llm_use = time.monotonic()
+    while not stop.is_set():
+        if time.monotonic() - last_llm_use >= DAEMON_REWARM_SECONDS:
+            session.pool.warm_up()
+            last_llm_use = time.monotonic()
+
+        progress = sync(session, stop)
+        session.write_reports()
+        if progress["extracted"]:
+            last_activity = time.time()
+            last_llm_use = time.monotonic()
+
+        interval = poll_interval or next_poll_interval(last_activity=last_activity)
+        if not stop.is_set():
+            print(f"💤 Next poll in {interval}s.")
+        stop.wait(interval)
+    print("👋 Daemon stopping.")
+
+
+def start_fakes(args, stop):
+    """
+    --fake: serve a synthetic mailbox through the fake Gmail/Sheets services and
+    a local fake Ollama server (utils/fakes.py). In daemon mode new mails keep
+    arriving every few seconds. Returns (fake Ollama server, data directory as
+    a tempfile.TemporaryDirectory, for the caller to clean up).
+    """
+    from benchmarks.corpus import generate_corpus
+    from utils.fakes import FakeGmailService, FakeSheetsService, FakeOllamaServer, install_fake_services
+
+    corpus = generate_corpus(args.fake + (100 if args.daemon else 0))
+    gmail = FakeGmailService(corpus[:args.fake])
+    sheets = FakeSheetsService({SHEET_NAME_PLACEMENTS: [list(COLUMN_LABELS)]})
+    install_fake_services(gmail, sheets)
+    if args.daemon:
+        gmail.deliver(corpus[args.fake:], interval=5, stop=stop)
+
+    data_dir = tempfile.TemporaryDirectory(prefix="patlens-fake-")
+    print(f"🧪 Fake services: {args.fake} mails, state in {data_dir.name}")
+    return FakeOllamaServer().start(), data_dir
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PATLens – campus placement mail tracker")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="bypass the LLM extraction cache for this run")
+    parser.add_argument("--purge-cache", action="store_true",
+                        help="delete all cached LLM extractions before running")
+    parser.add_argument("--offline", action="store_true",
+                        help="replay filtering and extraction over the local mail store "
+                             f"without calling the Gmail or Sheets APIs; rows go to {OFFLINE_ROWS_PATH} "
+                             "and the run state is left as it is")
+    parser.add_argument("--extraction", choices=["llm", "tiered", "batched"], default=EXTRACTION_MODE,
+                        help="llm: LLM for every mail; tiered: regex first, LLM only for "
+                             "low-confidence fields; batched: several mails per LLM prompt "
+                             "(default from config.py)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="extract every mail, even resends of a drive already extracted")
+    parser.add_argument("--pipeline", choices=["stream", "async"], default=PIPELINE_MODE,
+                        help="stream: generator-based streaming; async: asyncio staged pipeline "
+                             "with bounded queues (default from config.py)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and poll Gmail for new mail at an adaptive interval")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="fixed daemon poll interval in seconds (default: adaptive)")
+    parser.add_argument("--fake", type=int, nargs="?", const=300, default=0, metavar="N",
+                        help="run against fake Gmail/Sheets/Ollama with N synthetic mails "
+                             "(default 300) and a temporary state directory")
+    parser.add_argument("--log-level", default=LOG_LEVEL,
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also logs every extracted mail and sheet row")
+    parser.add_argument("--report", metavar="PATH", default=None,
+                        help=f"JSON run report with per-stage metrics (default {RUN_REPORT_PATH})")
+    parser.add_argument("--prometheus", metavar="PATH", default=None,
+                        help="also write the metrics as a Prometheus textfile")
+    parser.add_argument("--profile", metavar="PATH", nargs="?", const="patlens.pstats", default=None,
+                        help="run under cProfile (main thread), save the stats to PATH "
+                             "(default patlens.pstats) and print the top hot spots")
+    args = parser.parse_args(argv)
+    if args.daemon and args.offline:
+        parser.error("--daemon and --offline cannot be combined")
+    return args
+
+
+def run(args):
+    # SIGTERM (and Ctrl-C in daemon mode) finish the current mail, flush and exit
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    if args.daemon:
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+    fake_ollama, fake_dir, ollama_urls = None, None, None
+    if args.fake:
+        fake_ollama, fake_dir = start_fakes(args, stop)
+        ollama_urls = [fake_ollama.url]
+
+    try:
+        session = Session(args, data_dir=fake_dir.name if fake_dir else None, ollama_urls=ollama_urls)
+        try:
+            if args.daemon:
+                run_daemon(session, stop, args.poll_interval)
+            else:
+                sync(session, stop)
+        finally:
+            session.close()
+    finally:
+        if fake_ollama is not None:
+            fake_ollama.stop()
+        if fake_dir is not None:
+            # The fake run's state (and its default run report) goes with it
+            fake_dir.cleanup()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    if not args.profile:
+        run(args)
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        run(args)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"🔬 Profile saved to {args.profile}; top {PROFILE_TOP} by cumulative time:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_TOP)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
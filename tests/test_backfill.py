@@ -0,0 +1,108 @@
+"""
+Sharded backfill interrupted mid-run and resumed, against the fake services.
+
+    python -m unittest tests.test_backfill
+"""
+import shutil
+import tempfile
+import unittest
+import functools
+import threading
+from unittest import mock
+
+import main as app
+from benchmarks.corpus import generate_corpus
+from utils.backfill import plan_windows
+from utils.fakes import FakeGmailService, FakeSheetsService, FakeOllamaServer, install_fake_services
+from utils.filters import is_first_round_placement_mail
+from utils.state_store import ACCEPTED, FETCH_FAILED, PROCESSED_OUTCOMES
+
+
+class ResumedBackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.corpus = generate_corpus(120)
+        self.gmail = FakeGmailService(self.corpus)
+        self.sheets = FakeSheetsService({app.SHEET_NAME_PLACEMENTS: [list(app.COLUMN_LABELS)]})
+        install_fake_services(self.gmail, self.sheets)
+        self.ollama = FakeOllamaServer(ttft=0.0).start()
+        self.data_dir = tempfile.mkdtemp(prefix="patlens-test-")
+        # One-day windows, so the extractor reads ahead across many window boundaries
+        self._plan_windows = app.plan_windows
+        app.plan_windows = functools.partial(plan_windows, window_days=1)
+
+    def tearDown(self):
+        app.plan_windows = self._plan_windows
+        self.ollama.stop()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def _sync(self, stop_after_rows=None):
+        args = app.parse_args(["--extraction", "batched", "--no-dedup", "--no-cache"])
+        session = app.Session(args, data_dir=self.data_dir, ollama_urls=[self.ollama.url])
+        stop = threading.Event()
+        if stop_after_rows:
+            add = session.writer.add
+
+            def add_then_stop(row, key=None, ts=None):
+                add(row, key=key, ts=ts)
+                if session.writer.rows_added >= stop_after_rows:
+                    stop.set()
+            session.writer.add = add_then_stop
+        try:
+            app.sync(session, stop)
+        finally:
+            session.close()
+
+    def _state(self):
+        return app.open_state(f"{self.data_dir}/{app.RUN_STATE_DB_PATH}", legacy_path=None)
+
+    def _assert_all_processed(self, state):
+        placement_ids = [e["id"] for e in self.corpus if is_first_round_placement_mail(e)]
+        outcomes = {msg_id: state.outcome(msg_id) for msg_id in placement_ids}
+        self.assertNotIn(ACCEPTED, outcomes.values())
+        unprocessed = {k: v for k, v in outcomes.items() if v not in PROCESSED_OUTCOMES}
+        self.assertEqual(unprocessed, {})
+
+    def test_resume_extracts_every_accepted_mail(self):
+        self._sync(stop_after_rows=1)
+        state = self._state()
+        self.assertTrue(state.backfill_in_progress())
+        state.close()
+
+        self._sync()
+        state = self._state()
+        try:
+            self.assertFalse(state.backfill_in_progress())
+            self._assert_all_processed(state)
+        finally:
+            state.close()
+
+    def test_window_with_failed_download_stays_pending(self):
+        failing = next(e for e in self.corpus if is_first_round_placement_mail(e))
+        self.gmail.unreachable.add(failing["id"])
+        # No backoff between the batch retries
+        with mock.patch("utils.email_utils.time.sleep"):
+            self._sync()
+        state = self._state()
+        try:
+            self.assertEqual(state.outcome(failing["id"]), FETCH_FAILED)
+            pending = state.backfill_windows(pending_only=True)
+            self.assertTrue(any(start * 1000 <= failing["internal_ts"] < end * 1000
+                                for start, end, *_ in pending))
+            self.assertIsNone(state.get_meta("last_ts"))
+        finally:
+            state.close()
+
+        self.gmail.unreachable.clear()
+        self._sync()
+        state = self._state()
+        try:
+            self.assertFalse(state.backfill_in_progress())
+            self._assert_all_processed(state)
+            self.assertTrue(state.get_meta("last_ts"))
+        finally:
+            state.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+SheetWriter upserts against the fake Sheets service.
+
+    python -m unittest tests.test_sheets_utils
+"""
+import unittest
+
+from utils.fakes import FakeSheetsService
+from utils.sheets_utils import SheetWriter, build_campus_placement_row
+
+TAB = "Campus Placements"
+CTC = 7  # column of the CTC in a placement row
+
+# Two mails about the same drive on the same day, newest first (as Gmail lists them)
+NEWER = ({"company": "Acme Corp", "category": "Dream", "ctc": "14 LPA", "mail_date": "10-12-2025"},
+         1765360800000)
+OLDER = ({"company": "Acme Corp", "category": "Dream", "ctc": "12 LPA", "mail_date": "10-12-2025"},
+         1765350000000)
+
+
+class UpsertOrderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sheets = FakeSheetsService({TAB: [["Sr.No", "Company Name", "Category"]]})
+        self.writer = SheetWriter(sheet_name=TAB, sheet_id="sheet", service=self.sheets,
+                                  chunk_size=100, flush_interval=3600, upsert=True)
+
+    def _add(self, mail):
+        parsed, internal_ts = mail
+        self.writer.add(build_campus_placement_row(parsed), ts=internal_ts)
+
+    def _rows(self):
+        return self.sheets.tabs[TAB][1:]
+
+    def test_newest_mail_wins_within_one_flush(self):
+        self._add(NEWER)
+        self._add(OLDER)
+        self.assertTrue(self.writer.close())
+        rows = self._rows()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][CTC], "14 LPA")
+
+    def test_newest_mail_wins_across_flushes(self):
+        self._add(NEWER)
+        self.assertTrue(self.writer.flush())
+        self._add(OLDER)
+        self.assertTrue(self.writer.close())
+        rows = self._rows()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][CTC], "14 LPA")
+
+    def test_newer_mail_in_a_later_flush_updates_the_row(self):
+        self._add(OLDER)
+        self.assertTrue(self.writer.flush())
+        self._add(NEWER)
+        self.assertTrue(self.writer.close())
+        rows = self._rows()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][CTC], "14 LPA")
+        self.assertEqual(rows[0][0], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,38 +1,570 @@
-import requests
 import json
+import time
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def ai_extract_offer(email):
-    """
-    Uses local Ollama LLM to extract fields from campus placement email.
-    Returns a dict with keys:
-    ["company", "category", "branches", "10th%", "12th%", "cgpa", "ctc", "stipend", "last_date", "registration_links"]
-    """
-    prompt = f"""
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.config import (
+    OLLAMA_URLS,
+    OLLAMA_MODEL,
+    OLLAMA_MAX_IN_FLIGHT,
+    OLLAMA_TIMEOUT,
+    OLLAMA_MAX_ATTEMPTS,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_NUM_PREDICT,
+    CONDENSE_BODIES,
+    CONDENSE_TOKEN_BUDGET,
+    OLLAMA_JSON_SCHEMA,
+    EXTRACTION_REPAIR_ATTEMPTS,
+)
+from utils.condense import condense_email
+from utils.extraction_schema import OFFER_SCHEMA, schema_for, validate_offer
+from utils.extraction_cache import make_cache_key
+from utils.metrics import incr, observe
+
+PROMPT_TEMPLATE = """
 Extract all key details (best-effort) from the below campus placement offer announcement email.
 If a field is missing, leave it blank.
 Return a pure JSON object with these keys: company, category, branches, 10th%, 12th%, cgpa, ctc, stipend, last_date, registration_links (as a list).
 DO NOT add explanations or markdown, just JSON.
 ---
-Subject: {email["subject"]}
-Body: {email["body"]}
+Subject: {subject}
+Body: {body}
 ---
 """
-    api_url = "http://localhost:11434/api/generate"
+
+# Reduced prompt used when only some fields are missing/uncertain (tiered extraction)
+FIELDS_PROMPT_TEMPLATE = """
+From the below campus placement offer announcement email, extract ONLY these fields: {fields}.
+If a field is missing, leave it blank.
+Return a pure JSON object with exactly those keys.
+DO NOT add explanations or markdown, just JSON.
+---
+Subject: {subject}
+Body: {body}
+---
+"""
+
+# Follow-up prompt asking again for only the fields that failed validation
+REPAIR_PROMPT_TEMPLATE = """
+From the below campus placement offer announcement email, extract ONLY these fields: {fields}.
+An earlier answer had invalid values. Expected: {problems}.
+If a field is missing, leave it blank.
+Return a pure JSON object with exactly those keys.
+---
+Subject: {subject}
+Body: {body}
+---
+"""
+
+# Several mails in one prompt (batched extraction, utils/batch_extractor.py)
+BATCH_PROMPT_TEMPLATE = """
+Extract all key details (best-effort) from each of the campus placement offer announcement emails below.
+Each email starts with a line "=== <tag> ===".
+If a field is missing, leave it blank.
+Return a pure JSON object {{"offers": [...]}} with one object per email, each with these keys: tag, company, category, branches, 10th%, 12th%, cgpa, ctc, stipend, last_date, registration_links (as a list).
+DO NOT add explanations or markdown, just JSON.
+{emails}---
+"""
+BATCH_EMAIL_TEMPLATE = """=== {tag} ===
+Subject: {subject}
+Body: {body}
+"""
+
+# Changes whenever the prompts or the schema change, so cached extractions from older ones are never reused
+PROMPT_VERSION = hashlib.sha256(
+    (PROMPT_TEMPLATE + FIELDS_PROMPT_TEMPLATE + REPAIR_PROMPT_TEMPLATE
+     + BATCH_PROMPT_TEMPLATE + BATCH_EMAIL_TEMPLATE + json.dumps(OFFER_SCHEMA, sort_keys=True) + str(OLLAMA_JSON_SCHEMA)).encode("utf-8")
+).hexdigest()[:16]
+
+
+def build_prompt(email, fields=None):
+    """
+    Fill the extraction prompt with the email's subject and body.
+    If `fields` (LLM key names, e.g. ["company", "10th%"]) is given, ask only for those.
+    """
+    if fields:
+        return FIELDS_PROMPT_TEMPLATE.format(
+            fields=", ".join(fields), subject=email["subject"], body=email["body"]
+        )
+    return PROMPT_TEMPLATE.format(subject=email["subject"], body=email["body"])
+
+
+def build_repair_prompt(email, problems):
+    """Prompt asking again for the fields in `problems` ({field: what was expected})."""
+    return REPAIR_PROMPT_TEMPLATE.format(
+        fields=", ".join(problems),
+        problems="; ".join(f"{field}: {expected}" for field, expected in problems.items()),
+        subject=email["subject"],
+        body=email["body"],
+    )
+
+
+def build_batch_prompt(tagged_emails):
+    """Prompt for several emails at once; tagged_emails: [(tag, email)]."""
+    emails = "".join(
+        BATCH_EMAIL_TEMPLATE.format(tag=tag, subject=email["subject"], body=email["body"])
+        for tag, email in tagged_emails
+    )
+    return BATCH_PROMPT_TEMPLATE.format(emails=emails)
+
+
+def batch_schema():
+    """Ollama `format` schema of a batch answer: {"offers": [offer + "tag", ...]}."""
+    item = schema_for()
+    item = {**item, "properties": {"tag": {"type": "string"}, **item["properties"]},
+            "required": ["tag", *item["required"]]}
+    return {"type": "object", "properties": {"offers": {"type": "array", "items": item}},
+            "required": ["offers"]}
+
+
+def parse_llm_output(output):
+    """Slice the JSON object out of the raw LLM reply and parse it (raises on failure)."""
+    start = output.find('{')
+    end = output.rfind('}')+1
+    return json.loads(output[start:end])
+
+
+class _JsonObjectScanner:
+    """Incrementally tracks brace depth (outside strings) to spot the end of the first top-level JSON object."""
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, chunk):
+        """Consume more text; returns True once a balanced top-level object has been closed."""
+        for ch in chunk:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                if self.started:
+                    self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+                self.started = True
+            elif ch == '}' and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
+
+
+def _generate(session, base_url, prompt, timeout=OLLAMA_TIMEOUT, schema=None):
+    """
+    Run one streaming Ollama generation and return (raw response text, timing).
+    If `schema` is given (and OLLAMA_JSON_SCHEMA is set), it is passed as Ollama's
+    `format`, so the model can only produce JSON matching it.
+
+    Tokens are read as they arrive and reading stops as soon as a balanced
+    top-level JSON object has been received; closing the unfinished response
+    drops the connection, which makes Ollama cancel the rest of the generation.
+
+    timing: {"ttft": seconds to first token, "total": seconds, "tokens": chunks read,
+             "stopped_early": True if cut off after the JSON object}
+    Raises requests exceptions on connection errors, timeouts, HTTP errors and
+    malformed stream lines.
+    """
     payload = {
-        "model": "mistral",
+        "model": OLLAMA_MODEL,
         "prompt": prompt,
-        "stream": False
+        "stream": True,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"num_predict": OLLAMA_NUM_PREDICT},
+    }
+    if schema is not None and OLLAMA_JSON_SCHEMA:
+        payload["format"] = schema
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    stopped_early = False
+    parts = []
+    scanner = _JsonObjectScanner()
+
+    with session.post(f"{base_url}/api/generate", json=payload, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            try:
+                chunk = json.loads(line)
+            except ValueError as e:
+                # A malformed or truncated stream line fails this generation, not the run
+                raise requests.RequestException(f"Malformed Ollama stream line: {line[:200]!r}") from e
+            if "error" in chunk:
+                raise requests.RequestException(f"Ollama error: {chunk['error']}")
+            token = chunk.get("response", "")
+            if token:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                tokens += 1
+                parts.append(token)
+                if scanner.feed(token):
+                    stopped_early = not chunk.get("done", False)
+                    break
+            if chunk.get("done"):
+                break
+
+    timing = {
+        "ttft": ttft,
+        "total": time.perf_counter() - start,
+        "tokens": tokens,
+        "stopped_early": stopped_early,
     }
-    response = requests.post(api_url, json=payload)
-    # Ollama returns streamed tokens, but in single reply if stream=False
-    try:
-        result = response.json()
-        output = result['response']
-        start = output.find('{')
-        end = output.rfind('}')+1
-        extracted = json.loads(output[start:end])
+    return "".join(parts), timing
+
+
+def warm_up(session, base_url, timeout=OLLAMA_TIMEOUT):
+    """Ask Ollama to load the model (an empty generate request) and keep it loaded for OLLAMA_KEEP_ALIVE."""
+    payload = {"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE}
+    response = session.post(f"{base_url}/api/generate", json=payload, timeout=timeout)
+    response.raise_for_status()
+
+
+def extract_validated(generate, email, fields=None, max_repairs=EXTRACTION_REPAIR_ATTEMPTS, data=None):
+    """
+    Schema-constrained extraction with field-level validation (utils/extraction_schema.py).
+
+    - generate: callable(prompt, schema) -> (raw text, timing), or None if no
+      answer could be obtained (transport errors)
+    - fields: LLM keys to ask for (default: all of them, see build_prompt)
+    - data: an already parsed answer (e.g. one item of a batch answer); only
+      validation and repairs are done then
+    Invalid fields are asked for again with a short repair prompt (only those
+    fields, with what was expected), up to `max_repairs` times; fields still
+    invalid after that are left blank.
+    Returns (extracted dict or None, repair tokens). None if nothing came back,
+    or if a full extraction has no company.
+    """
+    if data is None:
+        answer = generate(build_prompt(email, fields), schema_for(fields))
+        if answer is None:
+            return None, 0
+        try:
+            data = parse_llm_output(answer[0])
+        except ValueError as e:
+            incr("llm.parse_errors")
+            print("AI extract parse error:", e)
+            print("Raw:", answer[0])
+            data = {}
+    extracted, problems = validate_offer(data, fields)
+    incr("llm.validated")
+
+    repair_tokens = 0
+    for _ in range(max_repairs):
+        if not problems:
+            break
+        incr("llm.repairs")
+        incr("llm.repair_fields", len(problems))
+        answer = generate(build_repair_prompt(email, problems), schema_for(problems))
+        if answer is None:
+            break
+        repair_tokens += answer[1]["tokens"]
+        try:
+            data = parse_llm_output(answer[0])
+        except ValueError:
+            incr("llm.parse_errors")
+            continue
+        repaired, problems = validate_offer(data, list(problems))
+        for field, value in repaired.items():
+            if field not in problems:
+                extracted[field] = value
+    incr("llm.repair_tokens", repair_tokens)
+    if problems:
+        incr("llm.invalid_fields", len(problems))
+
+    if fields is None and not extracted["company"]:
+        return None, repair_tokens
+    return extracted, repair_tokens
+
+
+def ai_extract_offer(email, session=None, base_url=OLLAMA_URLS[0], timeout=OLLAMA_TIMEOUT):
+    """
+    Uses local Ollama LLM to extract fields from campus placement email.
+    Returns a dict with keys:
+    ["company", "category", "branches", "10th%", "12th%", "cgpa", "ctc", "stipend", "last_date", "registration_links"]
+    or None if the extraction failed (see extract_validated).
+    """
+    def generate(prompt, schema):
+        try:
+            return _generate(session or requests, base_url, prompt, timeout, schema=schema)
+        except requests.RequestException as e:
+            print("AI extract request error:", e)
+            return None
+
+    extracted, _ = extract_validated(generate, email)
+    return extracted
+
+
+class OllamaEndpoint:
+    """One Ollama server with a keep-alive connection pool and an in-flight counter."""
+
+    def __init__(self, base_url, max_in_flight=OLLAMA_MAX_IN_FLIGHT):
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def load(self):
+        return self.in_flight / self.max_in_flight
+
+    def has_capacity(self):
+        return self.in_flight < self.max_in_flight
+
+
+class ExtractionPool:
+    """
+    Dispatches ai extraction across one or more Ollama endpoints.
+
+    - Each endpoint keeps its own pooled requests.Session.
+    - At most `max_in_flight` generations run on an endpoint at a time.
+    - Each request goes to the least-loaded endpoint; on a connection error,
+      timeout or HTTP error it is retried on a different endpoint.
+    - If an ExtractionCache is given, cached results are returned without a
+      generation and new results are stored.
+    - If `condense` is set, bodies are condensed (utils/condense.py) before
+      they are put into the prompt.
+    """
+
+    def __init__(self, base_urls=OLLAMA_URLS, max_in_flight=OLLAMA_MAX_IN_FLIGHT,
+                 timeout=OLLAMA_TIMEOUT, max_attempts=OLLAMA_MAX_ATTEMPTS, cache=None,
+                 condense=CONDENSE_BODIES):
+        self.endpoints = [OllamaEndpoint(url, max_in_flight) for url in base_urls]
+        self.cache = cache
+        self.condense = condense
+        # One timing dict (see _generate) per generation; bounded for long-running (--daemon) processes
+        self.timings = deque(maxlen=10000)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        # Extractions that needed a repair prompt, and the tokens those cost
+        self.extractions = 0
+        self.repaired = 0
+        self.repair_tokens = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self, tried):
+        """Block until an endpoint has a free slot; prefer ones not tried yet, least loaded first."""
+        with self._cond:
+            while True:
+                candidates = [ep for ep in self.endpoints if ep not in tried] or self.endpoints
+                free = [ep for ep in candidates if ep.has_capacity()]
+                if free:
+                    endpoint = min(free, key=lambda ep: ep.load)
+                    endpoint.in_flight += 1
+                    return endpoint
+                self._cond.wait()
+
+    def _release(self, endpoint):
+        with self._cond:
+            endpoint.in_flight -= 1
+            self._cond.notify_all()
+
+    def extract(self, email, fields=None):
+        """
+        Extract one email, retrying transport failures on another endpoint. Returns dict or None.
+        If `fields` is given, only those keys are requested (see build_prompt).
+        Answers are schema-constrained and validated; invalid fields are re-asked
+        (see extract_validated).
+        """
+        cache_key = self._cache_key(email, fields)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                incr("cache.hits")
+                return cached
+            incr("cache.misses")
+
+        source = condense_email(email) if self.condense else email
+        extracted, repair_tokens = extract_validated(
+            lambda prompt, schema: self._generate(prompt, schema, email.get("id")), source, fields
+        )
+        self._finish(extracted, repair_tokens, cache_key)
         return extracted
-    except Exception as e:
-        print("AI extract parse error:", e)
-        print("Raw:", output)
-        return None
\ No newline at end of file
+
+    def _cache_key(self, email, fields=None):
+        if self.cache is None:
+            return None
+        version = PROMPT_VERSION + (":" + ",".join(fields) if fields else "")
+        if self.condense:
+            version += f":condensed{CONDENSE_TOKEN_BUDGET}"
+        return make_cache_key(email, OLLAMA_MODEL, version)
+
+    def cached(self, email):
+        """Cached full extraction of `email`, or None (counted as a cache hit/miss)."""
+        cache_key = self._cache_key(email)
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        incr("cache.hits" if cached is not None else "cache.misses")
+        return cached
+
+    def _finish(self, extracted, repair_tokens, cache_key):
+        with self._cond:
+            self.extractions += 1
+            if repair_tokens:
+                self.repaired += 1
+                self.repair_tokens += repair_tokens
+        if extracted is not None and cache_key is not None:
+            self.cache.put(cache_key, extracted)
+
+    def extract_batch(self, emails, prepared=None):
+        """
+        Extract several emails with one multi-mail prompt (see build_batch_prompt).
+        The answer is split back by tag; mails missing from it or unparsable
+        fall back to a single-mail extraction, invalid fields get the usual
+        repair prompt. A single mail gets the single-mail prompt.
+        The cache is not consulted (see cached()) but is filled.
+
+        - prepared: the emails as they go into the prompt (e.g. condensed);
+          default: condensed here if the pool condenses
+        Returns [extracted dict or None] in the order of `emails`.
+        """
+        if prepared is None:
+            prepared = [condense_email(email) if self.condense else email for email in emails]
+        tagged = [(f"m{i + 1}", email) for i, email in enumerate(prepared)]
+        items = self._batch_answer(tagged) if len(emails) > 1 else {}
+
+        results = []
+        for (tag, source), email in zip(tagged, emails):
+            data = items.get(tag)
+            if data is None and len(emails) > 1:
+                incr("llm.batch_fallbacks")
+            extracted, repair_tokens = extract_validated(
+                lambda prompt, schema: self._generate(prompt, schema, email.get("id")), source, data=data
+            )
+            self._finish(extracted, repair_tokens, self._cache_key(email))
+            results.append(extracted)
+        return results
+
+    def _batch_answer(self, tagged):
+        """Run one batch prompt; returns {tag: answer item} for the items that came back."""
+        answer = self._generate(build_batch_prompt(tagged), batch_schema(), "batch")
+        incr("llm.batches")
+        incr("llm.batched_mails", len(tagged))
+        items = {}
+        if answer is None:
+            return items
+        try:
+            offers = parse_llm_output(answer[0]).get("offers", [])
+        except (ValueError, AttributeError) as e:
+            incr("llm.parse_errors")
+            print("AI batch parse error:", e)
+            return items
+        for item in offers if isinstance(offers, list) else []:
+            if isinstance(item, dict) and item.get("tag") not in items:
+                items[item.get("tag")] = item
+        return items
+
+    def _generate(self, prompt, schema, email_id=None):
+        """One generation, retried on another endpoint on transport failures. Returns (text, timing) or None."""
+        tried = set()
+        for attempt in range(1, self.max_attempts + 1):
+            endpoint = self._acquire(tried)
+            tried.add(endpoint)
+            try:
+                output, timing = _generate(endpoint.session, endpoint.base_url, prompt, self.timeout,
+                                           schema=schema)
+            except requests.RequestException as e:
+                incr("llm.transport_errors")
+                print(f"Ollama request to {endpoint.base_url} failed (attempt {attempt}): {e}")
+                continue
+            finally:
+                self._release(endpoint)
+            timing["id"] = email_id
+            timing["endpoint"] = endpoint.base_url
+            with self._cond:
+                self.timings.append(timing)
+            incr("llm.requests")
+            incr("llm.tokens", timing["tokens"])
+            observe("llm.latency", timing["total"])
+            if timing["ttft"] is not None:
+                observe("llm.first_token", timing["ttft"])
+            return output, timing
+        return None
+
+    def extract_stream(self, emails, window=None, extract=None, workers=None):
+        """
+        Extract emails from any iterable (e.g. a generator streaming from Gmail)
+        while it is still being produced.
+
+        At most `window` emails are queued or in flight at once (default: twice
+        the total endpoint capacity), so a slow LLM throttles the producer.
+        `extract` overrides the per-email function (default: self.extract),
+        e.g. TieredExtractor.extract; `workers` the number of mails extracted
+        at once (default: the total endpoint capacity).
+        Yields (email, extracted dict or None) in input order.
+        """
+        extract = extract or self.extract
+        workers = workers or max(1, sum(ep.max_in_flight for ep in self.endpoints))
+        window = window or 2 * workers
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for email in emails:
+                pending.append((email, executor.submit(extract, email)))
+                while pending and (len(pending) >= window or pending[0][1].done()):
+                    done_email, future = pending.popleft()
+                    yield done_email, future.result()
+            while pending:
+                done_email, future = pending.popleft()
+                yield done_email, future.result()
+
+    def extract_many(self, emails):
+        """
+        Extract all emails concurrently.
+        Returns a dict {gmail_message_id: extracted dict or None}.
+        """
+        return {email["id"]: extracted for email, extracted in self.extract_stream(emails)}
+
+    def warm_up(self):
+        """
+        Load the model on every endpoint in background threads, e.g. while Gmail
+        is still being fetched. Returns the started threads.
+        """
+        def run(endpoint):
+            try:
+                warm_up(endpoint.session, endpoint.base_url, self.timeout)
+                print(f"🔥 Model warmed up on {endpoint.base_url}")
+            except requests.RequestException as e:
+                print(f"Warm-up of {endpoint.base_url} failed: {e}")
+
+        threads = [threading.Thread(target=run, args=(ep,), daemon=True) for ep in self.endpoints]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def timing_summary(self):
+        """Mean / max time-to-first-token and generation time over all generations so far."""
+        with self._cond:
+            timings = list(self.timings)
+        if not timings:
+            return "no generations"
+        ttfts = [t["ttft"] for t in timings if t["ttft"] is not None]
+        totals = [t["total"] for t in timings]
+        early = sum(1 for t in timings if t["stopped_early"])
+        summary = f"{len(timings)} generations, total mean {sum(totals) / len(totals):.2f}s max {max(totals):.2f}s"
+        if ttfts:
+            summary += f", first token mean {sum(ttfts) / len(ttfts):.2f}s max {max(ttfts):.2f}s"
+        summary += f", {early} stopped early after the JSON object"
+        if self.extractions:
+            summary += (f"; {self.repaired}/{self.extractions} extractions repaired "
+                        f"({self.repaired / self.extractions:.1%}, {self.repair_tokens} tokens)")
+        return summary
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.session.close()
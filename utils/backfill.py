@@ -0,0 +1,149 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from config.config import BACKFILL_WINDOW_DAYS, BACKFILL_WORKERS, COLLEGE_PLACEMENT_EMAIL
+from utils.email_utils import build_query, iter_message_ids, get_emails
+from utils.metrics import incr, observe
+from utils.state_store import PROCESSED_OUTCOMES, EXTRACTION_FAILED
+
+# Outcomes after which a mail no longer holds its window open; ACCEPTED is
+# recorded at filter time, before the mail has been extracted
+SETTLED_OUTCOMES = PROCESSED_OUTCOMES + (EXTRACTION_FAILED,)
+
+
+def plan_windows(start_date, end_ts=None, window_days=BACKFILL_WINDOW_DAYS):
+    """
+    Split the range from `start_date` ("YYYY/MM/DD", local midnight) to `end_ts`
+    (epoch seconds, default now) into windows of `window_days` days.
+    Returns [(start_ts, end_ts)] in epoch seconds, newest window first.
+    """
+    start_ts = int(datetime.strptime(start_date, "%Y/%m/%d").timestamp())
+    end_ts = int(end_ts if end_ts is not None else time.time())
+    step = int(timedelta(days=window_days).total_seconds())
+    # Anchored at start_date, so re-planning later gives the same boundaries; the newest window is partial
+    windows = [(lower, min(lower + step, end_ts)) for lower in range(start_ts, end_ts, step)]
+    return windows[::-1]
+
+
+def _window_label(start_ts, end_ts):
+    fmt = "%Y/%m/%d"
+    return f"{datetime.fromtimestamp(start_ts).strftime(fmt)}-{datetime.fromtimestamp(end_ts).strftime(fmt)}"
+
+
+class ShardedBackfill:
+    """
+    First-run backfill over the pending windows of a RunStateStore (see plan_windows()).
+
+    Iterating yields the emails of all pending windows in mail order (newest
+    first, like one linear listing), while up to `workers` windows are listed
+    and downloaded concurrently (after:/before: queries) ahead of the consumer.
+
+    A window is checkpointed as done once every mail it listed has a final
+    outcome in the ledger (SETTLED_OUTCOMES), whether it was yielded, rejected
+    on its metadata or skipped as already decided; a mail whose download failed
+    (FETCH_FAILED) keeps its window open. So a restarted backfill only resumes
+    unfinished windows (and the ledger skips the mails already decided in those).
+
+    - store / prefilter / failed: as for email_utils.get_emails()
+    - stop: optional threading.Event; iteration ends when it is set
+    """
+
+    def __init__(self, state, store=None, prefilter=None, sender_filter=COLLEGE_PLACEMENT_EMAIL,
+                 workers=BACKFILL_WORKERS, stop=None, failed=None):
+        self.state = state
+        self.store = store
+        self.prefilter = prefilter
+        self.sender_filter = sender_filter
+        self.workers = max(1, workers)
+        self.stop = stop
+        self.failed = failed
+        self.windows = [(start, end) for start, end, *_ in state.backfill_windows(pending_only=True)]
+        self.timings = []      # (window, ids listed, mails yielded, fetch seconds)
+        self.completed = 0     # windows checkpointed by this run
+        self._exhausted = []   # yielded windows waiting for their mails' outcomes
+
+    def _stopped(self):
+        return self.stop is not None and self.stop.is_set()
+
+    def _fetch(self, window):
+        """List and download one window; returns (emails, ids listed, seconds)."""
+        start = time.perf_counter()
+        query = build_query(self.sender_filter, after_ts=window[0], before_ts=window[1])
+        emails, listed = [], []
+        for ids in iter_message_ids(query, stop=self.stop):
+            listed.extend(ids)
+            emails.extend(get_emails(ids, self.store, skip=self.state, prefilter=self.prefilter,
+                                     failed=self.failed))
+        return emails, listed, time.perf_counter() - start
+
+    def settle(self):
+        """Checkpoint the yielded windows whose mails all have a final outcome; returns how many remain."""
+        remaining = []
+        for entry in self._exhausted:
+            entry["pending"] = {msg_id for msg_id in entry["pending"]
+                                if self.state.outcome(msg_id) not in SETTLED_OUTCOMES}
+            if entry["pending"]:
+                remaining.append(entry)
+                continue
+            self.state.complete_window(*entry["window"], entry["mails"], entry["max_ts"], entry["seconds"])
+            self.completed += 1
+            incr("backfill.windows_completed")
+        self._exhausted = remaining
+        return len(remaining)
+
+    def __iter__(self):
+        if not self.windows:
+            return
+        print(f"🗂️ Backfill: {len(self.windows)} windows, {self.workers} at a time.")
+        seen = set()  # ids yielded already (window boundaries may overlap by a second)
+        windows = iter(self.windows)
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as executor:
+
+            def submit():
+                window = next(windows, None)
+                if window is not None:
+                    in_flight.append((window, executor.submit(self._fetch, window)))
+
+            for _ in range(self.workers):
+                submit()
+            try:
+                while in_flight and not self._stopped():
+                    window, future = in_flight.popleft()
+                    emails, listed, seconds = future.result()
+                    submit()
+                    self.timings.append((window, len(listed), len(emails), seconds))
+                    observe("backfill.window", seconds)
+                    # Every listed id must settle, including those that were not yielded
+                    entry = {"window": window, "pending": set(listed), "mails": len(emails),
+                             "max_ts": None, "seconds": seconds}
+                    for email in emails:
+                        if self._stopped():
+                            return
+                        if email["id"] in seen:
+                            continue
+                        seen.add(email["id"])
+                        if email.get("internal_ts"):
+                            entry["max_ts"] = max(entry["max_ts"] or 0, email["internal_ts"])
+                        yield email
+                        self.settle()
+                    self._exhausted.append(entry)
+                    self.settle()
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
+
+    def report(self):
+        """Per-window timing, one line per window fetched by this run."""
+        lines = [
+            f"  {_window_label(*window)}: {listed} listed, {mails} fetched in {seconds:.2f}s"
+            for window, listed, mails, seconds in self.timings if listed
+        ]
+        empty = sum(1 for _, listed, _, _ in self.timings if not listed)
+        if empty:
+            lines.append(f"  {empty} windows without mail")
+        pending = len(self.state.backfill_windows(pending_only=True))
+        lines.append(f"  {self.completed} windows completed this run, {pending} still pending")
+        return "\n".join(lines)
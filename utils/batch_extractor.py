@@ -0,0 +1,120 @@
+import time
+import threading
+
+from config.config import (
+    LLM_BATCH_MAX_MAILS,
+    LLM_BATCH_TOKEN_BUDGET,
+    LLM_BATCH_LINGER_SECONDS,
+    CONDENSE_CHARS_PER_TOKEN,
+)
+from utils.condense import condense_email
+
+
+class _Slot:
+    """One mail waiting in a batch."""
+
+    def __init__(self, email, prepared, tokens):
+        self.email = email
+        self.prepared = prepared
+        self.tokens = tokens
+        self.done = False
+        self.result = None
+
+
+class BatchExtractor:
+    """
+    Packs concurrent extract() calls into multi-mail prompts (ExtractionPool.extract_batch).
+
+    Callers block until their mail has been extracted. A batch is sent once it
+    holds `max_batch` mails or the next mail would push it over `token_budget`
+    (estimated from the condensed bodies), or `linger` seconds after a mail
+    joined it if no more mails come; whichever waiting thread notices runs it.
+    So callers should keep about `concurrency` mails in flight (extract_stream
+    workers / pipeline stage concurrency): enough to fill a batch per endpoint slot.
+
+    Cached mails are answered without waiting, and mails too long to share a
+    prompt go through the pool's single-mail extraction.
+    """
+
+    def __init__(self, pool, max_batch=LLM_BATCH_MAX_MAILS, token_budget=LLM_BATCH_TOKEN_BUDGET,
+                 linger=LLM_BATCH_LINGER_SECONDS):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.token_budget = token_budget
+        self.linger = linger
+        self._cond = threading.Condition()
+        self._pending = []        # slots of the batch being filled
+        self._pending_tokens = 0
+        self._ready = []          # full batches nobody has started yet
+        self.stats = {"mails": 0, "batches": 0, "batched_mails": 0, "single": 0}
+
+    @property
+    def concurrency(self):
+        """Mails to keep in flight so every endpoint slot can get a full batch."""
+        return self.max_batch * max(1, sum(ep.max_in_flight for ep in self.pool.endpoints))
+
+    def _take_pending(self):
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        return batch
+
+    def _add(self, slot):
+        if self._pending and self._pending_tokens + slot.tokens > self.token_budget:
+            self._ready.append(self._take_pending())
+        self._pending.append(slot)
+        self._pending_tokens += slot.tokens
+        if len(self._pending) >= self.max_batch:
+            self._ready.append(self._take_pending())
+        self._cond.notify_all()
+
+    def _run(self, batch):
+        try:
+            results = self.pool.extract_batch([slot.email for slot in batch],
+                                              prepared=[slot.prepared for slot in batch])
+        except Exception as e:
+            print(f"Batch extraction failed: {e}")
+            results = [None] * len(batch)
+        with self._cond:
+            self.stats["batches"] += 1
+            self.stats["batched_mails"] += len(batch)
+            for slot, result in zip(batch, results):
+                slot.result, slot.done = result, True
+            self._cond.notify_all()
+
+    def extract(self, email):
+        """Extract one email (same interface as ExtractionPool.extract). Returns dict or None."""
+        with self._cond:
+            self.stats["mails"] += 1
+        cached = self.pool.cached(email)
+        if cached is not None:
+            return cached
+
+        prepared = condense_email(email) if self.pool.condense else email
+        tokens = (len(prepared["subject"]) + len(prepared["body"])) // CONDENSE_CHARS_PER_TOKEN
+        if tokens >= self.token_budget:
+            with self._cond:
+                self.stats["single"] += 1
+            return self.pool.extract_batch([email], prepared=[prepared])[0]
+
+        slot = _Slot(email, prepared, tokens)
+        deadline = time.monotonic() + self.linger
+        with self._cond:
+            self._add(slot)
+        while True:
+            with self._cond:
+                if slot.done:
+                    return slot.result
+                if self._ready:
+                    batch = self._ready.pop(0)
+                elif slot in self._pending and time.monotonic() >= deadline:
+                    batch = self._take_pending()
+                else:
+                    timeout = deadline - time.monotonic() if slot in self._pending else None
+                    self._cond.wait(timeout)
+                    continue
+            self._run(batch)
+
+    def summary(self):
+        s = self.stats
+        mean = s["batched_mails"] / s["batches"] if s["batches"] else 0.0
+        return (f"{s['mails']} mails, {s['batches']} batches (mean {mean:.1f} mails), "
+                f"{s['single']} too long to batch")
@@ -0,0 +1,156 @@
+import re
+import html
+import logging
+
+from config.config import CONDENSE_TOKEN_BUDGET, CONDENSE_CHARS_PER_TOKEN
+from utils.metrics import metrics, incr
+
+logger = logging.getLogger(__name__)
+
+# Lines that carry the fields we extract; kept even when the body is trimmed
+LABEL_LINE_RE = re.compile(
+    r"company|category|eligib|branch|criteria|ctc|package|stipend|cgpa|%|"
+    r"last date|deadline|registration|register|apply|link|https?://",
+    re.IGNORECASE,
+)
+# "On Mon, 1 Sep 2025 at 10:00, CDC <cdc@...> wrote:" / Outlook-style separators
+QUOTE_HEADER_RE = re.compile(
+    r"^(On .{0,300}wrote:|-{2,}\s*Original Message\s*-{2,})\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Start of mailing-list footers; everything from here on is dropped
+FOOTER_RE = re.compile(
+    r"^(--\s*\n)?(You received this message because you are subscribed to the Google Groups"
+    r"|To unsubscribe from this group|To view this discussion on the web visit)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Paragraphs that are legal boilerplate
+DISCLAIMER_RE = re.compile(
+    r"^\s*(disclaimer|confidentiality notice|this e-?mail and any files transmitted)",
+    re.IGNORECASE,
+)
+
+_SCRIPT_STYLE_RE = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_LINK_RE = re.compile(r"<a\b[^>]*href=[\"']([^\"']+)[\"'][^>]*>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+_BLOCK_TAG_RE = re.compile(r"<\s*(br|/p|/div|/tr|/li|/h[1-6]|/table|p|div|tr|li|h[1-6])\b[^>]*>", re.IGNORECASE)
+_CELL_TAG_RE = re.compile(r"<\s*/t[dh]\s*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACES_RE = re.compile(r"[ \t\r\f\v\xa0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def html_to_text(html_content):
+    """
+    Fast regex-based HTML to text conversion (a lighter alternative to html2text).
+    Keeps block structure as line breaks and link targets as "text (url)".
+    """
+    text = _SCRIPT_STYLE_RE.sub("", html_content)
+    text = _LINK_RE.sub(
+        lambda m: m.group(2) if m.group(1) in m.group(2) else f"{m.group(2)} ({m.group(1)})", text
+    )
+    text = _BLOCK_TAG_RE.sub("\n", text)
+    text = _CELL_TAG_RE.sub(" | ", text)
+    text = html.unescape(_TAG_RE.sub("", text))
+    lines = (_SPACES_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip() + "\n"
+
+
+def strip_quoted_history(text):
+    """
+    Drop reply history ("On ... wrote:" and "> " lines).
+    If the new part of the mail has no label lines (e.g. a bare "gentle reminder"),
+    the quoted drive is kept instead, without its "> " markers.
+    """
+    m = QUOTE_HEADER_RE.search(text)
+    head, quoted = (text[:m.start()], text[m.end():]) if m else (text, "")
+    head_lines = [line for line in head.split("\n") if not line.lstrip().startswith(">")]
+    quoted_lines = [line for line in head.split("\n") if line.lstrip().startswith(">")]
+    quoted_lines += quoted.split("\n")
+
+    new_part = "\n".join(head_lines)
+    if LABEL_LINE_RE.search(new_part):
+        return new_part
+    unquoted = "\n".join(re.sub(r"^\s*>+ ?", "", line) for line in quoted_lines)
+    return new_part + "\n" + unquoted
+
+
+def strip_boilerplate(text):
+    """Remove mailing-list footers, legal disclaimers and repeated lines."""
+    m = FOOTER_RE.search(text)
+    if m:
+        text = text[:m.start()]
+
+    paras = [p for p in re.split(r"\n\s*\n", text) if p.strip() and not DISCLAIMER_RE.match(p)]
+
+    # Drop lines already seen (e.g. both MIME alternatives decoded into one body);
+    # very short lines such as "Regards," are left alone
+    kept, seen = [], set()
+    for para in paras:
+        lines = []
+        for line in para.strip("\n").split("\n"):
+            key = " ".join(line.split()).lower()
+            if len(key) >= 20:
+                if key in seen:
+                    continue
+                seen.add(key)
+            lines.append(line)
+        if any(line.strip() for line in lines):
+            kept.append("\n".join(lines))
+    return "\n\n".join(kept)
+
+
+def trim_to_budget(text, token_budget=CONDENSE_TOKEN_BUDGET, chars_per_token=CONDENSE_CHARS_PER_TOKEN):
+    """
+    Trim text to roughly `token_budget` tokens. Label lines (company, CTC,
+    eligibility, links, ...) are kept first; remaining lines fill the rest of
+    the budget in their original order.
+    """
+    budget = token_budget * chars_per_token
+    if len(text) <= budget:
+        return text
+
+    lines = text.split("\n")
+    keep = [False] * len(lines)
+    used = 0
+    for priority in (True, False):
+        for i, line in enumerate(lines):
+            if keep[i] or bool(LABEL_LINE_RE.search(line)) != priority:
+                continue
+            if used + len(line) + 1 > budget:
+                continue
+            keep[i] = True
+            used += len(line) + 1
+    return "\n".join(line for i, line in enumerate(lines) if keep[i])
+
+
+def condense_body(text, token_budget=CONDENSE_TOKEN_BUDGET):
+    """Full condensation: quoted history, boilerplate, then trimming to the token budget."""
+    text = strip_quoted_history(text or "")
+    text = strip_boilerplate(text)
+    return trim_to_budget(text, token_budget)
+
+
+def condense_email(email, token_budget=CONDENSE_TOKEN_BUDGET):
+    """
+    Return a copy of the email dict with a condensed body. The size reduction
+    is logged per mail at debug level and totalled in condense_summary().
+    """
+    body = email.get("body") or ""
+    condensed = condense_body(body, token_budget)
+    incr("condense.mails")
+    incr("condense.chars_in", len(body))
+    incr("condense.chars_out", len(condensed))
+    logger.debug("Condensed %s: %d -> %d chars", email.get("id"), len(body), len(condensed))
+    return {**email, "body": condensed}
+
+
+def condense_summary():
+    """Totals of the condense.* counters: {"mails", "chars_in", "chars_out", "reduction_pct"}."""
+    counters = metrics.report()["counters"]
+    chars_in, chars_out = counters.get("condense.chars_in", 0), counters.get("condense.chars_out", 0)
+    return {
+        "mails": counters.get("condense.mails", 0),
+        "chars_in": chars_in,
+        "chars_out": chars_out,
+        "reduction_pct": round(100.0 * (chars_in - chars_out) / chars_in, 1) if chars_in else 0.0,
+    }
@@ -1,14 +1,25 @@
-import os
-import pickle
+import time
 import base64
+import logging
 from datetime import datetime, timezone, timedelta
 
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-
-from config.config import COLLEGE_PLACEMENT_EMAIL
-import html2text
+from config.config import (
+    COLLEGE_PLACEMENT_EMAIL,
+    GMAIL_BATCH_SIZE,
+    GMAIL_BATCH_MAX_RETRIES,
+    GMAIL_QUOTA_UNITS,
+    RATE_LIMIT_MAX_THROTTLES,
+    FAST_HTML_TO_TEXT,
+)
+from utils.condense import html_to_text
+from utils.google_clients import (
+    get_service, http_error_status, is_rate_limited, retry_after_seconds, mark_startup,
+)
+from utils.metrics import incr, timer
+from utils.rate_limit import gmail_limiter, is_throttled
+from utils.state_store import FETCH_FAILED, UNAVAILABLE
+
+logger = logging.getLogger(__name__)
 
 # Path to Gmail API credentials for your UNIVERSITY account
 CREDENTIALS_PATH = 'gmail_credentials.json'
@@ -17,25 +28,38 @@ SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
 
 def get_gmail_service():
-    """Authenticate and return Gmail service object."""
-    creds = None
-
-    if os.path.exists(TOKEN_PATH):
-        with open(TOKEN_PATH, 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, 'wb') as token:
-            pickle.dump(creds, token)
-
-    service = build('gmail', 'v1', credentials=creds)
+    """Authenticate and return Gmail service object (cached, see utils/google_clients.py)."""
+    return get_service('gmail', 'v1', TOKEN_PATH, CREDENTIALS_PATH, SCOPES)
+
+
+_announced = False
+
+
+def _connect():
+    """get_gmail_service(), announcing the authentication once per process (not on every daemon poll)."""
+    global _announced
+    if _announced:
+        return get_gmail_service()
+    print("🔐 Authenticating with Gmail...")
+    service = get_gmail_service()
+    print("✅ Gmail authentication successful!\n")
+    _announced = True
     return service
 
 
+def _execute(request, name):
+    """
+    Execute one Gmail API request through the shared rate limiter (charged
+    GMAIL_QUOTA_UNITS[name]; throttled requests are retried), recording its
+    latency as gmail.<name> and counting it.
+    """
+    def execute():
+        incr("gmail.api_calls")
+        with timer(f"gmail.{name}"):
+            return request.execute()
+    return gmail_limiter.run(execute, cost=GMAIL_QUOTA_UNITS.get(name, 5))
+
+
 def _safe_b64_decode(data: str) -> str:
     """Safely decode URL-safe base64 Gmail payloads."""
     if not data:
@@ -47,72 +71,348 @@ def _safe_b64_decode(data: str) -> str:
     return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
 
 
+def _html_to_text(html_content):
+    if FAST_HTML_TO_TEXT:
+        return html_to_text(html_content)
+    import html2text  # only needed when the fast converter is disabled
+    return html2text.html2text(html_content)
+
+
+def _extract_body(payload):
+    """
+    Recursively decode text/plain and text/html parts of a Gmail payload.
+    For multipart/alternative only one alternative is used (text/plain preferred),
+    since the others carry the same content.
+    """
+    body = ""
+    if 'parts' in payload:
+        parts = payload['parts']
+        if payload.get('mimeType') == 'multipart/alternative':
+            ordered = sorted(parts, key=lambda p: p.get('mimeType') != 'text/plain')
+            for part in ordered:
+                body = _extract_body(part)
+                if body.strip():
+                    break
+            return body
+        for part in parts:
+            body += _extract_body(part)
+    else:
+        data = payload['body'].get('data')
+        if payload['mimeType'] == 'text/plain' and data:
+            decoded_data = _safe_b64_decode(data)
+            body += decoded_data
+        elif payload['mimeType'] == 'text/html' and data:
+            html_content = _safe_b64_decode(data)
+            body += _html_to_text(html_content)
+    return body
+
+
 def get_message_body(service, message_id):
     """Get the full body content of an email message."""
     try:
-        message = service.users().messages().get(
+        message = _execute(service.users().messages().get(
             userId='me',
             id=message_id,
             format='full'
-        ).execute()
+        ), 'messages.get')
 
-        def extract_body(payload):
-            body = ""
-            if 'parts' in payload:
-                for part in payload['parts']:
-                    body += extract_body(part)
-            else:
-                data = payload['body'].get('data')
-                if payload['mimeType'] == 'text/plain' and data:
-                    decoded_data = _safe_b64_decode(data)
-                    body += decoded_data
-                elif payload['mimeType'] == 'text/html' and data:
-                    html_content = _safe_b64_decode(data)
-                    body += html2text.html2text(html_content)
-            return body
-
-        return extract_body(message['payload'])
+        return _extract_body(message['payload'])
     except Exception as e:
         print(f"Error getting message body: {e}")
         return ""
 
 
-def fetch_emails(
+def _parse_headers(headers):
+    """Return (subject, sender, date_header) from a Gmail header list."""
+    subject, sender, date_header = "", "", ""
+    for header in headers:
+        name = header['name']
+        if name == 'Subject':
+            subject = header['value']
+        elif name == 'From':
+            sender = header['value']
+            if '<' in sender and '>' in sender:
+                sender = sender.split('<')[1].split('>')[0]
+        elif name == 'Date':
+            date_header = header['value']
+    return subject, sender, date_header
+
+
+def _parse_internal_date(internal_ts_str):
+    """
+    Convert Gmail internalDate (epoch ms in UTC, as a string) into
+    (internal_ts, received_date, received_time) in IST.
+    """
+    internal_ts = None
+    received_date_str = ""
+    received_time_str = ""
+    if internal_ts_str is not None:
+        try:
+            internal_ts = int(internal_ts_str)
+            dt_utc = datetime.fromtimestamp(internal_ts / 1000.0, tz=timezone.utc)
+            india_tz = timezone(timedelta(hours=5, minutes=30))
+            dt_local = dt_utc.astimezone(india_tz)
+            received_date_str = dt_local.strftime("%d-%m-%Y")
+            received_time_str = dt_local.strftime("%H:%M")
+        except Exception as e:
+            print("Error parsing internalDate:", e)
+    return internal_ts, received_date_str, received_time_str
+
+
+def _build_email(message, body):
+    """Build the email dict used by main.py and the filters from a Gmail message resource."""
+    subject, sender, date_header = _parse_headers(message['payload']['headers'])
+    internal_ts, received_date_str, received_time_str = _parse_internal_date(
+        message.get('internalDate')
+    )
+    return {
+        "id": message['id'],                  # Gmail message ID
+        "subject": subject,
+        "from": sender,
+        "body": body,
+        "received_date": received_date_str,  # e.g. "10-12-2025"
+        "received_time": received_time_str,  # e.g. "14:35"
+        "date_header": date_header,          # raw header for debugging
+        "internal_ts": internal_ts,          # int: epoch ms
+    }
+
+
+def _batch_get_messages(service, message_ids, batch_size=GMAIL_BATCH_SIZE,
+                        max_retries=GMAIL_BATCH_MAX_RETRIES, fmt='full', failed=None):
+    """
+    Fetch Gmail messages using batch HTTP requests.
+    fmt='full' returns headers and body; fmt='metadata' only the From/Subject/Date
+    headers, internalDate and snippet.
+
+    Groups up to `batch_size` messages().get calls into a single HTTP round trip,
+    each batch charged its messages' quota units on the shared Gmail limiter.
+    Throttled sub-requests (429 / rateLimitExceeded) are re-queued, after the
+    Retry-After if there is one, up to RATE_LIMIT_MAX_THROTTLES rounds; transient
+    failures (5xx, network) are retried `max_retries` times with exponential
+    backoff; other failures are logged and skipped.
+
+    Returns a dict {message_id: message_resource}. Ids that could not be fetched
+    are added to the optional dict `failed` as FETCH_FAILED (given up after the
+    retries / throttled rounds) or UNAVAILABLE (refused for good, e.g. deleted).
+    """
+    fetched = {}
+    pending = list(message_ids)
+    attempt = 0
+    throttle_rounds = 0
+    cost = GMAIL_QUOTA_UNITS["messages.get"]
+
+    while pending:
+        retry = []
+        throttled = []
+        retry_after = []
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                fetched[request_id] = response
+            elif is_rate_limited(exception):
+                throttled.append(request_id)
+                retry_after.append(retry_after_seconds(exception) or 0.0)
+            elif is_throttled(exception):
+                retry.append(request_id)
+            else:
+                print(f"Error fetching message {request_id}: {exception}")
+                if failed is not None:
+                    failed[request_id] = UNAVAILABLE
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for msg_id in chunk:
+                if fmt == 'metadata':
+                    request = service.users().messages().get(
+                        userId='me', id=msg_id, format='metadata',
+                        metadataHeaders=['From', 'Subject', 'Date'],
+                    )
+                else:
+                    request = service.users().messages().get(userId='me', id=msg_id, format=fmt)
+                batch.add(request, request_id=msg_id)
+            try:
+                with gmail_limiter.slot(cost * len(chunk)), timer("gmail.batch"):
+                    batch.execute()
+                incr("gmail.api_calls", len(chunk))
+                incr("gmail.batches")
+            except Exception as e:
+                # Whole batch failed (network error etc.): retry every unanswered item
+                print(f"Batch request failed: {e}")
+                unanswered = [m for m in chunk if m not in fetched and m not in retry and m not in throttled]
+                (throttled if is_rate_limited(e) else retry).extend(unanswered)
+                if is_rate_limited(e):
+                    retry_after.append(retry_after_seconds(e) or 0.0)
+
+        if throttled:
+            # Slow every Gmail caller down; the throttled messages go round again
+            gmail_limiter.throttled(max(retry_after) or None)
+            incr("gmail.throttled", len(throttled))
+        elif not retry:
+            gmail_limiter.success()
+        if not retry and not throttled:
+            break
+
+        if throttled:
+            throttle_rounds += 1
+        if retry:
+            attempt += 1
+        if attempt > max_retries or throttle_rounds > RATE_LIMIT_MAX_THROTTLES:
+            print(f"Giving up on {len(retry) + len(throttled)} messages after "
+                  f"{attempt} retries and {throttle_rounds} throttled rounds.")
+            if failed is not None:
+                failed.update((msg_id, FETCH_FAILED) for msg_id in retry + throttled)
+            incr("gmail.fetch_failed", len(retry) + len(throttled))
+            break
+        delay = max(retry_after) if retry_after and max(retry_after) else 2 ** max(attempt, throttle_rounds)
+        print(f"Retrying {len(retry) + len(throttled)} failed messages in {delay}s...")
+        time.sleep(delay)
+        pending = retry + throttled
+
+    return fetched
+
+
+def _from_sender(email, sender_filter):
+    return not sender_filter or sender_filter.lower() in (email["from"] or "").lower()
+
+
+def _get_emails(service, message_ids, store=None, skip=None, prefilter=None, sender_filter=None,
+                failed=None):
+    """
+    Return {message_id: email dict} for the given ids.
+
+    - store: optional MailStore; stored messages are read from it first and only
+      the missing ones are downloaded (batched); downloads are written through.
+    - skip: optional container of ids that need no work at all (already decided).
+    - prefilter: optional callable(email) -> bool. Messages not in the store are
+      first fetched as metadata only (body "" plus the Gmail "snippet"); only
+      those the prefilter accepts get their full body downloaded.
+    - sender_filter: optional sender; downloads from other senders are rejected
+      on their metadata too, before the full body is requested or stored.
+    - failed: optional dict, filled with {message_id: FETCH_FAILED | UNAVAILABLE}
+      for the ids that could not be fetched (see _batch_get_messages()).
+    """
+    if skip is not None:
+        message_ids = [msg_id for msg_id in message_ids if msg_id not in skip]
+    emails = store.get_many(message_ids) if store is not None else {}
+    incr("gmail.store_hits", len(emails))
+    missing = [msg_id for msg_id in message_ids if msg_id not in emails]
+    if not missing:
+        return emails
+
+    if prefilter is not None or sender_filter:
+        meta_messages = _batch_get_messages(service, missing, fmt='metadata', failed=failed)
+        wanted = []
+        for msg_id in missing:
+            message = meta_messages.get(msg_id)
+            if message is None:
+                continue
+            try:
+                meta_email = _build_email(message, "")
+            except Exception as e:
+                print(f"Error processing message: {e}")
+                if failed is not None:
+                    failed[msg_id] = UNAVAILABLE
+                continue
+            meta_email["snippet"] = message.get("snippet", "")
+            if not _from_sender(meta_email, sender_filter):
+                incr("gmail.sender_rejected")
+                continue
+            if prefilter is None or prefilter(meta_email):
+                wanted.append(msg_id)
+        incr("gmail.metadata_fetched", len(meta_messages))
+        incr("gmail.triage_rejected", len(meta_messages) - len(wanted))
+        logger.info("Triage: %d/%d messages need their body downloaded.", len(wanted), len(missing))
+        missing = wanted
+
+    downloaded = []
+    full_messages = _batch_get_messages(service, missing, failed=failed)
+    for msg_id in missing:
+        message = full_messages.get(msg_id)
+        if message is None:
+            continue
+        try:
+            email = _build_email(message, _extract_body(message['payload']))
+        except Exception as e:
+            print(f"Error processing message: {e}")
+            if failed is not None:
+                failed[msg_id] = UNAVAILABLE
+            continue
+        emails[msg_id] = email
+        downloaded.append(email)
+
+    incr("gmail.bodies_downloaded", len(downloaded))
+    if store is not None:
+        store.put_many(downloaded)
+    return emails
+
+
+def build_query(sender_filter=COLLEGE_PLACEMENT_EMAIL, subject_filter=None, include_all=False,
+                start_date=None, after_ts=None, before_ts=None):
+    """
+    Build the Gmail search query used by iter_emails() / iter_message_ids().
+    after_ts / before_ts: epoch seconds, for exact date windows (utils/backfill.py).
+    """
+    query_parts = []
+    if not include_all:
+        if sender_filter:
+            query_parts.append(f"from:{sender_filter}")
+        if subject_filter:
+            query_parts.append(f"subject:{subject_filter}")
+    if start_date:
+        # Gmail query format: after:YYYY/MM/DD
+        query_parts.append(f"after:{start_date}")
+    if after_ts is not None:
+        query_parts.append(f"after:{int(after_ts)}")
+    if before_ts is not None:
+        query_parts.append(f"before:{int(before_ts)}")
+    return " ".join(query_parts)
+
+
+def iter_emails(
     limit=50,
     subject_filter=None,
     sender_filter=COLLEGE_PLACEMENT_EMAIL,
     include_all=False,
     start_date=None,
+    batched=True,
+    store=None,
+    skip=None,
+    prefilter=None,
+    failed=None,
 ):
     """
-    Fetch emails from Gmail with optional filtering for subject, sender, and start_date.
+    Stream emails from Gmail with optional filtering for subject, sender, and start_date.
+    Emails are yielded page by page as soon as each batch is downloaded, so callers
+    can start processing before the whole mailbox has been listed.
 
     - limit: max number of emails to fetch (e.g. 3000 for backfill).
     - subject_filter: filter by subject substring.
     - sender_filter: filter by sender email (default: college placement email).
     - include_all: if True, ignore subject/sender filters.
     - start_date: string "YYYY/MM/DD", used in Gmail query as 'after:YYYY/MM/DD'.
+    - batched: if True, fetch messages with one 'full' get each, grouped into
+      batch HTTP requests of up to GMAIL_BATCH_SIZE; if False, use the legacy
+      metadata + body round trips per message.
+    - store: optional MailStore; messages already stored are not downloaded
+      again and new ones are written through to it.
+    - skip: optional container of message ids to leave out entirely
+      (e.g. messages already decided in the run-state ledger).
+    - prefilter: optional callable(email) -> bool run on headers + snippet
+      before any body is downloaded; rejected messages are not yielded.
+    - failed: optional dict, filled with the ids that could not be fetched
+      (see _get_emails()).
+
+    Yields email dicts (see _build_email). Gmail errors are raised after the
+    emails fetched so far have been yielded.
     """
-    print("🔐 Authenticating with Gmail...")
-    service = get_gmail_service()
-    print("✅ Gmail authentication successful!\n")
-
-    # Build query string for Gmail search
-    query_parts = []
-    if not include_all:
-        if sender_filter:
-            query_parts.append(f"from:{sender_filter}")
-        if subject_filter:
-            query_parts.append(f"subject:{subject_filter}")
-    if start_date:
-        # Gmail query format: after:YYYY/MM/DD
-        query_parts.append(f"after:{start_date}")
+    service = _connect()
 
-    query = " ".join(query_parts)
+    query = build_query(sender_filter, subject_filter, include_all, start_date)
     print(f"Using Gmail search query: '{query}'")  # Debug print
 
     try:
-        emails = []
+        yielded = 0
         page_token = None
         fetched = 0
 
@@ -125,89 +425,285 @@ def fetch_emails(
                     break
                 batch_size = min(batch_size, remaining)
 
-            results = service.users().messages().list(
+            results = _execute(service.users().messages().list(
                 userId='me',
                 q=query,
                 maxResults=batch_size,
                 pageToken=page_token
-            ).execute()
+            ), 'messages.list')
+            mark_startup("first Gmail response")
 
             messages = results.get('messages', [])
             if not messages:
                 break
 
-            print(f"Processing batch of {len(messages)} messages from Gmail...")
-
-            for i, msg in enumerate(messages):
-                try:
-                    # Fetch metadata: subject, sender, date + internalDate
-                    meta = service.users().messages().get(
-                        userId='me',
-                        id=msg['id'],
-                        format='metadata',
-                        metadataHeaders=['From', 'Subject', 'Date']
-                    ).execute()
-
-                    headers = meta['payload']['headers']
-                    subject, sender, date_header = "", "", ""
-                    for header in headers:
-                        name = header['name']
-                        if name == 'Subject':
-                            subject = header['value']
-                        elif name == 'From':
-                            sender = header['value']
-                            if '<' in sender and '>' in sender:
-                                sender = sender.split('<')[1].split('>')[0]
-                        elif name == 'Date':
-                            date_header = header['value']
-
-                    # internalDate is epoch ms in UTC
-                    internal_ts_str = meta.get('internalDate')
-                    internal_ts = None
-                    received_date_str = ""
-                    received_time_str = ""
-                    if internal_ts_str is not None:
-                        try:
-                            internal_ts = int(internal_ts_str)
-                            dt_utc = datetime.fromtimestamp(internal_ts / 1000.0, tz=timezone.utc)
-                            india_tz = timezone(timedelta(hours=5, minutes=30))
-                            dt_local = dt_utc.astimezone(india_tz)
-                            received_date_str = dt_local.strftime("%d-%m-%Y")
-                            received_time_str = dt_local.strftime("%H:%M")
-                        except Exception as e:
-                            print("Error parsing internalDate:", e)
-
-                    # Get full email body (text or html as fallback)
-                    body = get_message_body(service, msg['id'])
-
-                    emails.append({
-                        "id": msg['id'],                  # Gmail message ID
-                        "subject": subject,
-                        "from": sender,
-                        "body": body,
-                        "received_date": received_date_str,  # e.g. "10-12-2025"
-                        "received_time": received_time_str,  # e.g. "14:35"
-                        "date_header": date_header,          # raw header for debugging
-                        "internal_ts": internal_ts,          # int: epoch ms
-                    })
-
-                    if (i + 1) % 10 == 0:
-                        print(f"Processed {i + 1}/{len(messages)} emails in this batch...")
-
-                except Exception as e:
-                    print(f"Error processing message: {e}")
-                    continue
+            logger.info("Processing batch of %d messages from Gmail...", len(messages))
+
+            if batched:
+                ids = [msg['id'] for msg in messages]
+                # One batch HTTP call at a time so the first emails are yielded quickly
+                for start in range(0, len(ids), GMAIL_BATCH_SIZE):
+                    chunk = ids[start:start + GMAIL_BATCH_SIZE]
+                    chunk_emails = _get_emails(service, chunk, store, skip, prefilter, failed=failed)
+                    for msg_id in chunk:
+                        email = chunk_emails.get(msg_id)
+                        if email is None:
+                            continue
+                        yielded += 1
+                        yield email
+                    logger.info("Processed %d/%d emails in this batch...", start + len(chunk), len(messages))
+            else:
+                for i, msg in enumerate(messages):
+                    if skip is not None and msg['id'] in skip:
+                        continue
+                    email = store.get(msg['id']) if store is not None else None
+                    if email is not None:
+                        yielded += 1
+                        yield email
+                        continue
+                    try:
+                        # Fetch metadata: subject, sender, date + internalDate
+                        meta = _execute(service.users().messages().get(
+                            userId='me',
+                            id=msg['id'],
+                            format='metadata',
+                            metadataHeaders=['From', 'Subject', 'Date']
+                        ), 'messages.get')
+
+                        if prefilter is not None:
+                            meta_email = _build_email(meta, "")
+                            meta_email["snippet"] = meta.get("snippet", "")
+                            if not prefilter(meta_email):
+                                continue
+
+                        # Get full email body (text or html as fallback)
+                        body = get_message_body(service, msg['id'])
+                        email = _build_email(meta, body)
+                        if store is not None:
+                            store.put(email)
+
+                        incr("gmail.bodies_downloaded")
+                        if (i + 1) % 10 == 0:
+                            logger.info("Processed %d/%d emails in this batch...", i + 1, len(messages))
+
+                    except Exception as e:
+                        print(f"Error processing message: {e}")
+                        if failed is not None:
+                            # _execute already retried throttling; only a definite refusal is final
+                            refused = http_error_status(e) is not None and not is_throttled(e)
+                            failed[msg['id']] = UNAVAILABLE if refused else FETCH_FAILED
+                        continue
+
+                    yielded += 1
+                    yield email
 
             fetched += len(messages)
-            print(f"✅ Accumulated {fetched} emails so far.")
+            logger.info("✅ Accumulated %d emails so far.", fetched)
 
             page_token = results.get('nextPageToken')
             if not page_token:
                 break
 
-        print(f"✅ Successfully fetched {len(emails)} emails from Gmail.")
-        return emails
+        print(f"✅ Successfully fetched {yielded} emails from Gmail.")
 
     except Exception as e:
+        # Raised so callers know the stream is incomplete (and keep their sync point)
         print(f"❌ Failed to fetch emails: {e}")
-        return []
\ No newline at end of file
+        raise
+
+
+def fetch_emails(
+    limit=50,
+    subject_filter=None,
+    sender_filter=COLLEGE_PLACEMENT_EMAIL,
+    include_all=False,
+    start_date=None,
+    batched=True,
+    store=None,
+    skip=None,
+    prefilter=None,
+):
+    """
+    Fetch emails from Gmail into a list. Same arguments as iter_emails();
+    prefer iter_emails() for large fetches so bodies are not all held in memory.
+    """
+    return list(iter_emails(
+        limit=limit,
+        subject_filter=subject_filter,
+        sender_filter=sender_filter,
+        include_all=include_all,
+        start_date=start_date,
+        batched=batched,
+        store=store,
+        skip=skip,
+        prefilter=prefilter,
+    ))
+
+
+def get_history_id(service=None):
+    """Return the mailbox's current historyId (used as the next incremental sync point)."""
+    if service is None:
+        service = get_gmail_service()
+    profile = _execute(service.users().getProfile(userId='me'), 'profile')
+    mark_startup("first Gmail response")
+    return profile.get('historyId')
+
+
+def _list_history_message_ids(service, start_history_id):
+    """
+    List ids of messages added since start_history_id using users.history.list.
+    Raises HttpError 404 if start_history_id is too old (history expired).
+    """
+    message_ids = []
+    seen = set()
+    page_token = None
+    while True:
+        results = _execute(service.users().history().list(
+            userId='me',
+            startHistoryId=start_history_id,
+            historyTypes=['messageAdded'],
+            pageToken=page_token
+        ), 'history.list')
+
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message = added.get('message', {})
+                msg_id = message.get('id')
+                if not msg_id or msg_id in seen:
+                    continue
+                if 'DRAFT' in message.get('labelIds', []):
+                    continue
+                seen.add(msg_id)
+                message_ids.append(msg_id)
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return message_ids
+
+
+def _list_query_message_ids(service, query):
+    """List all message ids matching a Gmail search query."""
+    message_ids = []
+    page_token = None
+    while True:
+        results = _execute(service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=500,
+            pageToken=page_token
+        ), 'messages.list')
+        message_ids.extend(msg['id'] for msg in results.get('messages', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    return message_ids
+
+
+def iter_message_ids(query, limit=None, chunk_size=GMAIL_BATCH_SIZE, stop=None):
+    """
+    Page through messages.list for `query` and yield lists of at most
+    `chunk_size` message ids (newest first), up to `limit` ids in total.
+    Stops early when the threading.Event `stop` is set.
+    """
+    service = get_gmail_service()
+    page_token = None
+    listed = 0
+    while not (stop is not None and stop.is_set()):
+        page_size = 500 if not limit else min(500, limit - listed)
+        if page_size <= 0:
+            break
+        results = _execute(service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=page_size,
+            pageToken=page_token
+        ), 'messages.list')
+        mark_startup("first Gmail response")
+        ids = [msg['id'] for msg in results.get('messages', [])]
+        listed += len(ids)
+        for start in range(0, len(ids), chunk_size):
+            yield ids[start:start + chunk_size]
+        page_token = results.get('nextPageToken')
+        if not ids or not page_token:
+            break
+
+
+def get_emails(message_ids, store=None, skip=None, prefilter=None, sender_filter=None, failed=None):
+    """
+    Fetch emails for the given ids (store first, then batched downloads).
+    Returns email dicts in the order of `message_ids`; ids that were skipped,
+    rejected by the prefilter, failed or (if given) not from `sender_filter`
+    are left out; `failed` (optional dict) collects the ids that could not be
+    fetched. Safe to call from several threads (clients are per thread).
+    """
+    # History covers the whole mailbox: other senders are dropped on their
+    # metadata, and stored mails are checked here
+    fetched = _get_emails(get_gmail_service(), message_ids, store, skip, prefilter, sender_filter,
+                          failed)
+    emails = []
+    for msg_id in message_ids:
+        email = fetched.get(msg_id)
+        if email is None or not _from_sender(email, sender_filter):
+            continue
+        emails.append(email)
+    return emails
+
+
+def list_new_message_ids(history_id=None, last_ts=0, sender_filter=COLLEGE_PLACEMENT_EMAIL):
+    """
+    List ids of messages that arrived since the previous run (see fetch_new_emails()).
+    Returns (message_ids, new_history_id); raises on API errors.
+    """
+    service = _connect()
+
+    # Read the sync point before listing so nothing arriving meanwhile is missed
+    new_history_id = get_history_id(service)
+
+    if history_id:
+        try:
+            message_ids = _list_history_message_ids(service, history_id)
+            print(f"History sync: {len(message_ids)} new messages since historyId {history_id}.")
+            return message_ids, new_history_id
+        except Exception as e:
+            if http_error_status(e) != 404:
+                raise
+            print(f"historyId {history_id} expired, falling back to date query.")
+
+    query_parts = []
+    if sender_filter:
+        query_parts.append(f"from:{sender_filter}")
+    if last_ts:
+        # Gmail accepts epoch seconds for after:
+        query_parts.append(f"after:{int(last_ts) // 1000}")
+    query = " ".join(query_parts)
+    print(f"Using Gmail search query: '{query}'")
+    return _list_query_message_ids(service, query), new_history_id
+
+
+def fetch_new_emails(history_id=None, last_ts=0, sender_filter=COLLEGE_PLACEMENT_EMAIL, store=None,
+                     skip=None, prefilter=None, failed=None):
+    """
+    Incremental sync: fetch only the emails that arrived since the previous run.
+
+    - history_id: historyId saved by the previous run. If given, users.history.list
+      is used to find added messages.
+    - last_ts: last seen internal_ts (epoch ms). Used for an 'after:<epoch>' query
+      when there is no history_id or it has expired (Gmail returns 404).
+    - sender_filter: only emails from this sender are returned.
+    - store, skip, prefilter, failed: see iter_emails().
+
+    Returns (emails, new_history_id). Email dicts match fetch_emails().
+    """
+    try:
+        message_ids, new_history_id = list_new_message_ids(history_id, last_ts, sender_filter)
+        emails = get_emails(message_ids, store, skip, prefilter, sender_filter, failed)
+
+        # Newest first, like messages.list
+        emails.sort(key=lambda e: e.get("internal_ts") or 0, reverse=True)
+        print(f"✅ Successfully fetched {len(emails)} new emails from Gmail.")
+        return emails, new_history_id
+
+    except Exception as e:
+        print(f"❌ Failed to fetch new emails: {e}")
+        return [], history_id
@@ -0,0 +1,118 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from config.config import EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_ENTRIES
+
+# Reply/forward prefixes stripped from subjects before hashing ("Re: Fwd: Drive" == "Drive")
+_SUBJECT_PREFIX_RE = re.compile(r'^\s*((re|fw|fwd)\s*[:\-]\s*)+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(text):
+    return _WHITESPACE_RE.sub(' ', text or '').strip().lower()
+
+
+def make_cache_key(email, model, prompt_version):
+    """
+    Content-addressed key for an extraction: hash of the normalized subject + body,
+    the model name and the prompt version.
+    """
+    subject = _SUBJECT_PREFIX_RE.sub('', email.get("subject") or "")
+    h = hashlib.sha256()
+    for part in (model, prompt_version, _normalize(subject), _normalize(email.get("body"))):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    On-disk (SQLite) cache of parsed LLM extraction results.
+
+    - Entries are evicted least-recently-used once more than `max_entries` are
+      stored; the entry count is tracked so puts under the limit skip eviction.
+    - `hits` / `misses` count lookups made through this instance.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, max_entries=EXTRACTION_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_extractions_last_access ON extractions(last_access)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached extraction dict for key, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE extractions SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        """Store an extraction result and evict the least recently used entries over the limit."""
+        now = time.time()
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO extractions (key, result, created_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), now, now),
+            ).rowcount
+            if inserted:
+                self._entries += 1
+            else:
+                self._conn.execute(
+                    "UPDATE extractions SET result = ?, created_at = ?, last_access = ? WHERE key = ?",
+                    (json.dumps(result), now, now, key),
+                )
+            if self._entries > self.max_entries:
+                self._entries -= self._conn.execute(
+                    "DELETE FROM extractions WHERE key IN ("
+                    " SELECT key FROM extractions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+
+    def purge(self):
+        """Delete every cached entry."""
+        with self._lock:
+            self._conn.execute("DELETE FROM extractions")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._entries = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    def stats(self):
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
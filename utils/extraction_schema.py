@@ -0,0 +1,129 @@
+import re
+
+# Keys of an LLM extraction, in prompt order (see ai_extractor.PROMPT_TEMPLATE)
+OFFER_FIELDS = [
+    "company", "category", "branches", "10th%", "12th%", "cgpa", "ctc", "stipend",
+    "last_date", "registration_links",
+]
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_URL_RE = re.compile(r"https?://\S+")
+
+
+def schema_for(fields=None):
+    """
+    JSON schema for Ollama's `format` option: an object with exactly `fields`
+    (default: all OFFER_FIELDS), all required; registration_links is a list of
+    strings, every other field a string.
+    """
+    fields = list(fields or OFFER_FIELDS)
+    properties = {
+        field: {"type": "array", "items": {"type": "string"}} if field == "registration_links"
+        else {"type": "string"}
+        for field in fields
+    }
+    return {"type": "object", "properties": properties, "required": fields}
+
+
+OFFER_SCHEMA = schema_for()
+
+
+def _text(value):
+    """Flatten a value to text; returns None for values that are not text-like (dicts)."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, list) and all(isinstance(v, (str, int, float)) for v in value):
+        return ", ".join(str(v).strip() for v in value if str(v).strip())
+    return None
+
+
+def _check_company(value):
+    text = _text(value)
+    if not text:
+        return "", "the company name (required)"
+    return text, None
+
+
+def _check_percentage(value):
+    text = _text(value)
+    if text is None:
+        return "", "a percentage between 0 and 100, as text"
+    if any(float(n) > 100 for n in _NUMBER_RE.findall(text)):
+        return "", "a percentage between 0 and 100"
+    return text, None
+
+
+def _check_cgpa(value):
+    text = _text(value)
+    if text is None:
+        return "", "a CGPA on a 10-point scale, as text"
+    numbers = [float(n) for n in _NUMBER_RE.findall(text)]
+    # "60% or 6.5 CGPA" is fine as long as some number can be a CGPA
+    if numbers and "%" not in text and not any(n <= 10 for n in numbers):
+        return "", "a CGPA on a 10-point scale"
+    return text, None
+
+
+def _check_date(value):
+    text = _text(value)
+    if text is None:
+        return "", "the registration deadline as text"
+    if text and not any(ch.isdigit() for ch in text):
+        return "", "the registration deadline as a date"
+    return text, None
+
+
+def _check_links(value):
+    if value is None or value == "":
+        return [], None
+    items = value if isinstance(value, list) else [value]
+    if not all(isinstance(item, str) for item in items):
+        return [], "a list of URLs"
+    links = [url.rstrip(".,;)") for item in items for url in _URL_RE.findall(item)]
+    if not links:
+        return [], "a list of URLs starting with http:// or https://"
+    return links, None
+
+
+def _check_text(value):
+    text = _text(value)
+    if text is None:
+        return "", "plain text"
+    return text, None
+
+
+VALIDATORS = {
+    "company": _check_company,
+    "10th%": _check_percentage,
+    "12th%": _check_percentage,
+    "cgpa": _check_cgpa,
+    "last_date": _check_date,
+    "registration_links": _check_links,
+}
+
+
+def validate_offer(data, fields=None):
+    """
+    Check and normalize an LLM extraction.
+
+    - data: the parsed JSON answer (anything that is not a dict makes every field invalid)
+    - fields: the keys that were asked for (default: all OFFER_FIELDS)
+    Returns (extracted, problems): `extracted` has every asked-for key, with
+    invalid values blanked; `problems` maps each invalid key to what was expected.
+    """
+    fields = list(fields or OFFER_FIELDS)
+    if not isinstance(data, dict):
+        data = {}
+    extracted, problems = {}, {}
+    for field in fields:
+        value, problem = VALIDATORS.get(field, _check_text)(data.get(field))
+        extracted[field] = value
+        if problem:
+            problems[field] = problem
+    return extracted, problems
@@ -0,0 +1,521 @@
+"""
+In-process stand-ins for the Gmail API, the Sheets API and an Ollama server,
+for running main.py (including --daemon) and the benchmarks without network
+access or credentials.
+
+- FakeGmailService / FakeSheetsService mimic the googleapiclient call chains
+  used in email_utils.py and sheets_utils.py; install_fake_services() makes
+  get_gmail_service() / get_sheets_service() return them.
+- FakeOllamaServer is a real HTTP server on 127.0.0.1 that answers
+  /api/generate (streaming or not) with the regex extractor's result, with
+  configurable time to first token and per-token delay.
+"""
+import re
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.google_clients import install_service
+from utils.rate_limit import gmail_limiter, sheets_limiter
+from utils.parsing_utils import get_extractor
+
+
+class _Request:
+    """Deferred API call with the googleapiclient `.execute()` interface."""
+
+    def __init__(self, fn, latency=0.0):
+        self._fn = fn
+        self._latency = latency
+
+    def execute(self):
+        if self._latency:
+            time.sleep(self._latency)
+        return self._fn()
+
+
+# --- Gmail ------------------------------------------------------------------
+
+def _part(mime_type, text):
+    data = base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+    return {"mimeType": mime_type, "body": {"size": len(text), "data": data}}
+
+
+def to_gmail_message(email, history_id=None):
+    """
+    Render an email dict (as produced by email_utils / benchmarks.corpus) as a
+    Gmail message resource. If the dict has "html" and "format" keys, the mail
+    is served as text/html ("html") or multipart/alternative ("multipart").
+    """
+    body = email.get("body") or ""
+    internal_ts = email.get("internal_ts") or int(time.time() * 1000)
+    date_header = email.get("date_header") or datetime.fromtimestamp(
+        internal_ts / 1000, tz=timezone.utc
+    ).strftime("%a, %d %b %Y %H:%M:%S +0000")
+    fmt = email.get("format") if email.get("html") else "plain"
+    if fmt == "html":
+        payload = _part("text/html", email["html"])
+    elif fmt == "multipart":
+        payload = {"mimeType": "multipart/alternative", "body": {"size": 0},
+                   "parts": [_part("text/plain", body), _part("text/html", email["html"])]}
+    else:
+        payload = _part("text/plain", body)
+    payload["headers"] = [
+        {"name": "From", "value": email.get("from", "")},
+        {"name": "Subject", "value": email.get("subject", "")},
+        {"name": "Date", "value": date_header},
+    ]
+    return {
+        "id": email["id"],
+        "threadId": email["id"],
+        "historyId": history_id,
+        "labelIds": ["INBOX"],
+        "internalDate": str(internal_ts),
+        "snippet": " ".join(body.split())[:200],
+        "payload": payload,
+    }
+
+
+def _query_ms(value):
+    """after:/before: value (epoch seconds or YYYY/MM/DD) as epoch ms."""
+    if value.isdigit():
+        return int(value) * 1000
+    return int(datetime.strptime(value, "%Y/%m/%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _matches_query(message, email, query):
+    """Supports the query terms email_utils builds: from:, subject:, after:/before:<date|epoch>."""
+    for term in (query or "").split():
+        name, _, value = term.partition(":")
+        if name == "from" and value.lower() not in (email.get("from") or "").lower():
+            return False
+        if name == "subject" and value.lower() not in (email.get("subject") or "").lower():
+            return False
+        if name == "after" and int(message["internalDate"]) < _query_ms(value):
+            return False
+        if name == "before" and int(message["internalDate"]) >= _query_ms(value):
+            return False
+    return True
+
+
+class FakeGmailService:
+    """
+    In-memory mailbox behind the Gmail API calls used by email_utils:
+    users().messages().list/get, users().getProfile, users().history().list
+    and new_batch_http_request(). `latency` is added per HTTP round trip
+    (a batch counts as one); `calls` counts API requests, batch sub-requests included.
+    Batches asking for an id in `unreachable` fail as a whole with a network error.
+    """
+
+    def __init__(self, emails=(), latency=0.0):
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._emails = {}
+        self._messages = {}
+        self._order = []      # newest first, like Gmail
+        self._history = []    # (history_id, message_id)
+        self._history_id = 1000
+        self.calls = 0
+        self.unreachable = set()
+        self.add_many(emails)
+
+    # --- mailbox ------------------------------------------------------------
+
+    def add_many(self, emails):
+        with self._lock:
+            for email in emails:
+                self._history_id += 1
+                self._emails[email["id"]] = email
+                self._messages[email["id"]] = to_gmail_message(email, str(self._history_id))
+                self._history.append((self._history_id, email["id"]))
+            self._order = sorted(
+                self._messages, key=lambda m: int(self._messages[m]["internalDate"]), reverse=True
+            )
+
+    def add(self, email):
+        self.add_many([email])
+
+    def deliver(self, emails, interval, stop=None):
+        """Deliver `emails` one by one every `interval` seconds in a daemon thread (stamped with the current time)."""
+        stop = stop or threading.Event()
+
+        def run():
+            for email in emails:
+                if stop.wait(interval):
+                    return
+                self.add({**email, "internal_ts": int(time.time() * 1000), "date_header": None})
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _request(self, fn):
+        def counted():
+            with self._lock:
+                self.calls += 1
+                return fn()
+        return _Request(counted, self.latency)
+
+    # --- API surface ----------------------------------------------------------
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return _FakeGmailMessages(self)
+
+    def history(self):
+        return _FakeGmailHistory(self)
+
+    def getProfile(self, userId="me"):
+        return self._request(lambda: {"emailAddress": userId, "historyId": str(self._history_id)})
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self, callback)
+
+
+class _FakeGmailMessages:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId="me", q="", maxResults=100, pageToken=None):
+        def run():
+            gmail = self.gmail
+            ids = [m for m in gmail._order if _matches_query(gmail._messages[m], gmail._emails[m], q)]
+            start = int(pageToken or 0)
+            page = ids[start:start + maxResults]
+            result = {"messages": [{"id": m, "threadId": m} for m in page],
+                      "resultSizeEstimate": len(ids)}
+            if start + maxResults < len(ids):
+                result["nextPageToken"] = str(start + maxResults)
+            return result
+        return self.gmail._request(run)
+
+    def _get(self, id, format="full"):
+        message = self.gmail._messages[id]
+        if format == "metadata":
+            payload = {k: v for k, v in message["payload"].items() if k not in ("body", "parts")}
+            return {**message, "payload": payload}
+        return message
+
+    def get(self, userId="me", id=None, format="full", metadataHeaders=None):
+        return self.gmail._request(lambda: self._get(id, format))
+
+
+class _FakeGmailHistory:
+    def __init__(self, gmail):
+        self.gmail = gmail
+
+    def list(self, userId="me", startHistoryId=None, historyTypes=None, pageToken=None):
+        def run():
+            start = int(startHistoryId)
+            added = [
+                {"id": str(hid), "messagesAdded": [{"message": {"id": mid, "labelIds": ["INBOX"]}}]}
+                for hid, mid in self.gmail._history if hid > start
+            ]
+            return {"history": added, "historyId": str(self.gmail._history_id)}
+        return self.gmail._request(run)
+
+
+class _FakeBatch:
+    """new_batch_http_request(): sub-requests run on execute(), one round trip of latency."""
+
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        if self.gmail.latency:
+            time.sleep(self.gmail.latency)
+        if any(request_id in self.gmail.unreachable for request_id, _ in self._requests):
+            raise ConnectionError("Connection reset by peer (fake)")
+        for request_id, request in self._requests:
+            try:
+                response, error = request._fn(), None
+            except Exception as e:
+                response, error = None, e
+            if self.callback is not None:
+                self.callback(request_id, response, error)
+
+
+# --- Sheets -----------------------------------------------------------------
+
+_A1_RE = re.compile(r"^(?:'?(?P<tab>[^'!]+)'?!)?(?P<c1>[A-Z]+)(?P<r1>\d*)(?::(?P<c2>[A-Z]+)(?P<r2>\d*))?$")
+
+
+def _col_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord("A") + 1)
+    return index - 1
+
+
+def _parse_a1(a1):
+    """'Tab!B2:K' -> (tab, col1, row1, col2, row2); rows are 1-based, None = open-ended."""
+    m = _A1_RE.match(a1)
+    if not m:
+        raise ValueError(f"Unsupported range {a1!r}")
+    c1 = _col_index(m.group("c1"))
+    c2 = _col_index(m.group("c2")) if m.group("c2") else c1
+    r1 = int(m.group("r1")) if m.group("r1") else 1
+    r2 = int(m.group("r2")) if m.group("r2") else (r1 if not m.group("c2") and m.group("r1") else None)
+    return m.group("tab"), c1, r1, c2, r2
+
+
+class FakeSheetsService:
+    """
+    In-memory spreadsheet behind the values() calls used by sheets_utils:
+    append, batchGet and batchUpdate. `tabs` maps tab name -> list of rows
+    (row 1 is the header). `latency` is added per call.
+    """
+
+    def __init__(self, tabs=None, latency=0.0):
+        self.tabs = tabs if tabs is not None else {}
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _request(self, fn):
+        def counted():
+            with self._lock:
+                self.calls += 1
+                return fn()
+        return _Request(counted, self.latency)
+
+    def _tab(self, name):
+        return self.tabs.setdefault(name, [])
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def append(self, spreadsheetId=None, range=None, valueInputOption=None,
+               insertDataOption=None, body=None):
+        def run():
+            tab_name = _parse_a1(range)[0]
+            tab = self._tab(tab_name)
+            first = len(tab) + 1
+            values = [list(map(str, row)) for row in body["values"]]
+            tab.extend(values)
+            last = len(tab)
+            return {"updates": {"updatedRange": f"'{tab_name}'!A{first}:O{last}",
+                                "updatedRows": len(values)}}
+        return self._request(run)
+
+    def batchGet(self, spreadsheetId=None, ranges=(), **kwargs):
+        def run():
+            value_ranges = []
+            for a1 in ranges:
+                tab_name, c1, r1, c2, r2 = _parse_a1(a1)
+                rows = self._tab(tab_name)[r1 - 1:r2]
+                values = []
+                for row in rows:
+                    cells = list(row[c1:c2 + 1])
+                    while cells and cells[-1] == "":
+                        cells.pop()
+                    values.append(cells)
+                while values and not values[-1]:
+                    values.pop()
+                value_ranges.append({"range": a1, "values": values})
+            return {"valueRanges": value_ranges}
+        return self._request(run)
+
+    def batchUpdate(self, spreadsheetId=None, body=None):
+        def run():
+            for data in body.get("data", []):
+                tab_name, c1, r1, _, _ = _parse_a1(data["range"])
+                tab = self._tab(tab_name)
+                for offset, values in enumerate(data["values"]):
+                    while len(tab) < r1 + offset:
+                        tab.append([])
+                    row = tab[r1 - 1 + offset]
+                    if len(row) < c1 + len(values):
+                        row.extend([""] * (c1 + len(values) - len(row)))
+                    row[c1:c1 + len(values)] = list(map(str, values))
+            return {"totalUpdatedRanges": len(body.get("data", []))}
+        return self._request(run)
+
+
+def install_fake_services(gmail=None, sheets=None, quota=False):
+    """
+    Make get_gmail_service() / get_sheets_service() return the given fakes (new ones if omitted).
+    The fakes have no quota, so the rate limiters' token buckets are switched
+    off unless `quota` is set (to see how the real quotas pace a run).
+    """
+    gmail = gmail if gmail is not None else FakeGmailService()
+    sheets = sheets if sheets is not None else FakeSheetsService()
+    install_service("gmail", "v1", gmail)
+    install_service("sheets", "v4", sheets)
+    if not quota:
+        gmail_limiter.configure(rate=None)
+        sheets_limiter.configure(rate=None)
+    return gmail, sheets
+
+
+# --- Ollama -----------------------------------------------------------------
+
+# Regex result keys -> keys of the LLM answer (see PROMPT_TEMPLATE)
+_LLM_KEYS = {
+    "company": "company", "category": "category", "branches": "branches", "10th": "10th%",
+    "12th": "12th%", "cgpa": "cgpa", "ctc": "ctc", "stipend": "stipend",
+    "last_date": "last_date", "registration_links": "registration_links",
+}
+
+
+# Values the validator rejects, used to simulate a model getting a field wrong
+_INVALID_VALUES = {"cgpa": "75", "10th%": "650", "12th%": "720", "last_date": "soon"}
+
+
+_BATCH_ITEM_RE = re.compile(r"^=== (\S+) ===\nSubject: (.*?)\nBody: (.*?)(?=^=== |^---\s*\Z)",
+                            re.DOTALL | re.MULTILINE)
+
+
+def _regex_answer(subject, body):
+    result = get_extractor().extract(body, "", subject) or {}
+    return {llm_key: result.get(key, "") for key, llm_key in _LLM_KEYS.items()}
+
+
+def _fake_answer(prompt, invalid_rate=0.0):
+    """
+    JSON answer for an extraction prompt, computed with the regex extractor.
+    With probability `invalid_rate` (decided per prompt, so reruns agree) one
+    field of a full answer gets an invalid value, and each mail of a batch
+    prompt may be left out of the answer.
+    """
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    batch = _BATCH_ITEM_RE.findall(prompt)
+    if batch:
+        offers = [{"tag": tag, **_regex_answer(subject, body.rstrip("\n"))}
+                  for tag, subject, body in batch if not rng.random() < invalid_rate]
+        return json.dumps({"offers": offers})
+
+    m = re.search(r"^Subject: (.*?)\nBody: (.*)\n---\s*$", prompt, re.DOTALL | re.MULTILINE)
+    subject, body = (m.group(1), m.group(2)) if m else ("", prompt)
+    answer = _regex_answer(subject, body)
+    fields = re.search(r"extract ONLY these fields: (.*?)\.\n", prompt)
+    if fields:
+        wanted = [f.strip() for f in fields.group(1).split(",")]
+        answer = {f: answer.get(f, "") for f in wanted}
+    elif invalid_rate and rng.random() < invalid_rate:
+        field = rng.choice(sorted(_INVALID_VALUES))
+        answer[field] = _INVALID_VALUES[field]
+    return json.dumps(answer)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hang up mid-response on purpose (stop after the JSON object)
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+class FakeOllamaServer:
+    """
+    Minimal Ollama /api/generate on 127.0.0.1 (random port), in a daemon thread.
+
+    - ttft: seconds before the first token; token_delay: seconds per token
+      (a token is `token_chars` characters of the JSON answer);
+      prompt_token_delay: extra seconds before the first token per prompt
+      token (`token_chars` characters of the prompt), i.e. prompt evaluation.
+    - Requests without a prompt (warm-up) return immediately.
+    - invalid_rate: share of full extractions answered with one invalid field,
+      and of batched mails left out of the answer (see _fake_answer), to
+      exercise the repair and fallback paths.
+    Use as a context manager or call start()/stop(); `url` is the base URL.
+    """
+
+    def __init__(self, ttft=0.05, token_delay=0.0, token_chars=8, invalid_rate=0.0,
+                 prompt_token_delay=0.0):
+        self.ttft = ttft
+        self.prompt_token_delay = prompt_token_delay
+        self.invalid_rate = invalid_rate
+        self.token_delay = token_delay
+        self.token_chars = token_chars
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                prompt = payload.get("prompt")
+                if not prompt:
+                    self._send_json({"model": payload.get("model"), "done": True})
+                    return
+
+                time.sleep(server.ttft + server.prompt_token_delay * len(prompt) / server.token_chars)
+                answer = _fake_answer(prompt, server.invalid_rate)
+                tokens = [answer[i:i + server.token_chars]
+                          for i in range(0, len(answer), server.token_chars)]
+                if not payload.get("stream", True):
+                    time.sleep(server.token_delay * len(tokens))
+                    self._send_json({"response": answer, "done": True})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        self._chunk({"response": token, "done": False})
+                        if server.token_delay:
+                            time.sleep(server.token_delay)
+                    self._chunk({"response": "", "done": True})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client stopped reading after the JSON object
+                    self.close_connection = True
+
+            def _chunk(self, obj):
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, obj):
+                data = json.dumps(obj).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._httpd = _QuietHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,36 +1,103 @@
+from collections import namedtuple
+
+from config.config import PLACEMENT_INCLUDE_KEYWORDS, PLACEMENT_EXCLUDE_KEYWORDS
+
+# accepted: bool
+# rule:     "exclude" / "include" / "no_match"
+# keyword:  vocabulary entry that decided the outcome ("" for no_match)
+# field:    "subject" / "body" where the keyword was found ("" for no_match)
+Classification = namedtuple("Classification", ["accepted", "rule", "keyword", "field"])
+
+
+def _compile_vocabulary(keywords):
+    """
+    Lowercase and dedupe a keyword list, and drop entries that contain another
+    entry (e.g. "shortlisted" when "shortlist" is present) since they can never
+    change the outcome. Order of the remaining entries is preserved.
+    """
+    words = []
+    for kw in keywords:
+        kw = kw.lower().strip()
+        if kw and kw not in words:
+            words.append(kw)
+    return tuple(w for w in words if not any(o != w and o in w for o in words))
+
+
+class KeywordClassifier:
+    """
+    Decides whether a mail is a first-round placement announcement.
+
+    A mail is rejected if any exclude keyword appears in its subject or body,
+    otherwise accepted if any include keyword appears, otherwise rejected.
+    Vocabularies are compiled once; each mail is lowercased once and the
+    subject and body are checked together.
+
+    Note: a single alternation regex over the vocabulary is about 6x slower
+    than CPython's substring search for vocabularies of this size (~140 vs
+    ~25 us/mail in benchmarks/bench_filters.py), so the compiled form is a
+    pruned keyword tuple.
+    """
+
+    def __init__(self, include=PLACEMENT_INCLUDE_KEYWORDS, exclude=PLACEMENT_EXCLUDE_KEYWORDS):
+        self.exclude = _compile_vocabulary(exclude)
+        self.include = _compile_vocabulary(include)
+
+    def classify(self, email):
+        """Return a Classification for an email dict with 'subject' and 'body'."""
+        subj = (email.get("subject") or "").lower()
+        body = (email.get("body") or "").lower()
+        # Keywords never contain a newline, so joining cannot create false matches
+        text = subj + "\n" + body
+
+        for kw in self.exclude:
+            pos = text.find(kw)
+            if pos != -1:
+                return Classification(False, "exclude", kw, "subject" if pos < len(subj) else "body")
+
+        for kw in self.include:
+            pos = text.find(kw)
+            if pos != -1:
+                return Classification(True, "include", kw, "subject" if pos < len(subj) else "body")
+
+        return Classification(False, "no_match", "", "")
+
+    def prefilter(self, email):
+        """
+        Cheap triage on headers + Gmail snippet, before the body is downloaded.
+        Returns False only if an exclude keyword already appears in the subject or
+        snippet (the full body could never pass then); True means "fetch the body".
+        """
+        meta = {"subject": email.get("subject"), "body": email.get("snippet")}
+        return self.classify(meta).rule != "exclude"
+
+    def classify_many(self, emails):
+        """Classify a batch of emails; returns a list of Classification in input order."""
+        classify = self.classify
+        return [classify(email) for email in emails]
+
+
+_default_classifier = None
+
+
+def get_default_classifier():
+    """Shared classifier built from the keyword lists in config.py."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = KeywordClassifier()
+    return _default_classifier
+
+
 def is_first_round_placement_mail(email):
     """
     Returns True if the email is a first-round/initial campus placement offer announcement, else False.
     Parameter email is a dict with at least 'subject' and 'body'
     """
+    return get_default_classifier().classify(email).accepted
 
-    OFFER_KEYWORDS = [
-        "placement", "internship", "drive", "dream offer", "super dream", "opportunity", "registration",
-        "category", "offer", "eligible branch", "campus program"
-    ]
-    EXCLUDE_KEYWORDS = [
-    "shortlist", "short-listed", "shortlisted",
-    "selected students", "selected", "selection list",
-    "further round", "next round",
-    "interview", "technical interview", "group discussion",
-    "test scheduled", "online test",
-    "pre-placement talk", "pre placement talk",
-    "congratulations",
-    "selection process",
-    "technical round", "assessment", "round"
-    ]
-
-    subj = (email.get("subject") or "").lower()
-    body = (email.get("body") or "").lower()
-
-    # Exclude if any exclusion keyword matches subject or body
-    for bad_kw in EXCLUDE_KEYWORDS:
-        if bad_kw in subj or bad_kw in body:
-            return False
-
-    # Only accept if at least one offer keyword appears in subject or body
-    for ok_kw in OFFER_KEYWORDS:
-        if ok_kw in subj or ok_kw in body:
-            return True
-
-    return False
\ No newline at end of file
+
+def may_be_first_round_placement_mail(email):
+    """
+    Metadata pre-filter: False if the subject/snippet already rules the mail out.
+    Parameter email is a dict with at least 'subject' and 'snippet'
+    """
+    return get_default_classifier().prefilter(email)
@@ -0,0 +1,142 @@
+import zlib
+import sqlite3
+import threading
+
+from config.config import MAIL_STORE_PATH
+
+_COLUMNS = ("id", "subject", "sender", "received_date", "received_time", "date_header", "internal_ts")
+
+
+class MailStore:
+    """
+    Local copy of fetched Gmail messages (SQLite, zlib-compressed bodies).
+
+    Keyed by Gmail message id and indexed by internal_ts and sender, so backfills
+    and re-extractions can read mail without touching the Gmail API.
+    Stores and returns the same email dicts as email_utils.iter_emails().
+    """
+
+    def __init__(self, path=MAIL_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id TEXT PRIMARY KEY,"
+            " subject TEXT,"
+            " sender TEXT,"
+            " received_date TEXT,"
+            " received_time TEXT,"
+            " date_header TEXT,"
+            " internal_ts INTEGER,"
+            " body BLOB)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages(internal_ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender)")
+        self._conn.commit()
+
+    @staticmethod
+    def _to_email(row):
+        """Rebuild the email dict (same keys as email_utils._build_email) from a row."""
+        msg_id, subject, sender, received_date, received_time, date_header, internal_ts, body = row
+        return {
+            "id": msg_id,
+            "subject": subject,
+            "from": sender,
+            "body": zlib.decompress(body).decode("utf-8") if body else "",
+            "received_date": received_date,
+            "received_time": received_time,
+            "date_header": date_header,
+            "internal_ts": internal_ts,
+        }
+
+    def put_many(self, emails):
+        """Insert or replace a batch of email dicts in one transaction."""
+        rows = [
+            (
+                e["id"], e.get("subject", ""), e.get("from", ""),
+                e.get("received_date", ""), e.get("received_time", ""),
+                e.get("date_header", ""), e.get("internal_ts"),
+                zlib.compress((e.get("body") or "").encode("utf-8")),
+            )
+            for e in emails
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages"
+                " (id, subject, sender, received_date, received_time, date_header, internal_ts, body)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def put(self, email):
+        self.put_many([email])
+
+    def get_many(self, message_ids):
+        """Return {message_id: email dict} for the ids that are stored."""
+        found = {}
+        ids = list(message_ids)
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)}, body FROM messages WHERE id IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+            for row in rows:
+                found[row[0]] = self._to_email(row)
+        return found
+
+    def get(self, message_id):
+        return self.get_many([message_id]).get(message_id)
+
+    def iter_emails(self, sender=None, since_ts=None, until_ts=None, limit=None):
+        """
+        Yield stored emails newest first, optionally restricted to a sender
+        (substring match) and an internal_ts range (epoch ms, inclusive).
+        """
+        clauses, params = [], []
+        if sender:
+            clauses.append("sender LIKE ?")
+            params.append(f"%{sender}%")
+        if since_ts:
+            clauses.append("internal_ts >= ?")
+            params.append(int(since_ts))
+        if until_ts:
+            clauses.append("internal_ts <= ?")
+            params.append(int(until_ts))
+        sql = f"SELECT {', '.join(_COLUMNS)}, body FROM messages"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY internal_ts DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchmany(100)
+        while rows:
+            for row in rows:
+                yield self._to_email(row)
+            with self._lock:
+                rows = cursor.fetchmany(100)
+
+    def __contains__(self, message_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM messages WHERE id = ?", (message_id,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
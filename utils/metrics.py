@@ -0,0 +1,124 @@
+import os
+import re
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Prometheus metric name prefix
+PROMETHEUS_PREFIX = "patlens_"
+QUANTILES = (0.5, 0.95, 0.99)
+# Latest samples kept per timer for the quantiles, so a daemon's memory stays flat
+TIMER_SAMPLES = 10000
+
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+class Metrics:
+    """
+    Thread-safe counters and timers for one process.
+
+    - incr("gmail.api_calls", n): counters
+    - observe("llm.latency", seconds) / with timer("sheets.write"): timers,
+      reported with count, sum, mean and max over every observation, and
+      p50/p95/p99 over the latest TIMER_SAMPLES
+    Names are dotted ("stage.metric"); report() keeps them as they are,
+    write_prometheus() turns them into patlens_stage_metric.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.timers = {}  # name -> [count, sum, max, deque of the latest samples]
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0, seconds, deque(maxlen=TIMER_SAMPLES)]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            timer[3].append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.counters = {}
+            self.timers = {}
+
+    def report(self):
+        """JSON-serializable snapshot: {"counters": {...}, "timers": {name: summary}}."""
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {name: (count, total, largest, sorted(samples))
+                      for name, (count, total, largest, samples) in self.timers.items()}
+        summaries = {}
+        for name, (count, total, largest, samples) in timers.items():
+            summary = {"count": count, "sum_s": total, "mean_s": total / count}
+            for q in QUANTILES:
+                summary[f"p{int(q * 100)}_s"] = _quantile(samples, q)
+            summary["max_s"] = largest
+            summaries[name] = summary
+        return {
+            "started": self.started,
+            "elapsed_s": time.time() - self.started,
+            "counters": dict(sorted(counters.items())),
+            "timers": dict(sorted(summaries.items())),
+        }
+
+    def write_json(self, path, extra=None):
+        """Write report() (plus `extra` top-level keys) as a JSON run report."""
+        report = self.report()
+        if extra:
+            report.update(extra)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text format, for node_exporter's
+        textfile collector (written to a temp file and renamed, so it is never read half-written).
+        """
+        report = self.report()
+        lines = []
+        for name, value in report["counters"].items():
+            metric = _prometheus_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, summary in report["timers"].items():
+            metric = _prometheus_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {summary[f"p{int(q * 100)}_s"]}')
+            lines += [f"{metric}_sum {summary['sum_s']}", f"{metric}_count {summary['count']}"]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _prometheus_name(name):
+    return PROMETHEUS_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+# Process-wide registry used by the utils modules and main.py
+metrics = Metrics()
+incr = metrics.incr
+observe = metrics.observe
+timer = metrics.timer
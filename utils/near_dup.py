@@ -0,0 +1,343 @@
+import re
+import json
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+
+from config.config import (
+    NEAR_DUP_INDEX_PATH,
+    NEAR_DUP_MIN_SIMILARITY,
+    NEAR_DUP_BANDS,
+    NEAR_DUP_BAND_ROWS,
+)
+from utils.condense import strip_quoted_history, strip_boilerplate
+from utils.extraction_schema import OFFER_FIELDS
+from utils.metrics import incr, timer
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Features are sentences, so a paragraph repeated a different number of times
+# (or re-wrapped by the HTML conversion) does not make two mails differ
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+# MinHash permutations h -> (a*h + b) mod p; the seed is fixed so signatures
+# stay comparable across runs
+_PRIME = (1 << 61) - 1
+_SEED = 0x5EED
+
+# Which fields a body line can carry, by its label
+FIELD_LINE_PATTERNS = [
+    (re.compile(r"company"), ("company",)),
+    (re.compile(r"category"), ("category",)),
+    (re.compile(r"branch"), ("branches",)),
+    # "10th"/"12th" alone would also match dates ("12th Aug")
+    (re.compile(r"criteria|cgpa|percentage|%|\b(x|xii|ssc|hsc)\b|\b1[02]th\s*(std|class|marks|grade)"),
+     ("10th%", "12th%", "cgpa")),
+    (re.compile(r"\bctc\b|package|\blpa\b"), ("ctc",)),
+    (re.compile(r"stipend"), ("stipend",)),
+    (re.compile(r"last date|deadline|extended|postponed"), ("last_date",)),
+    (re.compile(r"link|https?://"), ("registration_links",)),
+]
+
+
+# Regex result keys stored by extractions from before tiered results used the LLM keys
+_REGEX_KEYS = {"10th": "10th%", "12th": "12th%"}
+
+
+def to_offer_keys(extracted):
+    """Copy of an extraction with regex-style keys ("10th") renamed to OFFER_FIELDS keys ("10th%")."""
+    extracted = dict(extracted)
+    for regex_key, key in _REGEX_KEYS.items():
+        value = extracted.pop(regex_key, None)
+        if value and not extracted.get(key):
+            extracted[key] = value
+    return extracted
+
+
+def _feature_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _unpack(blob):
+    values = array("Q")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+def line_fields(line):
+    """Fields a body line can carry (by its label), in OFFER_FIELDS order."""
+    line = line.lower()
+    found = {field for pattern, fields in FIELD_LINE_PATTERNS if pattern.search(line) for field in fields}
+    return [field for field in OFFER_FIELDS if field in found]
+
+
+def mail_features(email):
+    """
+    Normalized sentences of a mail body (quoted history, footers and
+    disclaimers removed; lowercase words only), hashed to 64 bits.
+    Returns {hash: fields of the line the sentence is on}.
+    """
+    body = strip_boilerplate(strip_quoted_history(email.get("body") or ""))
+    features = {}
+    for line in body.split("\n"):
+        fields = None
+        for sentence in _SENTENCE_RE.split(line):
+            words = _WORD_RE.findall(sentence.lower())
+            if not words:
+                continue
+            if fields is None:
+                fields = line_fields(line)
+            features.setdefault(_feature_hash(" ".join(words)), fields)
+    return features
+
+
+def changed_fields(features, other):
+    """Fields on the sentences found in only one of two mail_features() results."""
+    found = set()
+    for h in features.keys() ^ other.keys():
+        found.update(features.get(h) or other.get(h))
+    return [field for field in OFFER_FIELDS if field in found]
+
+
+class NearDuplicateIndex:
+    """
+    Persisted MinHash LSH index over the placement mails already extracted.
+
+    - Each mail is a set of hashed body sentences (see mail_features); its
+      MinHash signature is cut into `bands` bands of `rows` values, and mails
+      sharing any band are candidates. Candidates are confirmed with the exact
+      Jaccard similarity of their sentence sets, so a lookup touches a handful
+      of mails however many are indexed (no linear scan).
+    - Signatures, sentence hashes and timestamps are loaded into memory on
+      open; sentence fields and extractions stay in SQLite and are read for
+      the matched mail only.
+    """
+
+    def __init__(self, path=NEAR_DUP_INDEX_PATH, threshold=NEAR_DUP_MIN_SIMILARITY,
+                 bands=NEAR_DUP_BANDS, rows=NEAR_DUP_BAND_ROWS):
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(_SEED)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(bands * rows)]
+        self._lock = threading.Lock()
+        self._buckets = [{} for _ in range(bands)]  # band -> {band values: [mail ids]}
+        self._hashes = {}                           # mail id -> array of sentence hashes
+        self._ts = {}                               # mail id -> internal_ts
+        self.stats = {"lookups": 0, "duplicates": 0, "superseded": 0, "near": 0, "new": 0}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mails ("
+            " id TEXT PRIMARY KEY,"
+            " internal_ts INTEGER,"
+            " signature BLOB NOT NULL,"
+            " features TEXT NOT NULL,"
+            " extracted TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._load()
+
+    def _layout(self):
+        return f"{self.bands}x{self.rows}:{_SEED}"
+
+    def _load(self):
+        """Build the in-memory index; signatures are recomputed if the LSH layout changed."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        relayout = row is not None and row[0] != self._layout()
+        for msg_id, internal_ts, signature, features in self._conn.execute(
+            "SELECT id, internal_ts, signature, features FROM mails"
+        ).fetchall():
+            hashes = array("Q", sorted(int(h) for h in json.loads(features)))
+            if relayout:
+                signature = self.signature(hashes)
+                self._conn.execute("UPDATE mails SET signature = ? WHERE id = ?",
+                                   (array("Q", signature).tobytes(), msg_id))
+            else:
+                signature = _unpack(signature)
+            self._insert(msg_id, internal_ts, hashes, signature)
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (self._layout(),))
+        self._conn.commit()
+
+    def signature(self, hashes):
+        """MinHash signature (bands * rows values) of a set of sentence hashes."""
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [tuple(signature[i * r:(i + 1) * r]) for i in range(self.bands)]
+
+    def _insert(self, msg_id, internal_ts, hashes, signature):
+        for bucket, key in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(key, []).append(msg_id)
+        self._hashes[msg_id] = hashes
+        self._ts[msg_id] = internal_ts or 0
+
+    def _remove(self, msg_id):
+        row = self._conn.execute("SELECT signature FROM mails WHERE id = ?", (msg_id,)).fetchone()
+        if row is None:
+            return
+        for bucket, key in zip(self._buckets, self._band_keys(_unpack(row[0]))):
+            ids = bucket.get(key, [])
+            if msg_id in ids:
+                ids.remove(msg_id)
+        self._hashes.pop(msg_id, None)
+        self._ts.pop(msg_id, None)
+
+    def match(self, features, signature, exclude=None):
+        """
+        Most similar indexed mail with a Jaccard similarity >= threshold
+        (ties go to the newest), ignoring `exclude` (the mail's own id).
+        Returns (mail id, similarity) or None.
+        """
+        hashes = set(features)
+        best = None
+        with timer("dedup.lookup"), self._lock:
+            self.stats["lookups"] += 1
+            candidates = set()
+            for bucket, key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(bucket.get(key, ()))
+            candidates.discard(exclude)
+            for msg_id in candidates:
+                other = self._hashes[msg_id]
+                shared = len(hashes.intersection(other))
+                similarity = shared / (len(hashes) + len(other) - shared)
+                if similarity >= self.threshold and (
+                    best is None or (similarity, self._ts[msg_id]) > (best[1], self._ts[best[0]])
+                ):
+                    best = (msg_id, similarity)
+        return best
+
+    def entry(self, msg_id):
+        """Stored mail: {"internal_ts", "features", "extracted"}, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT internal_ts, features, extracted FROM mails WHERE id = ?", (msg_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        features = {int(h): fields for h, fields in json.loads(row[1]).items()}
+        return {"internal_ts": row[0] or 0, "features": features, "extracted": json.loads(row[2])}
+
+    def add(self, email, features, signature, extracted):
+        """Index an extracted mail; `extracted` should carry the row's mail_date / mail_time."""
+        msg_id = email["id"]
+        hashes = array("Q", sorted(features))
+        with self._lock:
+            self._remove(msg_id)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mails (id, internal_ts, signature, features, extracted)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (msg_id, email.get("internal_ts"), array("Q", signature).tobytes(),
+                 json.dumps({str(h): fields for h, fields in features.items()}), json.dumps(extracted)),
+            )
+            self._conn.commit()
+            self._insert(msg_id, email.get("internal_ts"), hashes, signature)
+
+    def purge(self):
+        """Forget every indexed mail (e.g. before an offline replay re-extracts them)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM mails")
+            self._conn.commit()
+            self._buckets = [{} for _ in range(self.bands)]
+            self._hashes, self._ts = {}, {}
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def summary(self):
+        s = self.stats
+        return (f"{len(self)} mails indexed, {s['lookups']} lookups: {s['new']} new, "
+                f"{s['near']} near-duplicates, {s['duplicates']} duplicates, {s['superseded']} superseded")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Duplicate:
+    """Result of DedupExtractor.extract for a mail that adds nothing to an indexed drive."""
+
+    def __init__(self, of, reason):
+        self.of = of          # id of the indexed mail it duplicates
+        self.reason = reason  # "duplicate" or "superseded" (an indexed mail is newer)
+
+    def __repr__(self):
+        return f"Duplicate(of={self.of!r}, reason={self.reason!r})"
+
+
+class DedupExtractor:
+    """
+    Puts the near-duplicate index in front of a per-mail extract function.
+
+    - No similar mail indexed: `extract(email)`, and the result is indexed.
+    - Similar to a newer indexed mail: Duplicate("superseded").
+    - Similar to an older one, no field line changed: Duplicate("duplicate").
+    - Otherwise only the changed fields are extracted (pool.extract with
+      `fields`) and merged into the indexed extraction, keeping its
+      mail_date / mail_time so the sheet upsert updates the drive's row.
+    Mails extracted at the same time are not compared with each other.
+    """
+
+    def __init__(self, index, extract, pool):
+        self.index = index
+        self._extract = extract
+        self.pool = pool
+
+    def extract(self, email):
+        """Same interface as ExtractionPool.extract; returns dict, Duplicate or None."""
+        features = mail_features(email)
+        if not features:
+            return self._extract(email)
+        signature = self.index.signature(features)
+        match = self.index.match(features, signature, exclude=email.get("id"))
+        if match is None:
+            self.index.count("new")
+            extracted = self._extract(email)
+            if extracted:
+                stored = to_offer_keys(extracted)
+                stored.setdefault("mail_date", email.get("received_date", ""))
+                stored.setdefault("mail_time", email.get("received_time", ""))
+                self.index.add(email, features, signature, stored)
+            return extracted
+
+        match_id, similarity = match
+        entry = self.index.entry(match_id)
+        if (email.get("internal_ts") or 0) < entry["internal_ts"]:
+            self.index.count("superseded")
+            incr("dedup.superseded")
+            return Duplicate(match_id, "superseded")
+        fields = changed_fields(features, entry["features"])
+        if not fields:
+            self.index.count("duplicates")
+            incr("dedup.duplicates")
+            return Duplicate(match_id, "duplicate")
+
+        partial = self.pool.extract(email, fields=fields)
+        if partial is None:
+            return None
+        # Both sides in OFFER_FIELDS keys, so a changed "10th%" replaces the stored value
+        partial = to_offer_keys(partial)
+        self.index.count("near")
+        incr("dedup.near")
+        incr("dedup.changed_fields", len(fields))
+        extracted = to_offer_keys(entry["extracted"])
+        changes = []
+        for field in fields:
+            value = partial.get(field)
+            if value in (None, "", []) or value == extracted.get(field):
+                continue
+            changes.append(f"{field}: {extracted.get(field)!r} -> {value!r}")
+            extracted[field] = value
+        logger.info("🔁 %s is a near-duplicate of %s (similarity %.2f): %s",
+                    email.get("id"), match_id, similarity, "; ".join(changes) or "no field changed")
+        self.index.add(email, features, signature, extracted)
+        return extracted
@@ -1,112 +1,226 @@
 import re
+import logging
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
 from config.config import COLLEGE_PLACEMENT_EMAIL
 
-def extract_placement_offer(text, sender=COLLEGE_PLACEMENT_EMAIL, subject=""):
-    result = {}
+logger = logging.getLogger(__name__)
 
-    text = text or ""
-    subject = subject or ""
+# Flags every field pattern is compiled with (patterns may add inline flags too)
+_FLAGS = re.IGNORECASE | re.MULTILINE | re.DOTALL
 
+# Ordered candidate patterns per field; the first one that matches wins.
+FIELD_PATTERNS = {
     # Company - Most tolerant pattern, fallback to subject, remove decorations
-    result['company'] = _extract_first([
+    'company': [
         r"(?i)name of the company[\s:]*([\w ()./&,-]+)",
         r"(?i)company[\s:]*([\w ()./&,-]+)",
         r"\*\s*([\w ()./&,-]+)\s*\*",  # Handles *Company Name*
         r"^([A-Z][\w ()./&,-]+)[:\-]", # Header at line start
-    ], text) or _extract_from_subject(subject)
-
+    ],
     # Category - Be flexible
-    result['category'] = _extract_first([
+    'category': [
         r"(?i)category[\s:]*([A-Z][^\n\r|]*)",
         r"(Dream Offer|Super Dream|Dream Internship|Regular Placement|Internship|Placement)"
-    ], text)
-
+    ],
     # Eligible branches - tolerant, multiline
-    result['branches'] = _extract_first([
+    'branches': [
         r"(?i)eligible (branches?|disciplines)[\s:]*([\s\S]*?)(?:[\n\r]{2,}|eligibility|criteria|category|$)",
         r"(?i)branches?[\s:]*([\w ,.|/&\-\n\r]+)"
-    ], text).replace('\n', ' ').strip().strip('*,:;|-')
-
-    # Eligibility block
-    crit_block = _extract_first([
+    ],
+    # Eligibility block (10th / 12th / cgpa are searched inside it)
+    'criteria': [
         r"Eligibility Criteria[\s:]*([\s\S]*?)(?:CTC|Stipend|Last date|Website|Contact|\n[A-Z][a-z]+|$)"
-    ], text)
-    result['10th'] = _extract_first([
+    ],
+    '10th': [
         r"(?:10th|X)[^\d]{0,10}(\d{1,3})\s*%?",
         r"%\s*in\s*X[\s\-–:]*([0-9]{1,3})%?"
-    ], crit_block)
-    result['12th'] = _extract_first([
+    ],
+    '12th': [
         r"(?:12th|XII)[^\d]{0,10}(\d{1,3})\s*%?",
         r"%\s*in\s*XII[\s\-–:]*([0-9]{1,3})%?"
-    ], crit_block)
-    result['cgpa'] = _extract_first([
+    ],
+    'cgpa': [
         r"(\d+\.\d+)\s*CGPA",
         r"CGPA[^\d]{0,8}(\d+\.\d+)",
         r"(\d{1,2}\.\d{1,2})"
-    ], crit_block)
-    result['no_arrears'] = bool(re.search(r"no\s+(standing\s+)?arrears?", crit_block or "", re.IGNORECASE))
-
+    ],
     # CTC (try both "CTC", "package", "LPA", variants)
-    result['ctc'] = _extract_first([
+    'ctc': [
         r"(?i)ctc[\s:\-]*([₹]?\d[\d,\. ]*(?:LPA|lpa)?|[₹]?\d[\d,\. ]+)",
         r"(?i)package[\s:\-]*([₹]?\d[\d,\. ]*LPA|[₹]?\d[\d,\. ]+)",
         r"(?i)annual[\s:\-]*([₹]?\d[\d,\. ]*LPA|[₹]?\d[\d,\. ]+)",
-    ], text)
-
+    ],
     # Stipend - Improve to handle /month, /per, etc
-    result['stipend'] = _extract_first([
+    'stipend': [
         r"(?i)stipend[\s:\-]*([₹]?\d[\d,\. ]*(?:/month|/per month|per month)?|[₹]?\d[\d,\. ]+)"
-    ], text)
-
+    ],
     # Last date - robust to space labels
-    result['last_date'] = _extract_first([
+    'last_date': [
         r"(?i)last date[^\w]{0,6}([^\n\r,\.]*)",
         r"(?i)deadline[^\w]{0,6}([^\n\r,\.]*)",
         r"(?i)to apply[^\w]{0,6}([^\n\r,\.]*)"
-    ], text)
-
-    # Registration links only for forms/actual applications
-    links = re.findall(r'https?://[^\s\]\)\<\>,"\'|\n]+', text)
-    reg_links = [l for l in links if any(x in l.lower() for x in ('forms.gle', 'form', 'neopat', 'apply', 'registration', 'career', 'register'))]
-    result['registration_links'] = reg_links
-    result['application_source'] = _extract_first([
+    ],
+    'application_source': [
         r"(Google Form|NeoPAT|career page|register|apply|application)",
-    ], text)
-
-    # Website (exclude google group/attachments)
-    site_links = [l for l in links if (l.lower().startswith("http") and
-                all(x not in l.lower() for x in ("group", "form", "registration", "neopat", "apply", "career", "register", "attachment")))]
-    result['website'] = site_links[0] if site_links else ""
-
-    # FINAL CLEANUP
-    for k, v in result.items():
-        if isinstance(v, str) and v:
-            result[k] = v.strip().strip('*,:-')
-        elif v is None:
-            result[k] = ""
-
-    def non_empty_fields(d): return [k for k, v in d.items() if v]
-    # Print for debug - REMOVE in production
-    print(f"Extracted: {result}")
-    # Minimum: company or at least 1 key field
-    if result['company'] or result['branches'] or result['category']:
-        return result
-    else:
-        print(f"FAILED: {result}")
-        return None
-
-def _extract_first(patterns, text):
-    if not text:
-        return ""
-    for pattern in patterns:
-        m = re.search(pattern, text, re.IGNORECASE | re.MULTILINE | re.DOTALL)
-        if m:
-            group = next((g for g in m.groups()[::-1] if g and g.strip()), None)
-            return group.strip() if group else ""
-    return ""
+    ],
+}
+
+# Fields matched inside the eligibility block rather than the whole mail
+_CRITERIA_FIELDS = ('10th', '12th', 'cgpa')
+
+_LINK_RE = re.compile(r'https?://[^\s\]\)\<\>,"\'|\n]+')
+_NO_ARREARS_RE = re.compile(r"no\s+(standing\s+)?arrears?", re.IGNORECASE)
+_SUBJECT_REPLY_RE = re.compile(r'Re[:\-]*\s*')
+# Registration links only for forms/actual applications
+_REGISTRATION_LINK_HINTS = ('forms.gle', 'form', 'neopat', 'apply', 'registration', 'career', 'register')
+# Website (exclude google group/attachments); every registration hint is excluded too
+_NON_WEBSITE_HINTS = ("group", "form", "registration", "neopat", "apply", "career", "register", "attachment")
+
+# Where a field value came from:
+#   start, end: character offsets of the matched group in the mail text (None if not from the text)
+#   pattern:    index into FIELD_PATTERNS[field] of the pattern that matched (None for fallbacks)
+#   source:     "text", "subject" (company fallback) or "links"
+FieldSpan = namedtuple("FieldSpan", ["start", "end", "pattern", "source"])
+
+
+class Extractor:
+    """
+    Deterministic regex extractor for placement offer mails.
+
+    All field patterns are compiled once per instance; use the module-level
+    default (get_extractor()) rather than building one per mail.
+    """
+
+    def __init__(self, field_patterns=FIELD_PATTERNS):
+        self.patterns = {
+            field: [re.compile(p, _FLAGS) for p in patterns]
+            for field, patterns in field_patterns.items()
+        }
+
+    def _first(self, field, text, offset=0):
+        """
+        Try the field's patterns in order; return (value, FieldSpan or None).
+        Like the original _extract_first, the last non-empty group of the first matching pattern is used.
+        """
+        if not text:
+            return "", None
+        for idx, pattern in enumerate(self.patterns[field]):
+            m = pattern.search(text)
+            if m:
+                group_idx = next(
+                    (i for i in range(len(m.groups()), 0, -1) if m.group(i) and m.group(i).strip()),
+                    None,
+                )
+                if group_idx is None:
+                    return "", None
+                start, end = m.span(group_idx)
+                return m.group(group_idx).strip(), FieldSpan(start + offset, end + offset, idx, "text")
+        return "", None
+
+    def extract_with_spans(self, text, sender=COLLEGE_PLACEMENT_EMAIL, subject=""):
+        """
+        Extract placement fields from a mail body.
+        Returns (result dict or None, {field: FieldSpan}) - result is None when
+        none of company / branches / category could be found.
+        """
+        result = {}
+        spans = {}
+        text = text or ""
+        subject = subject or ""
+
+        result['company'], spans['company'] = self._first('company', text)
+        if not result['company']:
+            result['company'] = _extract_from_subject(subject)
+            spans['company'] = FieldSpan(None, None, None, "subject") if result['company'] else None
+
+        result['category'], spans['category'] = self._first('category', text)
+
+        branches, spans['branches'] = self._first('branches', text)
+        result['branches'] = branches.replace('\n', ' ').strip().strip('*,:;|-')
+
+        crit_block, crit_span = self._first('criteria', text)
+        crit_offset = crit_span.start if crit_span else 0
+        for field in _CRITERIA_FIELDS:
+            result[field], spans[field] = self._first(field, crit_block, crit_offset)
+        result['no_arrears'] = bool(_NO_ARREARS_RE.search(crit_block or ""))
+
+        for field in ('ctc', 'stipend', 'last_date'):
+            result[field], spans[field] = self._first(field, text)
+
+        reg_links, site_links = [], []
+        for link in _LINK_RE.findall(text):
+            low = link.lower()
+            if any(x in low for x in _REGISTRATION_LINK_HINTS):
+                reg_links.append(link)
+            elif low.startswith("http") and all(x not in low for x in _NON_WEBSITE_HINTS):
+                site_links.append(link)
+        result['registration_links'] = reg_links
+        spans['registration_links'] = FieldSpan(None, None, None, "links") if reg_links else None
+        result['application_source'], spans['application_source'] = self._first('application_source', text)
+        result['website'] = site_links[0] if site_links else ""
+
+        # FINAL CLEANUP
+        for k, v in result.items():
+            if isinstance(v, str) and v:
+                result[k] = v.strip().strip('*,:-')
+            elif v is None:
+                result[k] = ""
+
+        logger.debug("Extracted: %s", result)
+        # Minimum: company or at least 1 key field
+        if result['company'] or result['branches'] or result['category']:
+            return result, spans
+        logger.debug("FAILED: %s", result)
+        return None, spans
+
+    def extract(self, text, sender=COLLEGE_PLACEMENT_EMAIL, subject=""):
+        """Same as extract_with_spans() but returns only the result dict (or None)."""
+        return self.extract_with_spans(text, sender, subject)[0]
+
+    def extract_email(self, email):
+        """Extract from an email dict with 'body', 'subject' and 'from'."""
+        return self.extract(email.get("body"), email.get("from") or COLLEGE_PLACEMENT_EMAIL,
+                            email.get("subject"))
+
+    def extract_many(self, emails, processes=None, chunksize=64, min_pool_size=500):
+        """
+        Extract a batch of email dicts; returns results in input order.
+
+        Batches of at least `min_pool_size` mails are fanned out over a process
+        pool (`processes` workers, default: CPU count); smaller batches, or
+        processes=1, run in this process since pool start-up would dominate.
+        """
+        emails = list(emails)
+        if processes == 1 or len(emails) < min_pool_size:
+            return [self.extract_email(email) for email in emails]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(_extract_email_worker, emails, chunksize=chunksize))
+
+
+_default_extractor = None
+
+
+def get_extractor():
+    """Shared Extractor instance (patterns compiled once per process)."""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = Extractor()
+    return _default_extractor
+
+
+def _extract_email_worker(email):
+    # Runs in pool workers: each worker process compiles its own default Extractor once
+    return get_extractor().extract_email(email)
+
+
+def extract_placement_offer(text, sender=COLLEGE_PLACEMENT_EMAIL, subject=""):
+    return get_extractor().extract(text, sender, subject)
+
 
 def _extract_from_subject(subject):
     # Returns company name up to "-" or ":" or end
     if subject:
-        return re.sub(r'Re[:\-]*\s*', '', subject).split("-")[0].split(":")[0].strip()
-    return ""
\ No newline at end of file
+        return _SUBJECT_REPLY_RE.sub('', subject).split("-")[0].split(":")[0].strip()
+    return ""
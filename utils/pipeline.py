@@ -0,0 +1,148 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import PIPELINE_QUEUE_SIZE
+from utils.metrics import observe
+
+_DONE = object()  # end-of-stream marker passed down the queues
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    - fn: callable(item) -> result. None drops the item; with `flatten` the
+      result is an iterable whose elements are passed on one by one.
+    - concurrency: how many items this stage works on at once.
+    - blocking: run fn in a thread pool (Gmail/Sheets/Ollama calls); cheap
+      CPU-only steps (filtering, building rows) set False and run on the loop.
+    Output order always matches input order.
+    """
+
+    def __init__(self, name, fn, concurrency=1, blocking=True, flatten=False):
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(1, concurrency)
+        self.blocking = blocking
+        self.flatten = flatten
+        self.items_in = 0
+        self.items_out = 0
+        self.latencies = []  # seconds spent in fn, per item
+
+    def _call(self, item):
+        start = time.perf_counter()
+        try:
+            return self.fn(item)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latencies.append(elapsed)
+            observe(f"stage.{self.name}", elapsed)
+
+    @property
+    def busy(self):
+        """Seconds spent in fn, summed over workers."""
+        return sum(self.latencies)
+
+    def summary(self):
+        return f"{self.name}: {self.items_in} in / {self.items_out} out, {self.busy:.2f}s busy"
+
+
+class Pipeline:
+    """
+    asyncio staged pipeline: source -> stage 1 -> ... -> stage n.
+
+    Stages are connected by queues of at most `queue_size` items, and each
+    stage holds at most `concurrency` items in flight, so a slow stage (e.g.
+    the LLM) fills the queue in front of it and the stages before it stop
+    pulling work instead of filling memory (backpressure).
+
+    The source is a plain (blocking) iterator, read in a worker thread; the
+    stages' blocking functions run in a thread pool per stage.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.elapsed = 0.0
+
+    async def _read_source(self, source, outbox, executor):
+        loop = asyncio.get_running_loop()
+        iterator = iter(source)
+        while True:
+            item = await loop.run_in_executor(executor, next, iterator, _DONE)
+            await outbox.put(item)
+            if item is _DONE:
+                return
+
+    async def _run_stage(self, stage, inbox, outbox, executor):
+        loop = asyncio.get_running_loop()
+        # Items being worked on, in input order; its size bounds the stage's concurrency
+        in_flight = asyncio.Queue(maxsize=stage.concurrency)
+
+        async def dispatch():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    await in_flight.put(_DONE)
+                    return
+                stage.items_in += 1
+                if stage.blocking:
+                    future = loop.run_in_executor(executor, stage._call, item)
+                else:
+                    future = loop.create_future()
+                    future.set_result(stage._call(item))
+                await in_flight.put(future)
+
+        async def collect():
+            while True:
+                future = await in_flight.get()
+                if future is _DONE:
+                    await outbox.put(_DONE)
+                    return
+                result = await future
+                if result is None:
+                    continue
+                for output in (result if stage.flatten else (result,)):
+                    stage.items_out += 1
+                    await outbox.put(output)
+
+        await asyncio.gather(dispatch(), collect())
+
+    async def _drain(self, inbox):
+        while await inbox.get() is not _DONE:
+            pass
+
+    async def run_async(self, source):
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-source")]
+        executors += [
+            ThreadPoolExecutor(max_workers=stage.concurrency, thread_name_prefix=f"pipeline-{stage.name}")
+            for stage in self.stages
+        ]
+        tasks = [asyncio.ensure_future(self._read_source(source, queues[0], executors[0]))]
+        for i, stage in enumerate(self.stages):
+            tasks.append(asyncio.ensure_future(
+                self._run_stage(stage, queues[i], queues[i + 1], executors[i + 1])
+            ))
+        tasks.append(asyncio.ensure_future(self._drain(queues[-1])))
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            self.elapsed += time.perf_counter() - start
+            for executor in executors:
+                executor.shutdown(wait=True)
+
+    def run(self, source):
+        """Run the pipeline over `source` until it is exhausted (blocking)."""
+        asyncio.run(self.run_async(source))
+
+    def summary(self):
+        stages = "; ".join(stage.summary() for stage in self.stages)
+        return f"{self.elapsed:.2f}s total; {stages}"
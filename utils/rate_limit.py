@@ -0,0 +1,144 @@
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from config.config import (
+    GMAIL_QUOTA_UNITS_PER_SECOND,
+    GMAIL_MAX_CONCURRENCY,
+    SHEETS_REQUESTS_PER_MINUTE,
+    SHEETS_MAX_CONCURRENCY,
+    RATE_LIMIT_MAX_THROTTLES,
+)
+from utils.google_clients import http_error_status, is_rate_limited, retry_after_seconds
+from utils.metrics import incr, observe
+
+# Transient server errors that are treated like throttling (back off and retry)
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+
+def is_throttled(error):
+    """True if `error` means "slow down and retry": quota errors and transient 5xx."""
+    return is_rate_limited(error) or http_error_status(error) in TRANSIENT_STATUSES
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, bursts of up to `capacity` (default: one
+    second's worth). A reservation larger than the balance puts the bucket in
+    debt, so a 100-message batch costs its full quota even if it exceeds the burst.
+    rate None or 0 means unlimited.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate or 0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost=1):
+        """Take `cost` tokens; returns the seconds to wait before using them."""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= cost
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class AdaptiveLimiter:
+    """
+    Shared scheduler for one API: a token bucket for the quota plus an AIMD
+    concurrency limit, used by every thread that calls the API.
+
+    - slot(cost): hold one of `limit` concurrent slots and `cost` quota tokens
+    - success(): after `limit` successes in a row, limit += 1 (additive increase)
+    - throttled(retry_after): limit halves (multiplicative decrease); with a
+      Retry-After, no new request starts anywhere before it has passed
+    """
+
+    def __init__(self, name, rate, max_concurrency, min_concurrency=1):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._cond = threading.Condition()
+
+    def configure(self, rate=None, max_concurrency=None):
+        """Change the quota rate (None = unlimited) and/or the concurrency ceiling."""
+        with self._cond:
+            self.bucket = TokenBucket(rate)
+            if max_concurrency is not None:
+                self.max_concurrency = self.limit = max_concurrency
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, cost=1):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            delay = max(self.bucket.reserve(cost), self._resume_at - time.monotonic())
+            if delay > 0:
+                observe(f"ratelimit.{self.name}.wait", delay)
+                time.sleep(delay)
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def success(self):
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def throttled(self, retry_after=None):
+        with self._cond:
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            self._successes = 0
+            if retry_after:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        incr(f"ratelimit.{self.name}.throttled")
+
+    def run(self, fn, cost=1, max_throttles=RATE_LIMIT_MAX_THROTTLES, base_delay=1.0, max_delay=64.0):
+        """
+        Call fn() in a slot. Throttled calls (see is_throttled()) are fed back to
+        the limiter and retried after their Retry-After, or exponential backoff
+        with full jitter, up to `max_throttles` times; other errors are raised.
+        """
+        for attempt in range(max_throttles + 1):
+            try:
+                with self.slot(cost):
+                    result = fn()
+            except Exception as e:
+                if attempt == max_throttles or not is_throttled(e):
+                    raise
+                retry_after = retry_after_seconds(e)
+                self.throttled(retry_after)
+                delay = retry_after if retry_after is not None else \
+                    random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                print(f"{self.name} request throttled ({http_error_status(e)}); retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            self.success()
+            return result
+
+    def summary(self):
+        return f"{self.name}: concurrency {self.limit}/{self.max_concurrency}, {self.in_flight} in flight"
+
+
+# Process-wide limiters shared by email_utils and sheets_utils
+gmail_limiter = AdaptiveLimiter("gmail", GMAIL_QUOTA_UNITS_PER_SECOND, GMAIL_MAX_CONCURRENCY)
+sheets_limiter = AdaptiveLimiter("sheets", SHEETS_REQUESTS_PER_MINUTE / 60, SHEETS_MAX_CONCURRENCY)
@@ -1,9 +1,19 @@
-import os
-import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from config.config import SHEET_ID, SHEET_NAME_PLACEMENTS, SHEET_NAME_GBY
+import re
+import csv
+import time
+import random
+from config.config import (
+    SHEET_ID,
+    SHEET_NAME_PLACEMENTS,
+    SHEET_NAME_GBY,
+    SHEET_FLUSH_ROWS,
+    SHEET_FLUSH_SECONDS,
+    SHEET_MAX_RETRIES,
+    SHEET_UPSERT,
+)
+from utils.google_clients import get_service, retry_after_seconds
+from utils.rate_limit import sheets_limiter, is_throttled
+from utils.metrics import incr, timer
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
@@ -11,23 +21,13 @@ SHEETS_CREDENTIALS_PATH = 'sheets_credentials.json'
 SHEETS_TOKEN_PATH = 'sheets_token.pickle'
 
 
+# Columns of the "Campus Placements" tab (see build_campus_placement_row)
+COL_SR_NO, COL_COMPANY, COL_CATEGORY, COL_STATUS, COL_MAIL_DATE = 0, 1, 2, 11, 13
+
+
 def get_sheets_service():
-    creds = None
-    if os.path.exists(SHEETS_TOKEN_PATH):
-        with open(SHEETS_TOKEN_PATH, 'rb') as token:
-            creds = pickle.load(token)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(
-                SHEETS_CREDENTIALS_PATH, SCOPES
-            )
-            creds = flow.run_local_server(port=0)
-        with open(SHEETS_TOKEN_PATH, 'wb') as token:
-            pickle.dump(creds, token)
-    service = build('sheets', 'v4', credentials=creds)
-    return service
+    """Authenticate and return Sheets service object (cached, see utils/google_clients.py)."""
+    return get_service('sheets', 'v4', SHEETS_TOKEN_PATH, SHEETS_CREDENTIALS_PATH, SCOPES)
 
 
 def build_campus_placement_row(parsed, sr_no: str = "", status: str = ""):
@@ -149,21 +149,405 @@ def build_campus_placement_row(parsed, sr_no: str = "", status: str = ""):
     ]
 
 
-def append_to_sheet(rows, sheet_name=SHEET_NAME_PLACEMENTS, sheet_id=SHEET_ID):
+def _is_retryable(error):
+    if is_throttled(error):
+        return True
+    # Connection resets, timeouts, etc.
+    return isinstance(error, OSError)
+
+
+def execute_with_retry(request, max_retries=SHEET_MAX_RETRIES, base_delay=1.0, max_delay=64.0,
+                       stats=None):
+    """
+    Execute a Google API request through the shared Sheets rate limiter,
+    retrying quota (429) and transient (5xx / network) errors: after the
+    Retry-After if the response has one, otherwise with exponential backoff
+    and full jitter. Throttled responses also lower the limiter's concurrency.
+    If a `stats` dict is given, stats["calls"] counts every attempt.
+    """
+    for attempt in range(max_retries + 1):
+        if stats is not None:
+            stats["calls"] = stats.get("calls", 0) + 1
+        incr("sheets.api_calls")
+        try:
+            with sheets_limiter.slot(), timer("sheets.request"):
+                response = request.execute()
+        except Exception as e:
+            incr("sheets.errors")
+            if attempt == max_retries or not _is_retryable(e):
+                raise
+            retry_after = retry_after_seconds(e)
+            if is_throttled(e):
+                sheets_limiter.throttled(retry_after)
+            delay = retry_after if retry_after is not None else \
+                random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            print(f"Sheets request failed ({e}); retrying in {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        sheets_limiter.success()
+        return response
+
+
+_COMPANY_SUFFIX_RE = re.compile(
+    r"\b(pvt|private|ltd|limited|llp|inc|corp|corporation|co|technologies|technology)\b"
+)
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def _normalize_date(value):
+    """'10-12-2025', '10/12/2025' and '2025-12-10' all become '10-12-2025'."""
+    parts = re.findall(r"\d+", str(value))
+    if len(parts) == 3 and len(parts[0]) == 4:
+        parts = parts[::-1]
+    return "-".join(p.zfill(2) for p in parts)
+
+
+def row_key(row):
+    """
+    Identity of a placement row: normalized company + category + mail date.
+    Returns None if the row has no company (such rows are always appended).
+    """
+    def cell(i):
+        return str(row[i]) if len(row) > i and row[i] is not None else ""
+
+    company = _NON_WORD_RE.sub(" ", cell(COL_COMPANY).lower())
+    company = " ".join(_COMPANY_SUFFIX_RE.sub(" ", company).split()) or " ".join(company.split())
+    if not company:
+        return None
+    category = " ".join(_NON_WORD_RE.sub(" ", cell(COL_CATEGORY).lower()).split())
+    return (company, category, _normalize_date(cell(COL_MAIL_DATE)))
+
+
+def _a1_column(index):
+    return chr(ord("A") + index)
+
+
+def _newer(stamp, than):
+    """True if `stamp` (mail internal_ts, or None if unknown) is strictly newer than `than`."""
+    return stamp is not None and (than is None or stamp > than)
+
+
+class SheetKeyIndex:
+    """
+    In-memory index of the rows already in a sheet tab, used to upsert rows.
+
+    - load() reads only the key columns (Sr.No, Company, Category, Mail Date)
+      with a single batchGet, once per run.
+    - upsert(rows) overwrites rows whose key is already in the sheet with one
+      batchUpdate (Sr.No and Application Status are left as they are, so manual
+      edits survive) and appends the new rows with one append call.
+    - Sr.No: new rows continue from the highest Sr.No in the sheet; rows with a
+      blank Sr.No are numbered (in sheet order) by the first upsert.
+    - Rows for the same key keep the newest mail's values: rows arrive newest
+      first, so a later row only replaces an earlier one (in the same upsert or
+      written earlier in this run) if its stamp is strictly newer.
+
+    API calls per upsert are constant: at most one batchUpdate and one append.
+    """
+
+    def __init__(self, service, sheet_name=SHEET_NAME_PLACEMENTS, sheet_id=SHEET_ID, stats=None):
+        self.service = service
+        self.sheet_name = sheet_name
+        self.sheet_id = sheet_id
+        self.stats = stats if stats is not None else {"calls": 0}
+        self.loaded = False
+        self.rows = {}         # key -> sheet row number (1-based)
+        self.next_sr = 1
+        self._blank_sr = []    # sheet row numbers of existing rows without Sr.No
+        self._stamps = {}      # key -> stamp of the row written for it by this process
+
+    def _range(self, a1):
+        return f"{self.sheet_name}!{a1}"
+
+    def load(self):
+        """Read the key columns (one batchGet) and build the index."""
+        sr_col, mail_col = _a1_column(COL_SR_NO), _a1_column(COL_MAIL_DATE)
+        request = self.service.spreadsheets().values().batchGet(
+            spreadsheetId=self.sheet_id,
+            ranges=[
+                self._range(f"{sr_col}2:{_a1_column(COL_CATEGORY)}"),
+                self._range(f"{mail_col}2:{mail_col}"),
+            ],
+        )
+        response = execute_with_retry(request, stats=self.stats)
+        key_values, date_values = (
+            [vr.get("values", []) for vr in response.get("valueRanges", [])] + [[], []]
+        )[:2]
+
+        self.rows, self._blank_sr = {}, []
+        max_sr = 0
+        for i, cells in enumerate(key_values):
+            row_number = i + 2  # row 1 is the header
+            row = [""] * (COL_MAIL_DATE + 1)
+            row[:len(cells)] = cells
+            if i < len(date_values) and date_values[i]:
+                row[COL_MAIL_DATE] = date_values[i][0]
+
+            sr = str(row[COL_SR_NO]).strip()
+            if sr.isdigit():
+                max_sr = max(max_sr, int(sr))
+            elif any(str(c).strip() for c in row):
+                self._blank_sr.append(row_number)
+
+            key = row_key(row)
+            if key is not None:
+                self.rows.setdefault(key, row_number)
+
+        self.next_sr = max_sr + 1
+        self.loaded = True
+        print(f"📇 Indexed {len(self.rows)} existing sheet rows "
+              f"({len(self._blank_sr)} without Sr.No).")
+
+    def upsert(self, rows, stamps=None):
+        """
+        Write rows: update the ones already in the sheet, append the rest.
+
+        - stamps: optional list parallel to `rows` (mail internal_ts, None if unknown)
+        - Rows sharing a key collapse into one: the first seen, unless a later one
+          has a newer stamp; rows older than the one already written for their key
+          are skipped.
+
+        Returns (updated, appended) row counts.
+        """
+        if not self.loaded:
+            self.load()
+
+        # Collapse duplicates, keeping first-seen order
+        merged = {}
+        for i, (row, stamp) in enumerate(zip(rows, stamps or [None] * len(rows))):
+            key = row_key(row)
+            if key is None:
+                merged[("", "", i)] = (key, row, stamp)
+            elif key in self._stamps and not _newer(stamp, self._stamps[key]):
+                continue
+            elif key not in merged or _newer(stamp, merged[key][2]):
+                merged[key] = (key, row, stamp)
+
+        next_sr = self.next_sr
+        data = []
+        for row_number in self._blank_sr:
+            data.append({"range": self._range(f"A{row_number}"), "values": [[str(next_sr)]]})
+            next_sr += 1
+        blank_sr_end = next_sr
+
+        updated, new_rows, new_keys = 0, [], []
+        for key, row, _ in merged.values():
+            row = list(row)
+            if key is not None and key in self.rows:
+                n = self.rows[key]
+                # Everything except Sr.No and Application Status
+                data.append({"range": self._range(f"B{n}:{_a1_column(COL_STATUS - 1)}{n}"),
+                             "values": [row[COL_COMPANY:COL_STATUS]]})
+                data.append({"range": self._range(f"{_a1_column(COL_STATUS + 1)}{n}:"
+                                                  f"{_a1_column(len(row) - 1)}{n}"),
+                             "values": [row[COL_STATUS + 1:]]})
+                updated += 1
+            else:
+                row[COL_SR_NO] = str(next_sr)
+                next_sr += 1
+                new_rows.append(row)
+                new_keys.append(key)
+
+        if data:
+            request = self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.sheet_id,
+                body={"valueInputOption": "USER_ENTERED", "data": data},
+            )
+            execute_with_retry(request, stats=self.stats)
+            # Stored right away: if the append below fails, its retry must not reuse these numbers
+            self._blank_sr = []
+            self.next_sr = blank_sr_end
+
+        if new_rows:
+            request = self.service.spreadsheets().values().append(
+                spreadsheetId=self.sheet_id,
+                range=self._range("A1"),
+                valueInputOption="USER_ENTERED",
+                insertDataOption="INSERT_ROWS",
+                body={"values": new_rows},
+            )
+            response = execute_with_retry(request, stats=self.stats)
+            # e.g. "'Campus Placements'!A120:O125" -> new rows start at 120
+            updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+            m = re.search(r"!\$?[A-Z]+\$?(\d+)", updated_range)
+            if m:
+                first = int(m.group(1))
+                for offset, key in enumerate(new_keys):
+                    if key is not None:
+                        self.rows[key] = first + offset
+            self.next_sr = next_sr
+
+        self._stamps.update((key, stamp) for key, _, stamp in merged.values() if key is not None)
+        return updated, len(new_rows)
+
+
+class SheetWriter:
+    """
+    Buffers rows and appends them to a sheet tab in chunks during the run.
+
+    - A chunk is flushed once `chunk_size` rows are buffered or `flush_interval`
+      seconds have passed since the last flush (checked when a row is added),
+      and on close().
+    - With `upsert` (default SHEET_UPSERT), rows go through a SheetKeyIndex:
+      rows already in the sheet are updated in place and only new rows are
+      appended; otherwise every row is appended.
+    - Each request is retried with backoff (execute_with_retry); if it still
+      fails the rows stay buffered and are retried on the next flush.
+    - One authorized Sheets service is reused for every call.
+    - `on_flush(keys)` is called with the keys of the rows that were written,
+      in the order they were added.
+    - add(row, ts=...) stamps a row with its mail's internal_ts, so that with
+      upsert an older mail's row never replaces a newer one's.
+    """
+
+    def __init__(self, sheet_name=SHEET_NAME_PLACEMENTS, sheet_id=SHEET_ID, service=None,
+                 chunk_size=SHEET_FLUSH_ROWS, flush_interval=SHEET_FLUSH_SECONDS, on_flush=None,
+                 upsert=SHEET_UPSERT):
+        self.sheet_name = sheet_name
+        self.sheet_id = sheet_id
+        self._service = service
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.upsert = upsert
+        self._index = None
+        self._rows = []
+        self._keys = []
+        self._stamps = []
+        self._last_flush = time.monotonic()
+        self.rows_added = 0
+        self.rows_written = 0
+        self.rows_updated = 0
+        self.stats = {"calls": 0}
+        self.write_seconds = 0.0
+
+    @property
+    def service(self):
+        if self._service is None:
+            self._service = get_sheets_service()
+        return self._service
+
+    def add(self, row, key=None, ts=None):
+        """Buffer one row (key is passed back through on_flush); may trigger a flush."""
+        self._rows.append(row)
+        self._keys.append(key)
+        self._stamps.append(ts)
+        self.rows_added += 1
+        if (len(self._rows) >= self.chunk_size
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write all buffered rows. Returns True if the buffer is now empty."""
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return True
+        start = time.perf_counter()
+        try:
+            if self.upsert:
+                if self._index is None:
+                    self._index = SheetKeyIndex(self.service, self.sheet_name, self.sheet_id,
+                                                stats=self.stats)
+                updated, _ = self._index.upsert(self._rows, self._stamps)
+                self.rows_updated += updated
+                incr("sheets.rows_updated", updated)
+            else:
+                request = self.service.spreadsheets().values().append(
+                    spreadsheetId=self.sheet_id,
+                    range=f"{self.sheet_name}!A1",
+                    valueInputOption="USER_ENTERED",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": self._rows},
+                )
+                execute_with_retry(request, stats=self.stats)
+        except Exception as e:
+            print(f"❌ Failed to write {len(self._rows)} rows to Google Sheet, will retry: {e}")
+            return False
+        finally:
+            self.write_seconds += time.perf_counter() - start
+
+        written_keys = self._keys
+        self.rows_written += len(self._rows)
+        incr("sheets.rows_written", len(self._rows))
+        print(f"✅ {len(self._rows)} rows written to Google Sheet ({self.rows_written} so far).")
+        self._rows, self._keys, self._stamps = [], [], []
+        if self.on_flush is not None:
+            self.on_flush([k for k in written_keys if k is not None])
+        return True
+
+    def close(self):
+        """Flush what is left. Returns True if every row was written."""
+        return self.flush()
+
+    def summary(self):
+        rate = self.rows_written / self.write_seconds if self.write_seconds else 0.0
+        return (f"{self.rows_written}/{self.rows_added} rows written ({self.rows_updated} updated "
+                f"in place) in {self.stats['calls']} API calls "
+                f"({rate:.1f} rows/s of API time)")
+
+
+class CsvRowWriter:
+    """
+    Local stand-in for SheetWriter (same add / flush / close / summary interface)
+    used by --offline runs: rows go to a CSV file instead of the sheet, so a
+    replay uses no Sheets quota. The file is rewritten by each run, with
+    `header` as its first line and rows numbered from 1.
+    """
+
+    def __init__(self, path, header=None):
+        self.path = path
+        self.header = header
+        self.on_flush = None
+        self._rows = []
+        self._opened = False
+        self.rows_added = 0
+        self.rows_written = 0
+
+    def add(self, row, key=None, ts=None):
+        """Buffer one row (key and ts are accepted for SheetWriter compatibility)."""
+        self._rows.append(row)
+        self.rows_added += 1
+
+    def flush(self):
+        """Write all buffered rows. Returns True if the buffer is now empty."""
+        if not self._rows and self._opened:
+            return True
+        rows = [list(row) for row in self._rows]
+        for sr, row in enumerate(rows, start=self.rows_written + 1):
+            row[COL_SR_NO] = row[COL_SR_NO] or str(sr)
+        try:
+            with open(self.path, "a" if self._opened else "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if not self._opened and self.header:
+                    writer.writerow(self.header)
+                writer.writerows(rows)
+        except OSError as e:
+            print(f"❌ Failed to write {len(rows)} rows to {self.path}, will retry: {e}")
+            return False
+        self._opened = True
+        self.rows_written += len(rows)
+        self._rows = []
+        return True
+
+    def close(self):
+        """Flush what is left. Returns True if every row was written."""
+        return self.flush()
+
+    def summary(self):
+        return f"{self.rows_written}/{self.rows_added} rows written to {self.path} (offline, no Sheets API calls)"
+
+
+def append_to_sheet(rows, sheet_name=SHEET_NAME_PLACEMENTS, sheet_id=SHEET_ID, upsert=SHEET_UPSERT):
     """
     Appends a list of lists (rows) to the selected Google Sheet tab.
+    With upsert, rows already in the sheet are updated instead of duplicated.
     """
-    service = get_sheets_service()
-    sheet = service.spreadsheets()
     if not rows:
         print("No data to write.")
         return
-    request = sheet.values().append(
-        spreadsheetId=sheet_id,
-        range=f"{sheet_name}!A1",
-        valueInputOption="USER_ENTERED",
-        insertDataOption="INSERT_ROWS",
-        body={"values": rows},
-    )
-    response = request.execute()
-    print("✅ Data written to Google Sheet:", response)
\ No newline at end of file
+    writer = SheetWriter(sheet_name=sheet_name, sheet_id=sheet_id, upsert=upsert)
+    for row in rows:
+        writer.add(row)
+    if not writer.close():
+        raise RuntimeError("Could not write rows to Google Sheet")
+    print("✅ Data written to Google Sheet:", writer.summary())
@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from config.config import RUN_STATE_DB_PATH, STATE_COMMIT_BATCH, STATE_COMMIT_INTERVAL
+
+# Per-message outcomes (the decision ledger)
+REJECTED = "rejected"                    # not a first-round placement mail (never re-evaluated)
+ACCEPTED = "accepted"                    # passed the filter, extraction pending
+EXTRACTED = "extracted"                  # row built, not yet confirmed in the sheet
+WRITTEN = "written"                      # row appended to the sheet
+EXTRACTION_FAILED = "extraction_failed"  # LLM/regex gave nothing; retried by later runs (failed_extractions())
+DUPLICATE = "duplicate"                  # resend of a drive already extracted (utils/near_dup.py)
+FETCH_FAILED = "fetch_failed"            # Gmail download given up on (retries/throttling); fetched again next run
+UNAVAILABLE = "unavailable"              # Gmail refused the message for good (e.g. deleted)
+
+# Outcomes that mean "do not process this message again"
+PROCESSED_OUTCOMES = (REJECTED, EXTRACTED, WRITTEN, DUPLICATE, UNAVAILABLE)
+
+
+class RunStateStore:
+    """
+    Crash-safe run state (SQLite in WAL mode) replacing run_state.json.
+
+    - Each message's outcome is recorded as soon as it is known; records are
+      committed in small batches (every STATE_COMMIT_BATCH records or
+      STATE_COMMIT_INTERVAL seconds), so a crash loses at most one batch.
+    - Extracted rows are stored with their outcome, so rows extracted by a run
+      that crashed before writing to the sheet are written by the next run
+      instead of being extracted again.
+    - Nothing is loaded up front: `msg_id in store` is an indexed lookup.
+    - Failed extractions are counted per message (attempts), so they can be
+      retried a bounded number of times.
+    - meta values (last_ts, history_id) are stored alongside.
+    - Sharded backfills (utils/backfill.py) checkpoint their date windows in
+      the backfill_windows table.
+    """
+
+    def __init__(self, path=RUN_STATE_DB_PATH, commit_batch=STATE_COMMIT_BATCH,
+                 commit_interval=STATE_COMMIT_INTERVAL):
+        self.path = path
+        self.commit_batch = commit_batch
+        self.commit_interval = commit_interval
+        self._lock = threading.RLock()
+        self._pending = {}  # msg_id -> (outcome, internal_ts, row_json, updated_at)
+        self._last_commit = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id TEXT PRIMARY KEY,"
+            " outcome TEXT NOT NULL,"
+            " internal_ts INTEGER,"
+            " row TEXT,"
+            " updated_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        if "attempts" not in columns:
+            # Ledgers written before failed extractions were counted
+            self._conn.execute("ALTER TABLE messages ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_outcome ON messages(outcome)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS backfill_windows ("
+            " start_ts INTEGER NOT NULL,"
+            " end_ts INTEGER NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " mails INTEGER,"
+            " max_ts INTEGER,"
+            " seconds REAL,"
+            " PRIMARY KEY (start_ts, end_ts))"
+        )
+        self._conn.commit()
+
+    # --- meta ---------------------------------------------------------------
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        """Set a meta value; committed together with any pending message records."""
+        with self._lock:
+            self.flush()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+            )
+            self._conn.commit()
+
+    # --- messages -----------------------------------------------------------
+
+    def record(self, msg_id, outcome, internal_ts=None, row=None):
+        """Record a message outcome (and its sheet row, if any); commits in batches."""
+        with self._lock:
+            self._pending[msg_id] = (
+                outcome, internal_ts, json.dumps(row) if row is not None else None, time.time()
+            )
+            if (len(self._pending) >= self.commit_batch
+                    or time.monotonic() - self._last_commit >= self.commit_interval):
+                self.flush()
+
+    def flush(self):
+        """Commit all pending records in one transaction."""
+        with self._lock:
+            if self._pending:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO messages (id, outcome, internal_ts, row, updated_at, attempts)"
+                        " VALUES (?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(id) DO UPDATE SET outcome = excluded.outcome,"
+                        " internal_ts = COALESCE(excluded.internal_ts, messages.internal_ts),"
+                        " row = COALESCE(excluded.row, messages.row),"
+                        " updated_at = excluded.updated_at,"
+                        " attempts = messages.attempts + excluded.attempts",
+                        [(msg_id, *values, int(values[0] == EXTRACTION_FAILED))
+                         for msg_id, values in self._pending.items()],
+                    )
+                self._pending.clear()
+            self._last_commit = time.monotonic()
+
+    def outcome(self, msg_id):
+        """Return the recorded outcome for a message, or None."""
+        with self._lock:
+            if msg_id in self._pending:
+                return self._pending[msg_id][0]
+            row = self._conn.execute(
+                "SELECT outcome FROM messages WHERE id = ?", (msg_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, msg_id):
+        """True if the message was already decided (rejected, extracted or written)."""
+        return self.outcome(msg_id) in PROCESSED_OUTCOMES
+
+    def is_empty(self):
+        """True if no message has ever been recorded (first run)."""
+        with self._lock:
+            if self._pending:
+                return False
+            return self._conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is None
+
+    def pending_rows(self):
+        """Return [(msg_id, row, internal_ts)] for extracted rows not yet written to the sheet, in mail order."""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT id, row, internal_ts FROM messages WHERE outcome = ? AND row IS NOT NULL"
+                " ORDER BY internal_ts DESC, id",
+                (EXTRACTED,),
+            ).fetchall()
+        return [(msg_id, json.loads(row), internal_ts) for msg_id, row, internal_ts in rows]
+
+    def failed_extractions(self, max_attempts):
+        """Return ids of messages whose extraction failed fewer than `max_attempts` times, newest first."""
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT id FROM messages WHERE outcome = ? AND attempts < ?"
+                " ORDER BY internal_ts DESC, id",
+                (EXTRACTION_FAILED, max_attempts),
+            ).fetchall()
+        return [msg_id for msg_id, in rows]
+
+    def mark_written(self, msg_ids):
+        """Mark messages whose rows are now in the sheet; committed immediately."""
+        with self._lock:
+            for msg_id in msg_ids:
+                self.record(msg_id, WRITTEN)
+            self.flush()
+
+    # --- backfill windows ---------------------------------------------------
+
+    def plan_backfill(self, windows):
+        """Register backfill windows [(start_ts, end_ts)] (epoch seconds); known ones are kept."""
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO backfill_windows (start_ts, end_ts) VALUES (?, ?)",
+                    list(windows),
+                )
+
+    def backfill_windows(self, pending_only=False):
+        """Return [(start_ts, end_ts, done, mails, max_ts, seconds)], newest window first."""
+        query = "SELECT start_ts, end_ts, done, mails, max_ts, seconds FROM backfill_windows"
+        if pending_only:
+            query += " WHERE done = 0"
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY end_ts DESC").fetchall()
+
+    def complete_window(self, start_ts, end_ts, mails, max_ts, seconds):
+        """Mark a backfill window as done; committed together with any pending message records."""
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE backfill_windows SET done = 1, mails = ?, max_ts = ?, seconds = ?"
+                    " WHERE start_ts = ? AND end_ts = ?",
+                    (mails, max_ts, seconds, start_ts, end_ts),
+                )
+
+    def backfill_in_progress(self):
+        """True if a sharded backfill was planned and has unfinished windows."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM backfill_windows WHERE done = 0 LIMIT 1"
+            ).fetchone() is not None
+
+    # --- migration ----------------------------------------------------------
+
+    def migrate_json(self, json_path):
+        """
+        One-shot import of a legacy run_state.json (processed_ids, last_ts, history_id).
+        Imported ids are marked as written; the JSON file is renamed to *.migrated.
+        Returns the number of imported ids (0 if there was nothing to migrate).
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        ids = data.get("processed_ids", [])
+        now = time.time()
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO messages (id, outcome, internal_ts, row, updated_at)"
+                    " VALUES (?, ?, NULL, NULL, ?)",
+                    [(msg_id, WRITTEN, now) for msg_id in ids],
+                )
+                for key in ("last_ts", "history_id"):
+                    if data.get(key) is not None:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                            (key, json.dumps(data[key])),
+                        )
+        os.replace(json_path, json_path + ".migrated")
+        return len(ids)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._conn.close()
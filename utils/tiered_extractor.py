@@ -0,0 +1,130 @@
+import threading
+
+from config.config import TIER_CONFIDENCE_THRESHOLD, TIER_REQUIRED_FIELDS
+from utils.parsing_utils import get_extractor
+from utils.metrics import incr
+
+# Confidence of a regex match per field, indexed by the FIELD_PATTERNS pattern
+# that matched: labelled lines ("Name of the Company:") score high, loose
+# fallbacks (bare decimals, *bold* text, subject line) score low.
+PATTERN_CONFIDENCE = {
+    'company': [1.0, 0.8, 0.4, 0.4],
+    'category': [0.9, 0.6],
+    'branches': [0.9, 0.5],
+    '10th': [0.8, 0.8],
+    '12th': [0.8, 0.8],
+    'cgpa': [0.9, 0.9, 0.4],
+    'ctc': [0.9, 0.6, 0.6],
+    'stipend': [0.9],
+    'last_date': [0.9, 0.7, 0.4],
+}
+SOURCE_CONFIDENCE = {
+    'subject': 0.3,  # company guessed from the subject line
+    'links': 0.9,    # registration links found in the body
+}
+
+# Regex result keys -> keys used in the LLM prompt
+LLM_FIELD_NAMES = {
+    'company': 'company',
+    'category': 'category',
+    'branches': 'branches',
+    '10th': '10th%',
+    '12th': '12th%',
+    'cgpa': 'cgpa',
+    'ctc': 'ctc',
+    'stipend': 'stipend',
+    'last_date': 'last_date',
+    'registration_links': 'registration_links',
+}
+
+
+def to_llm_keys(result):
+    """
+    Regex result in the LLM answer's keys (LLM_FIELD_NAMES), so rows from either
+    path are built alike; regex-only keys (application_source, website,
+    no_arrears) are dropped.
+    """
+    return {
+        llm_field: result.get(field, [] if field == 'registration_links' else "")
+        for field, llm_field in LLM_FIELD_NAMES.items()
+    }
+
+
+def field_confidence(spans):
+    """Score each extracted field from its FieldSpan (0.0 when the field was not found)."""
+    scores = {}
+    for field in LLM_FIELD_NAMES:
+        span = spans.get(field)
+        if span is None:
+            scores[field] = 0.0
+        elif span.source in SOURCE_CONFIDENCE:
+            scores[field] = SOURCE_CONFIDENCE[span.source]
+        else:
+            scores[field] = PATTERN_CONFIDENCE[field][span.pattern]
+    return scores
+
+
+class TieredExtractor:
+    """
+    Regex fast path first, LLM only for what the regex could not settle.
+
+    - Fields in `required` must score >= `threshold`; other fields are only
+      re-asked when the regex found them with a score below `threshold`
+      (a missing optional field such as stipend is simply left blank).
+    - If the regex extractor finds nothing at all, the full LLM prompt is used.
+    - Otherwise the LLM gets a reduced prompt asking only for the uncertain
+      fields, and its non-empty answers override the regex values.
+
+    `stats` counts mails resolved on the fast path vs. sent to the LLM.
+    """
+
+    def __init__(self, pool, threshold=TIER_CONFIDENCE_THRESHOLD, required=TIER_REQUIRED_FIELDS):
+        self.pool = pool
+        self.threshold = threshold
+        self.required = tuple(required)
+        self.extractor = get_extractor()
+        self._lock = threading.Lock()
+        self.stats = {"mails": 0, "fast_path": 0, "llm_partial": 0, "llm_full": 0, "llm_fields": 0}
+
+    def _count(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+                incr(f"tiered.{key}", value)
+
+    def uncertain_fields(self, spans):
+        """Return the regex field names that need the LLM."""
+        scores = field_confidence(spans)
+        return [
+            field for field, score in scores.items()
+            if score < self.threshold and (field in self.required or score > 0)
+        ]
+
+    def extract(self, email):
+        """Extract one email dict; returns a dict in the LLM answer's keys or None."""
+        result, spans = self.extractor.extract_with_spans(
+            email.get("body"), email.get("from"), email.get("subject")
+        )
+        if result is None:
+            self._count(mails=1, llm_full=1)
+            return self.pool.extract(email)
+
+        uncertain = self.uncertain_fields(spans)
+        if not uncertain:
+            self._count(mails=1, fast_path=1)
+            return to_llm_keys(result)
+
+        self._count(mails=1, llm_partial=1, llm_fields=len(uncertain))
+        answer = self.pool.extract(email, fields=[LLM_FIELD_NAMES[f] for f in uncertain])
+        for field in uncertain:
+            value = (answer or {}).get(LLM_FIELD_NAMES[field])
+            if value:
+                result[field] = value
+        return to_llm_keys(result)
+
+    def summary(self):
+        s = self.stats
+        llm_calls = s["llm_partial"] + s["llm_full"]
+        return (f"{s['fast_path']}/{s['mails']} mails fully resolved by regex; "
+                f"{llm_calls} LLM calls ({s['llm_full']} full, {s['llm_partial']} partial "
+                f"covering {s['llm_fields']} fields)")